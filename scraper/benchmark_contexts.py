@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Benchmark de contextos de Chromium contra un sitio local de prueba.
+Compara productos por minuto con el navegador de proceso único y un solo
+contexto (BROWSER_CONTEXTS = 0) frente a varios contextos aislados, repartidos
+por turno o al menos cargado, y opcionalmente varios procesos de navegador
+(cada uno con un shard de las categorías).
+
+Cada categoría del sitio de prueba renderiza sus cards con JavaScript tras
+--render-ms y ocupa el hilo principal --js-work-ms, como una tienda real.
+
+Uso:
+    python benchmark_contexts.py --categories 40 --products 48
+    python benchmark_contexts.py --configs 0:round_robin:1,4:least_loaded:1,2:round_robin:2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+DEFAULT_CONFIGS = "0:round_robin:1,2:round_robin:1,4:round_robin:1,4:least_loaded:1,2:least_loaded:2"
+
+CATEGORY_HTML = """<!doctype html>
+<html><head><title>Categoría {index}</title></head>
+<body>
+<div id="products"></div>
+<script>
+setTimeout(() => {{
+    const end = performance.now() + {js_work_ms};
+    while (performance.now() < end) {{}}
+    const container = document.getElementById('products');
+    for (let i = 0; i < {products}; i++) {{
+        const card = document.createElement('div');
+        card.className = 'card';
+        card.innerHTML = `<h3>Producto {index}-${{i}} Bolsa 500 g</h3><span class="price">S/ ${{(i % 40) + 1}}.90</span>`;
+        container.appendChild(card);
+    }}
+}}, {render_ms});
+</script>
+</body></html>
+"""
+
+
+def serve_fixture(port, products, render_ms, js_work_ms):
+    """Sitio de prueba: /categoria/<n> con las cards renderizadas por JavaScript"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            index = self.path.rstrip('/').split('/')[-1]
+            body = CATEGORY_HTML.format(
+                index=index, products=products, render_ms=render_ms, js_work_ms=js_work_ms).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_worker(args):
+    """Un proceso de navegador: recorre su shard de categorías e imprime el resultado en JSON"""
+    import scrapy
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    from scrapy_playwright.page import PageMethod
+
+    from scraper.spiders.utils.extract import extract_cards
+    from scraper.spiders.utils.page_pool import release_page
+
+    shard, shards = (int(part) for part in args.shard.split('/'))
+    urls = [f"http://127.0.0.1:{args.port}/categoria/{index}"
+            for index in range(args.categories) if index % shards == shard]
+
+    class FixtureSpider(scrapy.Spider):
+        name = "benchmark_contexts"
+
+        async def start(self):
+            for url in urls:
+                yield scrapy.Request(
+                    url,
+                    meta=dict(playwright=True, playwright_include_page=True,
+                              playwright_page_methods=[
+                                  PageMethod("wait_for_selector", "div.card", timeout=60000),
+                              ]),
+                    callback=self.parse,
+                )
+
+        async def parse(self, response):
+            page = response.meta["playwright_page"]
+            cards, _ = await extract_cards(self, page, "div.card", ("h3::text", "span.price::text"))
+            await release_page(self, page)
+            for card in cards:
+                yield {"name": card.css("h3::text").get(), "price": card.css("span.price::text").get()}
+
+    settings = get_project_settings()
+    settings.setdict({
+        'ITEM_PIPELINES': {},
+        'EXTENSIONS': {},
+        'LOG_LEVEL': 'ERROR',
+        'DOWNLOAD_DELAY': 0,
+        'AUTOTHROTTLE_ENABLED': False,
+        'STORAGE_STATE_ENABLED': False,
+        'BROWSER_CONTEXTS': args.contexts,
+        'BROWSER_CONTEXT_STRATEGY': args.strategy,
+    }, priority='cmdline')
+
+    items = []
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(FixtureSpider)
+
+    def on_item(item):
+        items.append(item)
+
+    crawler.signals.connect(on_item, signal=signals.item_scraped)
+    start = time.perf_counter()
+    process.crawl(crawler)
+    process.start()
+    print(json.dumps({"items": len(items), "seconds": time.perf_counter() - start}))
+
+
+def run_config(args, contexts, strategy, processes):
+    """Lanzar `processes` navegadores en paralelo, cada uno con su shard"""
+    start = time.perf_counter()
+    workers = [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker",
+             "--port", str(args.port), "--categories", str(args.categories),
+             "--contexts", str(contexts), "--strategy", strategy,
+             "--shard", f"{shard}/{processes}"],
+            cwd=current_dir, stdout=subprocess.PIPE, text=True)
+        for shard in range(processes)
+    ]
+    items = 0
+    for worker in workers:
+        output, _ = worker.communicate()
+        if worker.returncode != 0:
+            raise RuntimeError(f"El proceso del benchmark terminó con código {worker.returncode}")
+        items += json.loads(output.strip().splitlines()[-1])["items"]
+    return items, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--products", type=int, default=48)
+    parser.add_argument("--render-ms", type=int, default=300)
+    parser.add_argument("--js-work-ms", type=int, default=150)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS,
+                        help="contextos:estrategia:procesos separados por comas (0 contextos = modo anterior)")
+    # Uso interno: un proceso de navegador
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--contexts", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--strategy", default="round_robin", help=argparse.SUPPRESS)
+    parser.add_argument("--shard", default="0/1", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    server = serve_fixture(args.port, args.products, args.render_ms, args.js_work_ms)
+    results = []
+    try:
+        for config in args.configs.split(','):
+            contexts, strategy, processes = config.split(':')
+            items, seconds = run_config(args, int(contexts), strategy, int(processes))
+            results.append((int(contexts), strategy, int(processes), items, seconds))
+    finally:
+        server.shutdown()
+
+    print("=" * 72)
+    print(f"Categorías: {args.categories} | Productos por categoría: {args.products} | "
+          f"Render: {args.render_ms} ms + {args.js_work_ms} ms de JS")
+    baseline = None
+    for contexts, strategy, processes, items, seconds in results:
+        per_minute = items / seconds * 60
+        baseline = baseline or per_minute
+        mode = "proceso único, 1 contexto" if contexts == 0 else f"{contexts} contextos, {strategy}"
+        print(f"{mode:<34} x{processes} procesos: {per_minute:>9,.0f} productos/min "
+              f"({items} en {seconds:.1f} s, x{per_minute / baseline:.1f})")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
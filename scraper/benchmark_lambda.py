@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Latencia de arranque en frío y en caliente de handler.lambda_handler.
+Con --endpoint invoca la imagen corriendo bajo el emulador de Lambda (RIE):
+la primera invocación de cada contenedor es en frío y el resto en caliente.
+Sin --endpoint emula el contenedor en local: un proceso nuevo por ronda,
+donde la primera invocación importa handler.py (frío) y las demás lo reutilizan.
+
+Uso:
+    # Emulador: docker run --rm -p 9000:8080 -v ~/.aws-lambda-rie:/aws-lambda \\
+    #   --entrypoint /aws-lambda/aws-lambda-rie <imagen> python -m awslambdaric handler.lambda_handler
+    python benchmark_lambda.py --endpoint http://localhost:9000 --spider inkafarma --shard 0/4
+    python benchmark_lambda.py --spider plaza_vea --shard 1/8 --invocations 5 --rounds 2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+RIE_PATH = "/2015-03-31/functions/function/invocations"
+
+
+def invoke_endpoint(endpoint, event):
+    """Una invocación contra el emulador; devuelve (ms medidos por el cliente, body)"""
+    request = urllib.request.Request(
+        endpoint.rstrip('/') + RIE_PATH, data=json.dumps(event).encode(),
+        headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=900) as response:
+        payload = json.loads(response.read())
+    return (time.perf_counter() - start) * 1000, json.loads(payload.get('body') or '{}')
+
+
+def run_local_round(event, invocations):
+    """Un 'contenedor' local: proceso nuevo que importa handler.py e invoca varias veces"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import handler\n"
+        "event = json.loads(sys.argv[1])\n"
+        "for i in range(int(sys.argv[2])):\n"
+        "    t = time.perf_counter()\n"
+        "    body = json.loads(handler.lambda_handler(event, None)['body'])\n"
+        "    ms = (time.perf_counter() - (start if i == 0 else t)) * 1000\n"
+        "    print('RESULT ' + json.dumps([ms, body]), flush=True)\n"
+        "import os; os._exit(0)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code, json.dumps(event), str(invocations)],
+        cwd=current_dir, stdout=subprocess.PIPE, text=True, check=True).stdout
+    return [json.loads(line[len('RESULT '):]) for line in output.splitlines() if line.startswith('RESULT ')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spider", required=True)
+    parser.add_argument("--shard", default="0/1")
+    parser.add_argument("--endpoint", help="URL del emulador de Lambda (RIE)")
+    parser.add_argument("--invocations", type=int, default=3, help="invocaciones por contenedor")
+    parser.add_argument("--rounds", type=int, default=1, help="contenedores en local (sin --endpoint)")
+    parser.add_argument("--setting", action="append", default=[], help="NOMBRE=valor para el evento")
+    args = parser.parse_args()
+
+    event = {"spider": args.spider, "shard": args.shard,
+             "settings": dict(setting.split('=', 1) for setting in args.setting)}
+
+    results = []
+    if args.endpoint:
+        for _ in range(args.invocations):
+            results.append(invoke_endpoint(args.endpoint, event))
+    else:
+        for _ in range(args.rounds):
+            results.extend(run_local_round(event, args.invocations))
+
+    print("=" * 72)
+    print(f"Araña: {args.spider} | Shard: {args.shard} | {len(results)} invocaciones")
+    cold, warm = [], []
+    for ms, body in results:
+        is_warm = body.get('invocation', 1) > 1
+        (warm if is_warm else cold).append(ms)
+        print(f"  #{body.get('invocation')} {'caliente' if is_warm else 'en frío '}: {ms:>9,.0f} ms "
+              f"(init {body.get('init_ms', 0)} ms, crawl {body.get('duration_ms')} ms, "
+              f"{body.get('items')} productos, navegador reutilizado: {body.get('warm_browser')}, "
+              f"RSS {body.get('browser_rss_mb')} MB)")
+    if cold:
+        print(f"En frío:    media {sum(cold) / len(cold):,.0f} ms")
+    if warm:
+        print(f"En caliente: media {sum(warm) / len(warm):,.0f} ms")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark del PostgresPipeline contra un PostgreSQL local.
+Compara el camino antiguo (SELECT 1 + INSERT + commit por fila) con la
+escritura por lotes mediante COPY FROM STDIN y muestra filas por segundo.
+
+Uso:
+    python benchmark_pipeline.py --rows 20000 --batch-size 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+import scrapy
+from scrapy.utils.test import get_crawler
+
+from scraper.items import ScraperItem
+from scraper.pipelines import COLUMNS, PostgresPipeline
+
+TABLE = "benchmark_pipeline"
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        name TEXT, price NUMERIC, unit_price NUMERIC,
+        total_unit_quantity NUMERIC, unit_type TEXT,
+        category TEXT, sub_category TEXT, comercial_name TEXT,
+        comercial_id TEXT, result_date DATE, result_time TIME
+    )
+"""
+
+
+def build_items(rows):
+    """Generar items sintéticos parecidos a los de Plaza Vea"""
+    items = []
+    for i in range(rows):
+        item = ScraperItem()
+        item['name'] = f"Leche Gloria Entera {i % 7 + 1} x 400 g"
+        item['price'] = 4.5 + (i % 50) / 10
+        item['unit_price'] = item['price'] / 400
+        item['total_unit_quantity'] = 400.0
+        item['unit_type'] = 'g'
+        item['category'] = 'Lacteos Y Huevos'
+        item['sub_category'] = 'Leche'
+        item['comercial_name'] = 'plaza_vea'
+        item['comercial_id'] = '20100070970'
+        items.append(item)
+    return items
+
+
+def run_legacy(pipeline, items):
+    """Camino antiguo: sondeo, INSERT y commit por cada item"""
+    insert_sql = f"""
+        INSERT INTO {TABLE} ({', '.join(COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(COLUMNS))})
+    """
+    start = time.perf_counter()
+    for item in items:
+        pipeline.cur.execute("SELECT 1;")
+        pipeline.cur.execute(insert_sql, pipeline._row(item))
+        pipeline.connection.commit()
+    return time.perf_counter() - start
+
+
+def run_batched(pipeline, spider, items):
+    """Camino nuevo: buffer + COPY con un commit por lote"""
+    start = time.perf_counter()
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline._flush(spider)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    crawler = get_crawler(settings_dict={
+        "POSTGRES_BATCH_SIZE": args.batch_size,
+        "POSTGRES_FLUSH_INTERVAL": 0,
+    })
+    spider = scrapy.Spider(name="benchmark")
+    spider.pais = TABLE
+    pipeline = PostgresPipeline.from_crawler(crawler)
+    pipeline.pais = TABLE
+    pipeline._connect()
+    pipeline.cur.execute(CREATE_TABLE_SQL)
+    pipeline.connection.commit()
+
+    items = build_items(args.rows)
+    try:
+        pipeline.cur.execute(f"TRUNCATE {TABLE}")
+        pipeline.connection.commit()
+        legacy_seconds = run_legacy(pipeline, items)
+
+        pipeline.cur.execute(f"TRUNCATE {TABLE}")
+        pipeline.connection.commit()
+        batched_seconds = run_batched(pipeline, spider, items)
+    finally:
+        pipeline.cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        pipeline.connection.commit()
+        pipeline.cur.close()
+        pipeline.connection.close()
+
+    print("=" * 60)
+    print(f"Filas: {args.rows} | Tamaño de lote: {args.batch_size}")
+    print(f"Fila a fila (SELECT 1 + INSERT + commit): {args.rows / legacy_seconds:,.0f} filas/s")
+    print(f"Por lotes (COPY FROM STDIN):              {args.rows / batched_seconds:,.0f} filas/s")
+    print(f"Aceleración: x{legacy_seconds / batched_seconds:.1f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
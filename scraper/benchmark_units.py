@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Benchmark del motor de unidades compartido (scraper/spiders/utils/units.py).
+Compara las rutinas que tenía cada araña (regex sin compilar, diccionario
+reconstruido por llamada, doble búsqueda en Inkafarma) con el motor y el
+perfil de unidades de cada retailer sobre un corpus de nombres reales de
+Plaza Vea, Jumbo, Falabella, Cruz Verde e Inkafarma. tests/test_units.py
+comprueba con este mismo corpus que ambos dan el mismo resultado.
+
+Uso:
+    python benchmark_units.py --repeat 2000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from scraper.spiders.constants import cruzverde, cruzverdecl, falabella, inkafarma, jumbo
+from scraper.spiders.plaza_vea import PlazaVeaSpider
+from scraper.spiders.utils.units import DEFAULT_UNIT, match_units, parse_units, unit_cache
+
+CORPUS = [
+    "Leche Evaporada Gloria Entera Lata 400g",
+    "Leche Gloria Light Six Pack 6 un x 400 g",
+    "Arroz Extra Costeño Bolsa 5kg",
+    "Aceite Vegetal Primor Premium Botella 900ml",
+    "Azúcar Rubia Dulfina Bolsa 1kg",
+    "Fideos Spaghetti Don Vittorio 950 g",
+    "Gaseosa Inca Kola Botella 3L",
+    "Agua Mineral San Luis sin Gas 2.5 L",
+    "Huevos Pardos La Calera Bandeja 15 un",
+    "Yogurt Gloria Fresa Botella 1kg",
+    "Atún Florida en Trozos Lata 140 grs",
+    "Papel Higiénico Elite Doble Hoja 24 unidades",
+    "Detergente en Polvo Ariel 2 kg",
+    "Pechuga de Pollo San Fernando por kg",
+    "Pan de Molde Bimbo Blanco 600 gr",
+    "Cerveza Pilsen Callao Lata 355 ml x 6",
+    "Chocolate Sublime Clásico 30g",
+    "Galletas Oreo Paquete x 6",
+    "Café Altomayo Instantáneo Frasco 190g",
+    "Mantequilla Laive con Sal 200 g",
+    "Queso Mozzarella Bonlé 250 Gr",
+    "Jabón Dove Original 90 g x 3 unds",
+    "Shampoo Head & Shoulders 375 ml",
+    "Pañales Huggies Natural Care Etapa 3 x 40",
+    "Atún Van Camps Lomitos en Aceite 160 g",
+    "Chocolatina Jet 12 g por 12",
+    "Arepas Doñarepa Maíz Blanco 450 gr",
+    "Café Sello Rojo Tradicional 500 g",
+    "Gaseosa Coca Cola 1.5 lt",
+    "Papas Margarita Natural 105 g",
+    "Leche Alquería Entera Bolsa 1100 ml",
+    "Televisor Samsung 55 pulgadas UHD",
+    "Freidora de Aire Oster 4 Lt",
+    "Vino Tinto Casillero del Diablo Cabernet 750 ml",
+    "Whisky Johnnie Walker Red Label 1 L",
+    "Paracetamol 500 mg Caja x 100 Tabletas",
+    "Ibuprofeno MK 400 mg x 10 tabletas",
+    "Acetaminofén Genfar 500mg 100 Tabletas",
+    "Protector Solar La Roche-Posay Anthelios 50 ml",
+    "Vitamina C Redoxon 1g 10 Tabletas Efervescentes",
+    "Omeprazol 20 mg 14 cápsulas",
+    "Suero Oral Electrolit Fresa 625 ml",
+    "Condones Durex Extra Seguro 3 unidades",
+    "Cotonetes Johnson's 150 cotonetes",
+    "Enterogermina 2 Billones 10 ampolletas",
+    "Ensure Advance Vainilla 850 g",
+    "Panadol Antigripal x 12 sobres",
+    "Crema Hidratante Cetaphil 453 g",
+    "Alcohol Medicinal 70° Frasco 1 L",
+    "Gasas Estériles 10 un",
+]
+
+# --- Rutinas anteriores de las arañas --------------------------------------
+
+
+def legacy_plaza_vea(price, name, unit_reference=""):
+    text_to_analyze = f"{name} {unit_reference}".lower()
+    pattern = r'(\d+(?:\.\d+)?)\s*(kg|g|gr|grs|l|litro|litros|ml|mililitro|mililitros|pack|paquete|caja|bandeja|unidad|unidades|un|u|und|unds)\b'
+    matches = re.findall(pattern, text_to_analyze, re.IGNORECASE)
+    if matches:
+        quantity_str, unit_str = matches[-1]
+        quantity = float(quantity_str.replace(',', '.'))
+        unit_normalized = {
+            'g': 'g', 'gr': 'g', 'grs': 'g',
+            'l': 'l', 'litro': 'l', 'litros': 'l',
+            'ml': 'ml', 'mililitro': 'ml', 'mililitros': 'ml',
+            'pack': 'pack', 'paquete': 'pack', 'caja': 'pack',
+            'bandeja': 'g',
+            'unidades': 'unidad', 'un': 'unidad', 'u': 'unidad', 'und': 'unidad', 'unds': 'unidad'
+        }.get(unit_str.lower(), unit_str.lower())
+        return price / quantity, quantity, unit_normalized
+    return price, 1.0, 'unidad'
+
+
+def legacy_jumbo(price, name):
+    matches = re.findall(
+        r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|lt|kg|onz|lb|unidades|unideades|un|cm|m|u|grs|und|unds)\b)', name, re.IGNORECASE)
+    if len(matches) > 0:
+        value = matches[-1]
+        quantity, unit = float(value[0].replace(',', '.')), value[1]
+    else:
+        matches = re.findall(
+            r'(?:\s{1}(?:x|por))\s*(\d+[\.,]?\d*)\b', name.lower(), re.IGNORECASE)
+        if len(matches) > 0:
+            quantity, unit = float(matches[-1].replace('.', '').replace(',', '.')), 'un'
+        else:
+            quantity, unit = 1, 'un'
+    return price / quantity, quantity, unit
+
+
+REGEX_CANTIDAD_PRESENTACION = re.compile(
+    r'(\d+(?:\.\d+)?)\s*(ml|mg|g|kg|l|un|unidades?|caps?|comp|tab)', re.IGNORECASE)
+
+
+def legacy_inkafarma(price, presentacion):
+    match = REGEX_CANTIDAD_PRESENTACION.search(presentacion)
+    unit_price = round(price / float(match.group(1)), 2) if match and float(match.group(1)) > 0 else price
+    match = REGEX_CANTIDAD_PRESENTACION.search(presentacion)
+    if match:
+        return unit_price, float(match.group(1)), match.group(2).lower()
+    return unit_price, 1.0, "un"
+
+
+def legacy_falabella(price, name):
+    matches = re.findall(
+        r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|lt|kg|onz|lb|unidades|unideades|un|cm|m|u|grs|und|unds)\b)', name, re.IGNORECASE)
+    if len(matches) > 0:
+        value = matches[-1]
+        quantity, unit = float(value[0].replace(',', '.')), value[1].lower()
+    else:
+        quantity, unit = 1, 'un'
+    return float(price / quantity), quantity, unit
+
+
+def legacy_cruzverde(price, name):
+    matches = re.findall(
+        r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|kg|unidades|unidad|un|cm|m|u|grs|und|unds|tabletas|tableta|mg|dosis|cápsulas|capsulas|sobres|ampolletas|cotonetes)\b)',
+        name.lower(), re.IGNORECASE)
+    if len(matches) > 0:
+        value = matches[-1]
+        quantity, unit = float(value[0].replace(',', '.')), value[1]
+    else:
+        matches = re.findall(r'(?:x|por)\s*(\d+[\.,]?\d*)\b', name.lower(), re.IGNORECASE)
+        if len(matches) > 0:
+            quantity, unit = float(matches[-1].replace('.', '').replace(',', '.')), 'un'
+        else:
+            quantity, unit = 1, 'un'
+    return float(price) / float(quantity), quantity, unit
+
+
+def legacy_cruzverdecl(price, name):
+    matches = re.findall(
+        r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|lt|kg|onz|mg|comprimido|lb|unidades|unideades|un|cm|m|u|grs|und|unds)\b)', name, re.IGNORECASE)
+    if len(matches) > 0:
+        value = matches[-1]
+        quantity, unit = float(value[0].replace(',', '.')), value[1].strip().lower()
+    else:
+        quantity, unit = 1, 'un'
+    return float(price / quantity), quantity, unit
+
+
+# --- Motor compartido, como lo llama cada araña ------------------------------
+
+PLAZA_VEA = PlazaVeaSpider.__new__(PlazaVeaSpider)
+
+
+def engine_plaza_vea(price, name):
+    return PLAZA_VEA.calculate_unit_data(price, name, "")
+
+
+def engine_jumbo(price, name):
+    quantity, unit = match_units(name, jumbo.UNIT_PROFILE)
+    return price / quantity, quantity, unit or DEFAULT_UNIT
+
+
+def engine_inkafarma(price, presentacion):
+    quantity, unit, unit_price = parse_units(presentacion, inkafarma.UNIT_PROFILE, price)
+    return round(unit_price, 2), quantity, unit
+
+
+def engine(profile):
+    def parse(price, name):
+        quantity, unit, unit_price = parse_units(name, profile, price)
+        return unit_price, quantity, unit
+    return parse
+
+
+# Retailer -> (rutina anterior, motor con su perfil)
+RETAILERS = {
+    "plaza_vea": (legacy_plaza_vea, engine_plaza_vea),
+    "jumbo": (legacy_jumbo, engine_jumbo),
+    "inkafarma": (legacy_inkafarma, engine_inkafarma),
+    "falabella": (legacy_falabella, engine(falabella.UNIT_PROFILE)),
+    "cruzverde": (legacy_cruzverde, engine(cruzverde.UNIT_PROFILE)),
+    "cruzverdecl": (legacy_cruzverdecl, engine(cruzverdecl.UNIT_PROFILE)),
+}
+LEGACY = [legacy for legacy, _ in RETAILERS.values()]
+ENGINE = [current for _, current in RETAILERS.values()]
+
+
+def run(routines, names):
+    start = time.perf_counter()
+    for i, name in enumerate(names):
+        routines[i % len(routines)](10.0, name)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000,
+                        help="veces que se recorre el corpus")
+    parser.add_argument("--cache-size", type=int, default=50000,
+                        help="tamaño de la caché LRU (UNITS_CACHE_SIZE)")
+    args = parser.parse_args()
+
+    names = CORPUS * args.repeat
+    legacy_seconds = run(LEGACY, names)
+    unit_cache.resize(0)
+    engine_seconds = run(ENGINE, names)
+    unit_cache.resize(args.cache_size)
+    cached_seconds = run(ENGINE, names)
+
+    print("=" * 60)
+    print(f"Nombres procesados: {len(names)} ({len(CORPUS)} distintos)")
+    print(f"Rutinas por araña: {len(names) / legacy_seconds:>12,.0f} nombres/s")
+    print(f"Motor + perfiles:  {len(names) / engine_seconds:>12,.0f} nombres/s")
+    print(f"Motor + LRU:       {len(names) / cached_seconds:>12,.0f} nombres/s "
+          f"({unit_cache.hits} aciertos, {unit_cache.misses} fallos)")
+    print(f"Aceleración: x{legacy_seconds / engine_seconds:.1f} sin caché, "
+          f"x{legacy_seconds / cached_seconds:.1f} con caché")
+    print("=" * 60)
+    for name in CORPUS[:5]:
+        print(f"{name!r}: {engine_plaza_vea(10.0, name)}")
+
+
+if __name__ == "__main__":
+    main()
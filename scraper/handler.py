@@ -1,16 +1,12 @@
-from scrapy.utils.reactor import install_reactor
-install_reactor("twisted.internet.asyncioreactor.AsyncioSelectorReactor")
+import time
 
-import os
-import json
-from scrapy.crawler import CrawlerRunner
-from scrapy.utils.project import get_project_settings
-from scrapy.utils.log import configure_logging
-from scrapy.utils.defer import deferred_to_future
-import asyncio
+# Inicio del arranque en frío: lo que sigue (reactor, Scrapy, arañas) se hace una
+# vez por contenedor y las invocaciones en caliente lo reutilizan
+COLD_START = time.perf_counter()
 
-# Importa la clase de tu araña.
-from scraper.spiders.TestSpider import TestSpider  # Cambia esto por el nombre de tu araña
+import asyncio
+import json
+import os
 
 os.environ["PLAYWRIGHT_BROWSERS_PATH"] = "/ms-playwright"
 os.environ["PLAYWRIGHT_SKIP_BROWSER_DOWNLOAD"] = "1"
@@ -20,49 +16,124 @@ os.environ["XDG_CACHE_HOME"] = "/tmp"
 os.environ["TMPDIR"] = "/tmp"
 os.environ["HOME"] = "/tmp"
 
+from scrapy.utils.reactor import install_reactor
+install_reactor("twisted.internet.asyncioreactor.AsyncioSelectorReactor")
+
+from scrapy import signals
+from scrapy.crawler import CrawlerRunner
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.defer import deferred_to_future
+from scrapy.utils.log import configure_logging
+from scrapy.utils.project import get_project_settings
+from twisted.internet import reactor
+
+from scraper.spiders.utils.browser_memory import browser_rss_mb
+from scraper.spiders.utils.warm_browser import WarmBrowserProvider
+
+# Event loop del reactor: Playwright y Chromium quedan ligados a él, así que todas
+# las invocaciones corren en este mismo loop (asyncio.run crearía uno nuevo). El
+# reactor se marca en marcha una sola vez; el loop avanza en cada invocación
+LOOP = asyncio.get_event_loop()
+reactor.startRunning(installSignalHandlers=False)
+
+SETTINGS = get_project_settings()
+configure_logging(SETTINGS)
+# Importa todos los módulos de arañas una sola vez
+SPIDERS = SpiderLoader.from_settings(SETTINGS)
+
+# Lambda solo permite escribir en /tmp: las rutas relativas de settings.py van allí
+WRITABLE_DIR = "/tmp"
+WRITABLE_SETTINGS = ('STORAGE_STATE_DIR', 'UNITS_CACHE_FILE', 'SPOOL_DIR', 'PARQUET_DIR')
+
+# Con un RSS de Chromium mayor que este al empezar una invocación se relanza en frío
+WARM_BROWSER_MAX_RSS_MB = SETTINGS.getint('BROWSER_RECYCLE_RSS_MB', 1536)
+
+INIT_MS = int((time.perf_counter() - COLD_START) * 1000)
+invocations = 0
+
+
+def crawl_settings(event):
+    """Settings del proyecto con el navegador compartido, el shard y los ajustes del evento"""
+    settings = SETTINGS.copy()
+    for name in WRITABLE_SETTINGS:
+        path = settings.get(name)
+        if path and not os.path.isabs(path):
+            settings.set(name, os.path.join(WRITABLE_DIR, path), priority='cmdline')
+    settings.setdict({
+        'PLAYWRIGHT_BROWSER_PROVIDER': 'scraper.spiders.utils.warm_browser.WarmBrowserProvider',
+        # El contexto persistente lanzaría otro Chromium en cada invocación
+        'PLAYWRIGHT_CONTEXTS': {},
+        'START_SHARD': event.get('shard') or '0/1',
+    }, priority='cmdline')
+    settings.setdict(event.get('settings') or {}, priority='cmdline')
+    return settings
+
+
+async def run_spider(event):
+    """Lanzar la araña del evento y devolver las estadísticas del crawl"""
+    spider_cls = SPIDERS.load(event['spider'])
+    # RunStampExtension fija la fecha y hora de esta ejecución al abrir la araña
+    settings = crawl_settings(event)
+
+    sample = browser_rss_mb()
+    if sample and sample[0] > WARM_BROWSER_MAX_RSS_MB:
+        print(f"Chromium ocupa {int(sample[0])} MB, se relanza antes de esta invocación")
+        await WarmBrowserProvider.shutdown()
+
+    runner = CrawlerRunner(settings)
+    crawler = runner.create_crawler(spider_cls)
+    items = []
+    crawler.signals.connect(lambda item: items.append(1), signal=signals.item_scraped, weak=False)
+    await deferred_to_future(runner.crawl(crawler, **(event.get('args') or {})))
+    return len(items), crawler.stats.get_stats()
+
 
 def lambda_handler(event, context):
     """
-    Esta es la función que AWS Lambda ejecutará.
-    'event' contiene los datos de entrada (si los hay).
-    'context' contiene información sobre el entorno de ejecución.
+    Punto de entrada de AWS Lambda. El evento elige la araña y el shard:
+    {"spider": "jumbo", "shard": "0/2", "args": {"category": "supermarket", "part": "1"},
+     "settings": {"LOG_LEVEL": "INFO"}}
+    Reactor, arañas, Playwright y Chromium viven en el módulo y se reutilizan
+    mientras el contenedor siga caliente.
     """
-    print("Iniciando ejecución de la función Lambda para el scraper...")
-    
-    print("Playwright browsers path:", os.environ.get("PLAYWRIGHT_BROWSERS_PATH"))
-    
-    
+    global invocations
+    invocations += 1
+    start = time.perf_counter()
+    warm = WarmBrowserProvider.warm()
+    print(f"Invocación {invocations} ({'caliente' if warm else 'en frío'}): {event.get('spider')} "
+          f"shard {event.get('shard') or '0/1'}")
+
+    if event.get('spider') not in SPIDERS.list():
+        return {
+            'statusCode': 400,
+            'body': json.dumps({"msg": "Araña desconocida", "spider": event.get('spider'),
+                                "spiders": SPIDERS.list(), "invocation": invocations})
+        }
     try:
-    # Creamos una función asíncrona interna para contener nuestra lógica
-        async def main():
-            print("¡Función Lambda iniciada! Reactor asyncio instalado.")
-            
-            settings = get_project_settings()
-            configure_logging(settings)
-            
-            print("Iniciando ejecución del scraper...")
-            
-            runner = CrawlerRunner(settings)
-            
-            # Le decimos a Scrapy que empiece a correr la araña
-            deferred = runner.crawl(TestSpider)  # Cambia TestSpider por el nombre de tu araña
-            
-            # Usamos el "traductor" para que asyncio pueda esperar a que Twisted termine
-            await deferred_to_future(deferred)
-
-            print("Ejecución del scraper finalizada.")
-            # Devolvemos una respuesta simple para indicar que la ejecución fue exitosa
-            return {
-                'statusCode': 200,
-                'body': json.dumps('Scraping finalizado exitosamente!')
-            }
-            
-        asyncio.run(main())
+        items, stats = LOOP.run_until_complete(run_spider(event))
     except Exception as e:
         print(f"Ocurrió un error durante la ejecución del scraper: {e}")
         return {
-                'statusCode': 500,
-                'body': json.dumps({"msg":'Scraping finalizado con errores!', "error": str(e)})
-            }
+            'statusCode': 500,
+            'body': json.dumps({"msg": 'Scraping finalizado con errores!', "error": str(e),
+                                "invocation": invocations})
+        }
 
-    
\ No newline at end of file
+    duration_ms = int((time.perf_counter() - start) * 1000)
+    sample = browser_rss_mb()
+    body = {
+        "msg": 'Scraping finalizado exitosamente!',
+        "spider": event['spider'],
+        "shard": event.get('shard') or '0/1',
+        "items": items,
+        "finish_reason": stats.get('finish_reason'),
+        "warm_browser": warm,
+        "invocation": invocations,
+        # La inicialización del módulo solo cuenta en la primera invocación
+        "init_ms": INIT_MS if invocations == 1 else 0,
+        "duration_ms": duration_ms,
+        "browser_launches": WarmBrowserProvider.launches,
+        "browser_rss_mb": int(sample[0]) if sample else None,
+    }
+    print(f"Ejecución del scraper finalizada: {json.dumps(body)}")
+    return {'statusCode': 200, 'body': json.dumps(body)}
@@ -0,0 +1,37 @@
+from scrapy.settings import BaseSettings
+
+
+# Flags que meten todo Chromium (navegador y renderers) en un solo proceso
+SINGLE_PROCESS_ARGS = ("--single-process", "--no-zygote")
+
+
+class BrowserContextsAddon:
+    """
+    Modo de varios contextos (BROWSER_CONTEXTS > 0): quita de
+    PLAYWRIGHT_LAUNCH_OPTIONS los flags de proceso único para que cada
+    contexto renderice en su propio proceso, no lanza el contexto persistente
+    de PLAYWRIGHT_CONTEXTS y sube la concurrencia por dominio para que
+    ContextRoutingMiddleware tenga peticiones que repartir. Se usa la prioridad
+    'spider' para pisar los valores de settings.py; los de la línea de
+    comandos (-s) siguen mandando.
+    """
+
+    def update_settings(self, settings: BaseSettings):
+        contexts = settings.getint('BROWSER_CONTEXTS', 0)
+        if contexts <= 0:
+            return
+        launch_options = dict(settings.getdict('PLAYWRIGHT_LAUNCH_OPTIONS'))
+        launch_options["args"] = [
+            arg for arg in launch_options.get("args", []) if arg not in SINGLE_PROCESS_ARGS]
+        settings.set('PLAYWRIGHT_LAUNCH_OPTIONS', launch_options, priority='spider')
+        settings.set('PLAYWRIGHT_CONTEXTS', {}, priority='spider')
+
+        per_context = max(settings.getint('BROWSER_CONTEXT_CONCURRENCY', 1), 1)
+        concurrency = contexts * per_context
+        if settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN') < concurrency:
+            settings.set('CONCURRENT_REQUESTS_PER_DOMAIN', concurrency, priority='spider')
+        if settings.getint('CONCURRENT_REQUESTS') < concurrency:
+            settings.set('CONCURRENT_REQUESTS', concurrency, priority='spider')
+        # Páginas por contexto de scrapy-playwright: las descargas del contexto más
+        # la página del orquestador que sigue abierta mientras se generan peticiones
+        settings.set('PLAYWRIGHT_MAX_PAGES_PER_CONTEXT', per_context + 1, priority='spider')
@@ -0,0 +1,114 @@
+import logging
+import os
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from scraper.pipelines import COLUMNS, PostgresPipeline
+from scraper.spool import (
+    LOADED_SUFFIX, SEEN_FILE, iter_runs, iter_segments, read_segment, run_is_open)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Cargar en PostgreSQL los items guardados en el spool local"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--spider", dest="spider",
+                            help="solo las ejecuciones de esta araña")
+        parser.add_argument("--run", dest="run",
+                            help="solo esta ejecución (nombre de la carpeta)")
+        parser.add_argument("--keep", action="store_true",
+                            help="renombrar los segmentos cargados en vez de borrarlos")
+        parser.add_argument("--include-open", action="store_true",
+                            help="cargar también las ejecuciones que siguen abiertas")
+
+    def run(self, args, opts):
+        if args:
+            raise UsageError()
+
+        spool_dir = self.settings.get("SPOOL_DIR", "spool")
+        pipelines = {}
+        total_rows = 0
+        try:
+            for run_path, meta in iter_runs(spool_dir, opts.spider, opts.run):
+                if list(meta["columns"]) != list(COLUMNS):
+                    print(f"Columnas distintas en {run_path}, se omite")
+                    continue
+                # Una araña en marcha sigue anexando a sus segmentos
+                if run_is_open(meta) and not opts.include_open:
+                    print(f"La ejecución {run_path} sigue abierta, se omite")
+                    continue
+
+                # Una conexión por tabla destino ('peru', 'colombia', 'chile')
+                pais = meta["pais"]
+                if pais not in pipelines:
+                    # Se respeta POSTGRES_WRITE_MODE ('upsert' evita duplicados)
+                    pipeline = PostgresPipeline(settings=self.settings)
+                    pipeline.pais = pais
+                    pipeline._connect()
+                    # La misma preparación que open_spider (índice único del upsert)
+                    if pipeline.write_mode == 'upsert':
+                        pipeline._prepare_upsert(logger)
+                    pipelines[pais] = pipeline
+                pipeline = pipelines[pais]
+
+                for segment_path in iter_segments(run_path):
+                    rows = read_segment(segment_path)
+                    try:
+                        if rows:
+                            pipeline._store_rows(rows)
+                        pipeline.connection.commit()
+                    except Exception as e:
+                        pipeline.connection.rollback()
+                        print(f"Error cargando {segment_path}: {e}")
+                        self.exitcode = 1
+                        continue
+
+                    total_rows += len(rows)
+                    print(f"{len(rows)} filas cargadas en '{pais}' desde {segment_path}")
+                    if opts.keep:
+                        os.replace(segment_path, segment_path + LOADED_SUFFIX)
+                    else:
+                        os.remove(segment_path)
+
+                # Marcadores de "visto" del modo delta, después de las filas
+                seen_path = os.path.join(run_path, SEEN_FILE)
+                if os.path.isfile(seen_path) and not iter_segments(run_path):
+                    seen = read_segment(seen_path)
+                    try:
+                        if seen:
+                            pipeline._create_seen_table()
+                            pipeline._mark_seen(seen)
+                        pipeline.connection.commit()
+                    except Exception as e:
+                        pipeline.connection.rollback()
+                        print(f"Error cargando {seen_path}: {e}")
+                        self.exitcode = 1
+                    else:
+                        print(f"{len(seen)} marcadores cargados en '{pais}_seen' desde {seen_path}")
+                        if opts.keep:
+                            os.replace(seen_path, seen_path + LOADED_SUFFIX)
+                        else:
+                            os.remove(seen_path)
+
+                if not opts.keep and not iter_segments(run_path) \
+                        and not os.path.isfile(seen_path):
+                    for name in os.listdir(run_path):
+                        os.remove(os.path.join(run_path, name))
+                    os.rmdir(run_path)
+        finally:
+            for pipeline in pipelines.values():
+                pipeline.cur.close()
+                pipeline.connection.close()
+
+        print(f"Total: {total_rows} filas cargadas desde {spool_dir}")
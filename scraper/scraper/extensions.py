@@ -0,0 +1,286 @@
+import asyncio
+import time
+from contextlib import suppress
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import deferred_from_coro
+from twisted.internet import task
+
+from scraper.items import start_run
+from scraper.spiders.utils.blocking import request_blocker
+from scraper.spiders.utils.browser_memory import browser_rss_mb
+from scraper.spiders.utils.units import unit_cache
+
+
+class RunStampExtension:
+    """
+    Fija la fecha y hora de la ejecución (result_date/result_time de los
+    ProductItem) al abrir cada araña, con o sin pipeline de PostgreSQL y
+    también cuando el proceso se reutiliza (Lambda en caliente, benchmarks).
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls()
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        return ext
+
+    def spider_opened(self, spider):
+        result_date, result_time = start_run()
+        spider.logger.debug(f"Ejecución con fecha {result_date} {result_time}")
+
+
+class UnitCacheExtension:
+    """
+    Configura la caché LRU de parse_units (UNITS_CACHE_SIZE), la precarga desde
+    UNITS_CACHE_FILE si existe y al cerrar la araña la guarda de nuevo y
+    publica los aciertos/fallos en las estadísticas de Scrapy.
+    """
+
+    def __init__(self, stats, size, path=None):
+        self.stats = stats
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        unit_cache.resize(size)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        size = crawler.settings.getint('UNITS_CACHE_SIZE', 0)
+        if size <= 0:
+            raise NotConfigured
+        ext = cls(crawler.stats, size, crawler.settings.get('UNITS_CACHE_FILE'))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        if self.path and not unit_cache.entries:
+            loaded = unit_cache.load(self.path)
+            spider.logger.info(f"Caché de unidades: {loaded} nombres cargados de {self.path}")
+        # La caché es del proceso; solo se cuentan los accesos de esta araña
+        self.hits, self.misses = unit_cache.hits, unit_cache.misses
+
+    def spider_closed(self, spider):
+        self.stats.set_value('units_cache/hits', unit_cache.hits - self.hits)
+        self.stats.set_value('units_cache/misses', unit_cache.misses - self.misses)
+        self.stats.set_value('units_cache/size', len(unit_cache.entries))
+        try:
+            unit_cache.save(self.path)
+        except OSError as e:
+            spider.logger.error(f"No se pudo guardar la caché de unidades en {self.path}: {e}")
+
+
+class RequestBlockingExtension:
+    """
+    Configura el bloqueador de PLAYWRIGHT_ABORT_REQUEST con los tipos de
+    recurso de BLOCKED_RESOURCE_TYPES y los dominios de BLOCKED_DOMAINS más
+    los del retailer (atributo blocked_domains de la araña). Al cerrar publica
+    las peticiones abortadas y los bytes ahorrados estimados.
+    """
+
+    def __init__(self, stats, resource_types, domains):
+        self.stats = stats
+        self.resource_types = resource_types
+        self.domains = domains
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('REQUEST_BLOCKING_ENABLED', True):
+            raise NotConfigured
+        ext = cls(crawler.stats,
+                  crawler.settings.getlist('BLOCKED_RESOURCE_TYPES'),
+                  crawler.settings.getlist('BLOCKED_DOMAINS'))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        domains = list(self.domains) + list(getattr(spider, 'blocked_domains', ()))
+        request_blocker.configure(self.resource_types, domains)
+        spider.logger.info(f"Bloqueo de peticiones: tipos {sorted(request_blocker.resource_types)}, "
+                           f"{len(request_blocker.domains)} dominios")
+
+    def spider_closed(self, spider):
+        for key, count in request_blocker.blocked.items():
+            self.stats.set_value(f'blocking/{key}', count)
+        self.stats.set_value('blocking/bytes_saved_estimate', request_blocker.bytes_saved)
+
+
+class BrowserRecycleExtension:
+    """
+    Vigila el Chromium de scrapy-playwright: cada BROWSER_RECYCLE_INTERVAL
+    segundos suma el RSS del navegador y sus renderers (/proc) y cuenta las
+    páginas servidas desde el último arranque. Si se pasa de
+    BROWSER_RECYCLE_RSS_MB o de BROWSER_RECYCLE_PAGES deja de admitir páginas
+    nuevas (BrowserRecycleMiddleware las retiene; el resto de peticiones y los
+    callbacks siguen), espera a que terminen las descargas y los callbacks que
+    tienen una página, cierra el navegador (o solo los contextos con
+    BROWSER_RECYCLE_SCOPE = 'context') y vuelve a admitirlas; las páginas
+    siguientes lo vuelven a lanzar. Si las páginas en uso no terminan en
+    BROWSER_RECYCLE_DRAIN_TIMEOUT s el siguiente intento se aplaza el doble
+    cada vez.
+    """
+
+    def __init__(self, crawler, rss_mb, pages, interval, drain_timeout, scope):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.rss_mb = rss_mb
+        self.pages = pages
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.scope = scope
+        self.served = 0
+        self.recycling = False
+        self.spider = None
+        self.loop = None
+        # Páginas admitidas cuya descarga sigue en curso
+        self.downloading = 0
+        # Se abre cuando se admiten páginas nuevas; cerrado mientras se recicla
+        self.admitting = None
+        # Aplazamiento tras un drenado que no terminó a tiempo
+        self.backoff = 0
+        self.next_attempt = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('BROWSER_RECYCLE_ENABLED', True):
+            raise NotConfigured
+        scope = settings.get('BROWSER_RECYCLE_SCOPE', 'browser')
+        if scope not in ('browser', 'context'):
+            raise ValueError(f"BROWSER_RECYCLE_SCOPE desconocido: {scope}")
+        ext = cls(crawler,
+                  rss_mb=settings.getint('BROWSER_RECYCLE_RSS_MB', 0),
+                  pages=settings.getint('BROWSER_RECYCLE_PAGES', 0),
+                  interval=settings.getfloat('BROWSER_RECYCLE_INTERVAL', 15),
+                  drain_timeout=settings.getfloat('BROWSER_RECYCLE_DRAIN_TIMEOUT', 300),
+                  scope=scope)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        spider.browser_recycle = self
+        self.admitting = asyncio.Event()
+        self.admitting.set()
+        self.loop = task.LoopingCall(lambda: deferred_from_coro(self._check()))
+        self.loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+
+    def response_received(self, response, request, spider):
+        if request.meta.get("playwright"):
+            self.served += 1
+
+    async def admit(self):
+        """Esperar, si se está reciclando, antes de abrir una página nueva"""
+        if not self.admitting.is_set():
+            start = time.monotonic()
+            await self.admitting.wait()
+            self.stats.inc_value('browser_recycle/held_ms', int((time.monotonic() - start) * 1000))
+        self.downloading += 1
+
+    def downloaded(self):
+        self.downloading -= 1
+
+    def _handler(self):
+        """Download handler de scrapy-playwright (el de https)"""
+        handlers = self.crawler.engine.downloader.handlers
+        for scheme in ('https', 'http'):
+            handler = handlers._get_handler(scheme)
+            if hasattr(handler, 'context_wrappers'):
+                return handler
+        return None
+
+    async def _check(self):
+        if self.recycling or time.monotonic() < self.next_attempt:
+            return
+        sample = browser_rss_mb()
+        rss = sample[0] if sample else 0
+        if sample:
+            self.stats.set_value('browser_recycle/rss_mb', int(rss))
+            self.stats.max_value('browser_recycle/rss_peak_mb', int(rss))
+            self.stats.max_value('browser_recycle/processes_max', sample[1])
+        if self.rss_mb and rss >= self.rss_mb:
+            reason = 'rss'
+        elif self.pages and self.served >= self.pages:
+            reason = 'pages'
+        else:
+            return
+        handler = self._handler()
+        if handler is None:
+            return
+        self.recycling = True
+        try:
+            await self._recycle(handler, reason, rss)
+        finally:
+            self.recycling = False
+
+    def _drained(self):
+        tracker = getattr(self.spider, 'page_tracker', None)
+        return not self.downloading and not (tracker and tracker.in_use)
+
+    def _postpone(self):
+        """Aplazar el siguiente intento: el doble cada vez, hasta 4 veces el drenado"""
+        limit = 4 * max(self.drain_timeout, self.interval)
+        self.backoff = min(self.backoff * 2 if self.backoff else self.interval, limit)
+        self.next_attempt = time.monotonic() + self.backoff
+        self.stats.inc_value('browser_recycle/postponed')
+        self.spider.logger.warning(
+            f"Las páginas en uso no terminaron en {self.drain_timeout:.0f} s, "
+            f"se reintenta el reciclado en {self.backoff:.0f} s")
+
+    async def _recycle(self, handler, reason, rss):
+        self.spider.logger.info(
+            f"Reciclando el navegador ({reason}: {int(rss)} MB, {self.served} páginas); "
+            f"las páginas nuevas esperan a que terminen las que están en uso")
+        self.admitting.clear()
+        try:
+            start = time.monotonic()
+            while not self._drained():
+                if time.monotonic() - start > self.drain_timeout:
+                    self._postpone()
+                    return
+                await asyncio.sleep(0.5)
+            self.stats.inc_value('browser_recycle/drain_ms', int((time.monotonic() - start) * 1000))
+            self.backoff = 0
+
+            pool = getattr(self.spider, 'page_pool', None)
+            if pool is not None:
+                await pool.close()
+            await self._relaunch(handler)
+            self.served = 0
+            self.stats.inc_value('browser_recycle/count')
+            self.stats.inc_value(f'browser_recycle/reason/{reason}')
+            sample = browser_rss_mb()
+            if sample:
+                self.spider.logger.info(f"Navegador reciclado: {int(sample[0])} MB tras cerrar")
+        finally:
+            self.admitting.set()
+
+    async def _relaunch(self, handler):
+        """Cerrar contextos (y navegador) y volver a crear los contextos de arranque"""
+        with suppress(Exception):
+            await asyncio.gather(*[ctx.context.close() for ctx in list(handler.context_wrappers.values())])
+        handler.context_wrappers.clear()
+        if self.scope == 'browser' and hasattr(handler, 'browser'):
+            # Sin el callback de desconexión: cerraría los contextos que se crean justo después
+            browser = handler.browser
+            browser.remove_listener("disconnected", handler._browser_disconnected_callback)
+            del handler.browser
+            # WarmBrowser (handler.py) solo se suelta con close(): shutdown() lo cierra de verdad
+            close = getattr(browser, 'shutdown', None) or browser.close
+            with suppress(Exception):
+                await close()
+        # PLAYWRIGHT_CONTEXTS (el persistente) se vuelve a lanzar ahora, como al arrancar
+        startup = handler.config.startup_context_kwargs or {}
+        await asyncio.gather(*[
+            handler._create_browser_context(name=name, context_kwargs=kwargs, spider=self.spider)
+            for name, kwargs in startup.items()
+        ])
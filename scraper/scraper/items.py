@@ -4,6 +4,9 @@
 # https://docs.scrapy.org/en/latest/topics/items.html
 
 import datetime
+from dataclasses import dataclass, fields
+from typing import Optional
+
 import scrapy
 
 class ScraperItem(scrapy.Item):
@@ -26,5 +29,73 @@ class ScraperItem(scrapy.Item):
         current_date = datetime.datetime.now()
         self['result_date'] = current_date.strftime('%Y-%m-%d')
         self['result_time'] = current_date.strftime('%H:%M:%S')
-    
-    
+
+
+def _now_stamp():
+    current_date = datetime.datetime.now()
+    return current_date.strftime('%Y-%m-%d'), current_date.strftime('%H:%M:%S')
+
+
+# Fecha y hora de la ejecución, compartidas por todos los ProductItem
+_run_stamp = _now_stamp()
+
+
+def start_run():
+    """Fijar la fecha y hora de una nueva ejecución (procesos que se reutilizan)"""
+    global _run_stamp
+    _run_stamp = _now_stamp()
+    return _run_stamp
+
+
+@dataclass(slots=True)
+class ProductItem:
+    """
+    Versión ligera de ScraperItem: los mismos 11 campos en __slots__, los
+    numéricos como float y la fecha/hora tomadas una sola vez por ejecución.
+    Acepta item['campo'] e item.get('campo') para que las arañas no cambien.
+    """
+
+    name: Optional[str] = None
+    category: Optional[str] = None
+    sub_category: Optional[str] = None
+    result_date: Optional[str] = None
+    result_time: Optional[str] = None
+
+    price: Optional[float] = None
+    unit_price: Optional[float] = None
+    total_unit_quantity: Optional[float] = None
+    unit_type: Optional[str] = None
+
+    comercial_name: Optional[str] = None
+    comercial_id: Optional[str] = None
+
+    def __post_init__(self):
+        if self.result_date is None:
+            self.result_date, self.result_time = _run_stamp
+        for key in FLOAT_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                setattr(self, key, float(value))
+
+    def __getitem__(self, key):
+        if key not in FIELD_NAMES:
+            raise KeyError(f"{self.__class__.__name__} no tiene el campo: {key}")
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELD_NAMES:
+            raise KeyError(f"{self.__class__.__name__} no tiene el campo: {key}")
+        if key in FLOAT_FIELDS and value is not None:
+            value = float(value)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in FIELD_NAMES else None
+        return default if value is None else value
+
+
+FIELD_NAMES = frozenset(field.name for field in fields(ProductItem))
+FLOAT_FIELDS = ('price', 'unit_price', 'total_unit_quantity')
+
+# Tipos de item que aceptan los pipelines
+PRODUCT_ITEMS = (ScraperItem, ProductItem)
@@ -3,11 +3,21 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import zlib
+from collections import Counter
+from urllib.parse import urlsplit
+
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from scraper.spiders.utils.page_pool import PagePool
+from scraper.spiders.utils.page_tracker import PageTracker
+from scraper.spiders.utils.storage_state import StorageStateManager
+
 
 class ScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -98,3 +108,313 @@ class ScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class StorageStateMiddleware:
+    """
+    Inyecta el estado del navegador guardado (StorageStateManager) en las
+    peticiones de Playwright que no piden un contexto concreto, para que sus
+    páginas empiecen con las ventanas de entrada ya superadas. La araña guarda
+    el estado con save_storage_state(spider, page) tras cerrarlas. Las
+    renovaciones de sesión (meta["session_renewal"]) no lo reciben: es el
+    estado que acaba de caducar.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('STORAGE_STATE_ENABLED', True):
+            raise NotConfigured
+        s = cls()
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        return s
+
+    def process_request(self, request, spider):
+        manager = getattr(spider, 'storage_state', None)
+        meta = request.meta
+        if (manager is None or not meta.get("playwright") or "playwright_context" in meta
+                or meta.get("session_renewal")):
+            return None
+        meta.update(manager.context_meta())
+        return None
+
+    def spider_opened(self, spider):
+        spider.storage_state = StorageStateManager(spider)
+
+
+class PagePoolMiddleware:
+    """
+    Reutiliza páginas de Playwright entre categorías (PagePool): reserva un
+    hueco por contexto antes de cada petición con playwright_include_page y
+    pasa una página libre en meta["playwright_page"] si la hay. Al cerrar la
+    araña cierra las páginas libres.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        size = settings.getint('PAGE_POOL_SIZE', 0)
+        if size <= 0:
+            raise NotConfigured
+        # Las páginas libres siguen ocupando un hueco de scrapy-playwright en su contexto
+        max_pages = settings.getint('PLAYWRIGHT_MAX_PAGES_PER_CONTEXT') or settings.getint('CONCURRENT_REQUESTS')
+        size = min(size, max_pages)
+        pool = PagePool(crawler.stats, size,
+                        max_uses=settings.getint('PAGE_POOL_MAX_USES', 50),
+                        clear_storage=settings.getbool('PAGE_POOL_CLEAR_STORAGE', False))
+        s = cls(pool)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    async def process_request(self, request, spider):
+        meta = request.meta
+        if not meta.get("playwright") or not meta.get("playwright_include_page") or "playwright_page" in meta:
+            return None
+        context_name = meta.get("playwright_context", "default")
+        page = await self.pool.lease(context_name)
+        if page is not None:
+            meta["playwright_page"] = page
+        meta["page_pool_context"] = context_name
+        return None
+
+    def process_response(self, request, response, spider):
+        self._track(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._track(request)
+        return None
+
+    def _track(self, request):
+        context_name = request.meta.pop("page_pool_context", None)
+        if context_name is None:
+            return
+        page = request.meta.get("playwright_page")
+        if page is None:
+            self.pool.abandon(context_name)
+        else:
+            self.pool.track(page, context_name, request.meta.get("playwright_page_event_handlers"))
+
+    def spider_opened(self, spider):
+        spider.page_pool = self.pool
+
+    async def spider_closed(self, spider):
+        await self.pool.close()
+
+
+class ContextRoutingMiddleware:
+    """
+    Reparte las peticiones de Playwright entre BROWSER_CONTEXTS contextos
+    aislados y no persistentes ("<contexto>-0", "<contexto>-1", ...), por turno
+    (BROWSER_CONTEXT_STRATEGY = 'round_robin') o al que tenga menos descargas
+    en curso ('least_loaded'). Se respeta el contexto pedido por la araña o el
+    del estado guardado: solo se le añade el sufijo, con sus mismos kwargs.
+    """
+
+    def __init__(self, stats, contexts, strategy, predefined):
+        self.stats = stats
+        self.contexts = contexts
+        self.strategy = strategy
+        # Contextos de PLAYWRIGHT_CONTEXTS (persistentes): no se dividen
+        self.predefined = set(predefined)
+        self.next_index = 0
+        self.in_flight = Counter()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        contexts = settings.getint('BROWSER_CONTEXTS', 0)
+        if contexts <= 0:
+            raise NotConfigured
+        strategy = settings.get('BROWSER_CONTEXT_STRATEGY', 'round_robin')
+        if strategy not in ('round_robin', 'least_loaded'):
+            raise ValueError(f"BROWSER_CONTEXT_STRATEGY desconocida: {strategy}")
+        return cls(crawler.stats, contexts, strategy, settings.getdict('PLAYWRIGHT_CONTEXTS'))
+
+    def _pick(self):
+        if self.strategy == 'least_loaded':
+            return min(range(self.contexts), key=lambda index: (self.in_flight[index], index))
+        index = self.next_index
+        self.next_index = (index + 1) % self.contexts
+        return index
+
+    def process_request(self, request, spider):
+        meta = request.meta
+        if not meta.get("playwright"):
+            return None
+        # Los reintentos conservan context_index y vuelven al mismo contexto
+        index = meta.get("context_index")
+        if index is None:
+            base = meta.get("playwright_context", "default")
+            if "playwright_page" in meta or base in self.predefined:
+                return None
+            index = self._pick()
+            meta["playwright_context"] = f"{base}-{index}"
+            meta["context_index"] = index
+            # Un slot de descarga por contexto: DOWNLOAD_DELAY y AutoThrottle se
+            # aplican a cada contexto como si fuera un navegador independiente
+            if "download_slot" not in meta:
+                meta["download_slot"] = f"{urlparse_cached(request).hostname}#{index}"
+        self.in_flight[index] += 1
+        self.stats.inc_value(f'contexts/requests/{index}')
+        return None
+
+    def process_response(self, request, response, spider):
+        self._done(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._done(request)
+        return None
+
+    def _done(self, request):
+        index = request.meta.get("context_index")
+        if index is not None:
+            self.in_flight[index] -= 1
+
+
+class BrowserRecycleMiddleware:
+    """
+    Retiene las peticiones de Playwright mientras BrowserRecycleExtension
+    recicla el navegador y le cuenta las descargas de páginas en curso. Las
+    peticiones sin navegador y los callbacks no se detienen. Va antes que los
+    middlewares que reservan página o contexto para no ocuparlos mientras espera.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('BROWSER_RECYCLE_ENABLED', True):
+            raise NotConfigured
+        return cls()
+
+    async def process_request(self, request, spider):
+        recycler = getattr(spider, 'browser_recycle', None)
+        if recycler is None or not request.meta.get("playwright"):
+            return None
+        await recycler.admit()
+        request.meta["browser_recycle_admitted"] = True
+        return None
+
+    def process_response(self, request, response, spider):
+        self._done(request, spider)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._done(request, spider)
+        return None
+
+    def _done(self, request, spider):
+        if request.meta.pop("browser_recycle_admitted", False):
+            spider.browser_recycle.downloaded()
+
+
+class PageLeakDownloaderMiddleware:
+    """
+    Registra en spider.page_tracker cada página de Playwright que llega a la
+    araña con una respuesta. Si la descarga falla, cierra la página y la quita
+    del meta: los reintentos piden una página nueva y los errbacks ya no la
+    tienen que cerrar. Va después de PagePoolMiddleware (más cerca del
+    descargador) para cerrarla antes de que el pool la registre.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PAGE_LEAK_TRACKING', True):
+            raise NotConfigured
+        s = cls()
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_response(self, request, response, spider):
+        page = request.meta.get("playwright_page")
+        if page is not None:
+            spider.page_tracker.register(page, request.url)
+        return response
+
+    async def process_exception(self, request, exception, spider):
+        page = request.meta.pop("playwright_page", None)
+        if page is not None and not page.is_closed():
+            spider.crawler.stats.inc_value('pages/closed_on_failure')
+            await spider.page_tracker.close(page)
+        return None
+
+    def spider_opened(self, spider):
+        spider.page_tracker = PageTracker(spider.crawler.stats, spider.logger)
+
+    def spider_closed(self, spider):
+        spider.page_tracker.report()
+
+
+class PageLeakSpiderMiddleware:
+    """
+    Cierra la página de la respuesta cuando el callback termina (o lanza una
+    excepción) sin haberla devuelto con release_page() ni cerrado, salvo que
+    la haya pasado en meta["playwright_page"] a una petición nueva.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PAGE_LEAK_TRACKING', True):
+            raise NotConfigured
+        return cls()
+
+    async def process_spider_output(self, response, result, spider):
+        page = response.meta.get("playwright_page")
+        tracker = getattr(spider, 'page_tracker', None)
+        if page is None or tracker is None:
+            async for item in result:
+                yield item
+            return
+
+        handed_off = False
+        try:
+            async for item in result:
+                if isinstance(item, Request) and item.meta.get("playwright_page") is page:
+                    handed_off = True
+                yield item
+        finally:
+            if not handed_off:
+                await tracker.settle(page, getattr(response.request.callback, '__name__', 'parse'))
+
+
+class StartShardMiddleware:
+    """
+    Reparte las URLs iniciales entre varias ejecuciones (procesos o
+    invocaciones de Lambda): con START_SHARD = 'i/n' la araña solo lanza las
+    peticiones iniciales cuyo crc32 de la URL (sin query) módulo n es i. Lo
+    que generan los callbacks no se filtra, así que las arañas con una sola
+    página de entrada (cruzverde) no se reparten.
+    """
+
+    def __init__(self, stats, index, total):
+        self.stats = stats
+        self.index = index
+        self.total = total
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        shard = crawler.settings.get('START_SHARD') or '0/1'
+        try:
+            index, total = (int(part) for part in str(shard).split('/'))
+        except ValueError:
+            raise ValueError(f"START_SHARD debe ser 'i/n': {shard}")
+        if not 0 <= index < total:
+            raise ValueError(f"START_SHARD fuera de rango: {shard}")
+        if total == 1:
+            raise NotConfigured
+        return cls(crawler.stats, index, total)
+
+    async def process_start(self, start):
+        async for request in start:
+            if isinstance(request, Request):
+                url = request.meta.get("original_url", request.url)
+                key = urlsplit(url)._replace(query='', fragment='').geturl()
+                if zlib.crc32(key.encode()) % self.total != self.index:
+                    self.stats.inc_value('shard/skipped')
+                    continue
+                self.stats.inc_value('shard/requests')
+            yield request
@@ -1,15 +1,113 @@
 # useful for handling different item types with a single interface
+import io
+import operator
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
 from itemadapter import ItemAdapter
 import psycopg2
-from scraper.items import ScraperItem
+from psycopg2.extras import execute_values
+from twisted.internet import defer, task
+from scraper.items import PRODUCT_ITEMS, ProductItem
+from scraper.spool import Spool
 from scraper.config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
 from scrapy.exceptions import NotConfigured
+from scrapy.settings import Settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dependencia opcional, solo para ParquetExportPipeline
+    pa = None
+
+
+# Columnas de las tablas por país, en el orden usado por COPY
+COLUMNS = (
+    'name', 'price', 'unit_price', 'total_unit_quantity', 'unit_type',
+    'category', 'sub_category', 'comercial_name', 'comercial_id',
+    'result_date', 'result_time'
+)
+_row_of = operator.attrgetter(*COLUMNS)
+_NAME, _PRICE, _UNIT_PRICE = 0, 1, 2
+_COMERCIAL_ID, _RESULT_DATE = 8, 9
+
+# Modos de escritura: 'append' guarda todas las filas, 'delta' solo los
+# productos nuevos o con cambio de precio y un marcador de "visto" para el resto,
+# 'upsert' una sola fila por producto y día aunque la araña se repita
+WRITE_MODES = ('append', 'delta', 'upsert')
+UPSERT_KEY = ('name', 'comercial_id', 'result_date')
+
+
+# Marcas de control para el hilo escritor
+_STOP = object()
+_HEARTBEAT = object()
+
+
+def _price_key(price, unit_price):
+    """Precio normalizado para comparar el último valor conocido"""
+    return (
+        round(float(price), 4) if price is not None else None,
+        round(float(unit_price), 4) if unit_price is not None else None,
+    )
+
+
+def _copy_value(value):
+    """Serializar un valor al formato de texto de COPY"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
 
 
 class PostgresPipeline:
 
-    def __init__(self):
+    def __init__(self, stats=None, settings=None):
+        settings = settings if settings is not None else Settings()
         self.pais = None
+        self.connection = None
+        self.cur = None
+        self.stats = stats
+        # Tamaño máximo del lote y segundos máximos que un item espera en memoria
+        self.batch_size = max(1, settings.getint('POSTGRES_BATCH_SIZE', 500))
+        self.flush_interval = settings.getfloat('POSTGRES_FLUSH_INTERVAL', 30.0)
+        self.buffer = []
+        self.seen_buffer = []
+        self.last_flush = time.monotonic()
+        self.flush_task = None
+        self.write_mode = settings.get('POSTGRES_WRITE_MODE', 'append')
+        if self.write_mode not in WRITE_MODES:
+            raise NotConfigured(
+                f"POSTGRES_WRITE_MODE debe ser uno de {WRITE_MODES}, no '{self.write_mode}'")
+        # Modo delta: último precio conocido por (comercial_id, name)
+        self.delta_lookback_days = settings.getint(
+            'POSTGRES_DELTA_LOOKBACK_DAYS', 30)
+        self.price_index = {}
+        # El modo de escritura se prepara tras la primera conexión que lo consigue
+        self.prepared = False
+        # Precios de las filas aún en el buffer: pasan al índice tras el commit
+        self.pending_prices = {}
+        # Salud de la conexión: keepalive TCP + sondeo solo si está inactiva
+        self.heartbeat_interval = settings.getfloat(
+            'POSTGRES_HEARTBEAT_INTERVAL', 60.0)
+        self.keepalive_kwargs = {
+            'keepalives': 1,
+            'keepalives_idle': settings.getint('POSTGRES_KEEPALIVES_IDLE', 30),
+            'keepalives_interval': settings.getint('POSTGRES_KEEPALIVES_INTERVAL', 10),
+            'keepalives_count': settings.getint('POSTGRES_KEEPALIVES_COUNT', 3),
+        }
+        self.last_activity = time.monotonic()
+        self.heartbeat_task = None
+        # Spool local para los lotes que no se pueden escribir en la BD
+        self.spool_dir = settings.get('SPOOL_DIR', 'spool')
+        self.spool_segment_rows = settings.getint('SPOOL_SEGMENT_ROWS', 50000)
+        self.spool = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(stats=crawler.stats, settings=crawler.settings)
 
     def _connect(self):
         """Establecer conexión a la base de datos"""
@@ -24,7 +122,8 @@ class PostgresPipeline:
             user=username,
             password=password,
             dbname=database,
-            port=port
+            port=port,
+            **self.keepalive_kwargs
         )
 
         self.cur = self.connection.cursor()
@@ -38,12 +137,14 @@ class PostgresPipeline:
 
         # Verificar si la tabla existe
         self.cur.execute(f"""
-            SELECT table_schema, table_name 
-            FROM information_schema.tables 
+            SELECT table_schema, table_name
+            FROM information_schema.tables
             WHERE table_name = '{self.pais}'
         """)
         tables = self.cur.fetchall()
         print(f"Tablas '{self.pais}' encontradas: {tables}")
+        self.connection.commit()
+        self.last_activity = time.monotonic()
 
     def open_spider(self, spider):
         """
@@ -59,98 +160,608 @@ class PostgresPipeline:
             # raise scrapy.exceptions.NotConfigured("Spider attribute 'pais' is required for PostgresPipeline")
         else:
             spider.logger.info(
-                f"Pipeline de PostgreSQL iniciando para la tabla '{self.pais}'...")
-            self._connect()  # Nos conectamos usando el país obtenido
+                f"Pipeline de PostgreSQL iniciando para la tabla '{self.pais}' "
+                f"(lotes de {self.batch_size}, flush cada {self.flush_interval}s)...")
+            try:
+                self._connect()  # Nos conectamos usando el país obtenido
+            except psycopg2.OperationalError as e:
+                spider.logger.error(
+                    f"No se pudo conectar a PostgreSQL para la tabla '{self.pais}'. "
+                    f"Los items se guardarán en el spool local: {e}")
+
+            if self._is_connected():
+                self._after_connect(spider.logger)
+
+            # Vaciar el buffer periódicamente aunque no se llene el lote
+            if self.flush_interval > 0:
+                self.last_flush = time.monotonic()
+                self.flush_task = task.LoopingCall(self._flush_if_due, spider)
+                self.flush_task.start(self.flush_interval, now=False)
+
+            if self.heartbeat_interval > 0:
+                self.heartbeat_task = task.LoopingCall(self._heartbeat, spider)
+                self.heartbeat_task.start(self.heartbeat_interval, now=False)
+
+    def _stop_tasks(self):
+        for looping_call in (self.flush_task, self.heartbeat_task):
+            if looping_call and looping_call.running:
+                looping_call.stop()
 
     def close_spider(self, spider):
+        self._stop_tasks()
+        self._flush(spider)
         if self.cur:
             self.cur.close()
         if self.connection:
             self.connection.close()
+        if self.spool:
+            self.spool.close()
+            spider.logger.warning(
+                f"{self.spool.rows_written} items y {self.spool.seen_written} marcadores "
+                f"guardados en el spool {self.spool.path}. "
+                f"Usa 'scrapy replay_spool --spider {spider.name}' para cargarlos.")
         spider.logger.info(
             f"Pipeline de PostgreSQL cerrado para la tabla '{self.pais}'.")
 
-    def _reconnect_if_needed(self, spider):
-        """Reconectar si la conexión está cerrada"""
+    def _create_seen_table(self):
+        """Tabla de marcadores del modo delta: última fecha en que se vio cada producto"""
+        self.cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.pais}_seen (
+                comercial_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                last_seen DATE NOT NULL,
+                PRIMARY KEY (comercial_id, name)
+            )
+        """)
+        self.connection.commit()
+
+    def _prepare_delta(self, logger):
+        """Crear la tabla de marcadores y cargar el último precio de cada producto"""
+        self._create_seen_table()
+
+        price_index = {}
+        since = (date.today() - timedelta(days=self.delta_lookback_days)).strftime('%Y-%m-%d')
+        # Cursor con nombre: las filas se leen del servidor por bloques
+        with self.connection.cursor(name=f"{self.pais}_price_index") as index_cur:
+            index_cur.itersize = 20000
+            index_cur.execute(f"""
+                SELECT DISTINCT ON (comercial_id, name) comercial_id, name, price, unit_price
+                FROM {self.pais}
+                WHERE result_date >= %s
+                ORDER BY comercial_id, name, result_date DESC, result_time DESC
+            """, (since,))
+            for comercial_id, name, price, unit_price in index_cur:
+                price_index[(comercial_id, name)] = _price_key(price, unit_price)
+        self.connection.commit()
+        # Se publica de una vez: tras una reconexión el hilo escritor lo carga
+        # mientras el reactor sigue consultándolo
+        price_index.update(self.price_index)
+        self.price_index = price_index
+        logger.info(
+            f"Modo delta: {len(self.price_index)} precios cargados de '{self.pais}' "
+            f"(últimos {self.delta_lookback_days} días)")
+
+    def _prepare_upsert(self, logger):
+        """Crear (una sola vez) el índice único que respalda el upsert"""
+        try:
+            self.cur.execute(f"""
+                CREATE UNIQUE INDEX IF NOT EXISTS {self.pais}_upsert_key
+                ON {self.pais} ({', '.join(UPSERT_KEY)})
+            """)
+            self.connection.commit()
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            # Sin conexión no se sabe si hay duplicados: se reintenta al reconectar
+            raise
+        except psycopg2.Error as e:
+            # Normalmente hay duplicados antiguos que se deben limpiar una vez
+            self.connection.rollback()
+            self.write_mode = 'append'
+            logger.error(
+                f"No se pudo crear el índice único de '{self.pais}', "
+                f"se usará el modo 'append': {e}")
+
+    def _after_connect(self, logger):
+        """
+        Preparar el modo de escritura tras una conexión exitosa. Si la BD no
+        estaba al abrir la araña, se hace en la primera reconexión que funcione.
+        """
+        if self.prepared:
+            return
         try:
-            # Probar la conexión
-            if self.connection.closed != 0:
+            if self.write_mode == 'delta':
+                self._prepare_delta(logger)
+            elif self.write_mode == 'upsert':
+                self._prepare_upsert(logger)
+        except psycopg2.Error as e:
+            try:
+                self.connection.rollback()
+            except psycopg2.Error:
+                pass
+            logger.error(
+                f"No se pudo preparar el modo '{self.write_mode}' de '{self.pais}', "
+                f"se reintentará en la próxima reconexión: {e}")
+            return
+        self.prepared = True
+
+    def _is_connected(self):
+        return bool(self.connection and self.connection.closed == 0 and self.cur)
+
+    def _reconnect(self, spider):
+        """Cerrar la conexión actual y abrir una nueva"""
+        try:
+            # Cerrar conexiones existentes si están abiertas
+            if self.cur:
+                self.cur.close()
+            if self.connection:
+                self.connection.close()
+        except:
+            pass
+
+        try:
+            self._connect()
+        except psycopg2.Error as e:
+            spider.logger.error(f"Reconexión a PostgreSQL fallida: {e}")
+            return False
+        self._inc_stat('postgres/reconnects')
+        spider.logger.info("Reconexión a PostgreSQL exitosa")
+        self._after_connect(spider.logger)
+        return True
+
+    def _heartbeat(self, spider):
+        """Sondear la conexión solo si no hubo escrituras en el último intervalo"""
+        if time.monotonic() - self.last_activity < self.heartbeat_interval:
+            return
+        try:
+            if not self._is_connected():
                 raise psycopg2.InterfaceError("Connection is closed")
             self.cur.execute("SELECT 1;")
+            self.connection.rollback()
+            self.last_activity = time.monotonic()
         except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
             spider.logger.warning(f"Conexión perdida, reconectando: {e}")
-            try:
-                # Cerrar conexiones existentes si están abiertas
-                if hasattr(self, 'cur') and self.cur:
-                    self.cur.close()
-                if hasattr(self, 'connection') and self.connection:
-                    self.connection.close()
-            except:
-                pass
+            self._reconnect(spider)
 
-            # Reestablecer conexión
-            self._connect()
-            spider.logger.info("Reconexión a PostgreSQL exitosa")
+    def _inc_stat(self, key, count=1):
+        if self.stats:
+            self.stats.inc_value(key, count)
 
-    def process_item(self, item, spider):
-        if not self.connection or self.connection.closed != 0 or not self.cur:
-            spider.logger.error(
-                f"No hay conexión a BD válida para tabla '{self.pais}'. Descartando item: {item.get('name')}")
-            return item  # O raise DropItem
+    def _row(self, item):
+        """Convertir un item en una tupla con el orden de COLUMNS"""
+        if type(item) is ProductItem:
+            return _row_of(item)
+        adapter = ItemAdapter(item)
+        return tuple(adapter.get(column) for column in COLUMNS)
+
+    def _copy_data(self, rows):
+        """Serializar filas al formato de texto de COPY"""
+        data = io.StringIO()
+        for row in rows:
+            data.write('\t'.join(_copy_value(value) for value in row))
+            data.write('\n')
+        data.seek(0)
+        return data
+
+    def _copy_rows(self, rows, table=None):
+        """Enviar un lote completo en una sola operación COPY FROM STDIN"""
+        data = self._copy_data(rows)
+        self.cur.copy_expert(
+            f"COPY {table or self.pais} ({', '.join(COLUMNS)}) FROM STDIN", data)
+
+    def _upsert_rows(self, rows):
+        """
+        Cargar el lote en una tabla temporal y fusionarlo con un único
+        INSERT ... ON CONFLICT DO UPDATE sobre (name, comercial_id, result_date)
+        """
+        stage = f"{self.pais}_stage"
+        # La tabla temporal vive lo que la conexión y se vacía en cada commit
+        self.cur.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {stage}
+            (LIKE {self.pais} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+        """)
+        self._copy_rows(rows, table=stage)
+        updates = ', '.join(
+            f"{column} = EXCLUDED.{column}" for column in COLUMNS if column not in UPSERT_KEY)
+        # Si el lote repite un producto en el mismo día, gana la lectura más reciente
+        self.cur.execute(f"""
+            INSERT INTO {self.pais} ({', '.join(COLUMNS)})
+            SELECT DISTINCT ON ({', '.join(UPSERT_KEY)}) {', '.join(COLUMNS)}
+            FROM {stage}
+            ORDER BY {', '.join(UPSERT_KEY)}, result_time DESC
+            ON CONFLICT ({', '.join(UPSERT_KEY)}) DO UPDATE SET {updates}
+        """)
+
+    def _store_rows(self, rows):
+        """Escribir un lote según el modo configurado (sin commit)"""
+        if self.write_mode == 'upsert':
+            self._upsert_rows(rows)
+        else:
+            self._copy_rows(rows)
+
+    def _flush_if_due(self, spider):
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            return self._flush(spider)
+
+    def _flush(self, spider):
+        """Vaciar el buffer acumulado"""
+        if not self.buffer and not self.seen_buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        seen, self.seen_buffer = self.seen_buffer, []
+        prices, self.pending_prices = self.pending_prices, {}
+        self.last_flush = time.monotonic()
+        if self._write_rows(rows, spider, seen):
+            # El índice solo avanza con lo que ya está en la BD
+            self.price_index.update(prices)
+
+    def _mark_seen(self, seen):
+        """Actualizar en bloque la fecha de los productos sin cambio de precio"""
+        # Sin claves repetidas: ON CONFLICT no puede tocar la misma fila dos veces
+        latest = {(comercial_id, name): result_date
+                  for comercial_id, name, result_date in seen}
+        # GREATEST: un spool recargado tarde no retrocede la fecha ya marcada
+        execute_values(self.cur, f"""
+            INSERT INTO {self.pais}_seen (comercial_id, name, last_seen)
+            VALUES %s
+            ON CONFLICT (comercial_id, name) DO UPDATE
+            SET last_seen = GREATEST({self.pais}_seen.last_seen, EXCLUDED.last_seen)
+        """, [(comercial_id, name, result_date)
+              for (comercial_id, name), result_date in latest.items()])
 
-        self._reconnect_if_needed(spider)
+    def _spool_rows(self, rows, spider, seen=()):
+        """Guardar en el spool local un lote (filas y marcadores) que no llegó a la BD"""
+        if self.spool is None:
+            self.spool = Spool(self.spool_dir, spider.name, self.pais,
+                               COLUMNS, self.spool_segment_rows)
+        self.spool.append(rows)
+        self.spool.append_seen(seen)
+        self._inc_stat('spool/rows', len(rows))
+        if seen:
+            self._inc_stat('spool/seen', len(seen))
 
-        # Volver a verificar después del intento de reconexión
-        if not self.connection or self.connection.closed != 0 or not self.cur:
+    def _write_rows(self, rows, spider, seen=()):
+        """
+        Escribir un lote con COPY y un único commit. Si la conexión falla
+        durante la escritura se reconecta y se reintenta el lote una vez;
+        si aun así no se puede escribir, el lote va al spool local.
+        Devuelve True solo si el lote quedó confirmado en la BD.
+        """
+        if not self.pais:
             spider.logger.error(
-                f"Reconexión fallida para tabla '{self.pais}'. Descartando item: {item.get('name')}")
-            return item  # O raise DropItem
-        if isinstance(item, ScraperItem):
-            adapter = ItemAdapter(item)
+                f"La araña no tiene 'pais'. Descartando lote de {len(rows)} items")
+            return False
 
+        for attempt in range(2):
+            if not self._is_connected() and not self._reconnect(spider):
+                break
             try:
-                insert_sql = f"""
-                    INSERT INTO {self.pais} (
-                        name, price, unit_price, total_unit_quantity, unit_type,
-                        category, sub_category, comercial_name, comercial_id,
-                        result_date, result_time
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-
-                data_tuple = (
-                    adapter.get('name'),
-                    adapter.get('price'),
-                    adapter.get('unit_price'),
-                    adapter.get('total_unit_quantity'),
-                    adapter.get('unit_type'),
-                    adapter.get('category'),
-                    adapter.get('sub_category'),
-                    adapter.get('comercial_name'),
-                    adapter.get('comercial_id'),
-                    adapter.get('result_date'),
-                    adapter.get('result_time')
-                )
-
-                # spider.logger.info(
-                #     f"Insertando producto en tabla '{self.pais}': {adapter.get('name')} - {adapter.get('comercial_name')}")
-                # spider.logger.debug(f"Datos a insertar: {data_tuple}")
-
-                self.cur.execute(insert_sql, data_tuple)
+                if rows:
+                    self._store_rows(rows)
+                if seen:
+                    self._mark_seen(seen)
                 self.connection.commit()
+                self.last_activity = time.monotonic()
+                self._inc_stat('postgres/batches')
+                self._inc_stat('postgres/rows_written', len(rows))
+                self._inc_stat('postgres/rows_seen', len(seen))
+                return True
 
-                # spider.logger.info(
-                #     f"Producto guardado exitosamente en la tabla '{self.pais}'")
+            except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+                spider.logger.warning(
+                    f"Conexión perdida al escribir lote de {len(rows)} items: {e}")
+                self._reconnect(spider)
+                if attempt == 0:
+                    self._inc_stat('postgres/retried_rows', len(rows))
 
             except Exception as e:
                 try:
-                    if hasattr(self, 'connection') and self.connection and self.connection.closed == 0:
+                    if self._is_connected():
                         self.connection.rollback()
                 except Exception as rollback_error:
                     spider.logger.warning(
                         f"Error en rollback: {rollback_error}")
 
-                # spider.logger.error(
-                #     f"Error al guardar el item en PostgreSQL tabla '{self.pais}': {e}")
-                # spider.logger.error(f"Datos del item: {dict(adapter)}")
+                self._inc_stat('postgres/rows_failed', len(rows))
+                spider.logger.error(
+                    f"Error al guardar lote de {len(rows)} items en PostgreSQL tabla '{self.pais}'. "
+                    f"Enviando el lote al spool local: {e}")
+                self._spool_rows(rows, spider, seen)
+                return False
+
+        spider.logger.error(
+            f"No hay conexión a BD válida para tabla '{self.pais}'. "
+            f"Enviando lote de {len(rows)} items al spool local")
+        self._spool_rows(rows, spider, seen)
+        return False
+
+    def _buffer_row(self, row):
+        """
+        Agregar una fila al buffer. En modo delta, los productos cuyo precio
+        no cambió solo dejan un marcador de "visto".
+        """
+        if self.write_mode != 'delta':
+            self.buffer.append(row)
+            return
+
+        key = (row[_COMERCIAL_ID], row[_NAME])
+        price = _price_key(row[_PRICE], row[_UNIT_PRICE])
+        last_price = self._last_price(key)
+        if last_price == price:
+            self.seen_buffer.append((key[0], key[1], row[_RESULT_DATE]))
+            self._inc_stat('postgres/delta/unchanged')
+            return
+
+        self._inc_stat('postgres/delta/new' if last_price is None
+                       else 'postgres/delta/changed')
+        self.pending_prices[key] = price
+        self.buffer.append(row)
+
+    def _last_price(self, key):
+        """Último precio conocido, contando las filas que aún no se escribieron"""
+        if key in self.pending_prices:
+            return self.pending_prices[key]
+        return self.price_index.get(key)
+
+    def _batch_full(self):
+        return len(self.buffer) + len(self.seen_buffer) >= self.batch_size
+
+    def process_item(self, item, spider):
+        if isinstance(item, PRODUCT_ITEMS):
+            self._buffer_row(self._row(item))
+            if self._batch_full():
+                self._flush(spider)
+            elif self.flush_interval > 0:
+                self._flush_if_due(spider)
+
+        return item
+
+
+class ThreadedPostgresPipeline(PostgresPipeline):
+    """
+    Variante write-behind del PostgresPipeline. Los lotes se entregan a un
+    hilo escritor dedicado a través de una cola acotada, de modo que psycopg2
+    nunca bloquea el reactor que también mueve las páginas de Playwright.
+    Cuando la cola está llena, process_item devuelve un Deferred que no se
+    resuelve hasta que haya espacio, y Scrapy aplica backpressure. La espera
+    vive en el reactor (el hilo escritor avisa con callFromThread al sacar un
+    lote), así que no ocupa hilos del threadpool que también usa el DNS.
+    """
+
+    def __init__(self, stats=None, settings=None):
+        super().__init__(stats=stats, settings=settings)
+        settings = settings if settings is not None else Settings()
+        # Número máximo de lotes pendientes de escribir
+        self.queue = queue.Queue(
+            maxsize=max(1, settings.getint('POSTGRES_QUEUE_SIZE', 8)))
+        self.writer = None
+        # Lotes que esperan sitio en la cola, con el Deferred de quien los entregó
+        self.waiting = deque()
+        # Precios de los lotes entregados al escritor y aún sin confirmar, en orden
+        self.inflight = deque()
+        # Se dispara desde el hilo escritor cuando termina
+        self.writer_done = None
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        if self.pais:
+            self.writer_done = defer.Deferred()
+            self.writer = threading.Thread(
+                target=self._writer_loop, args=(spider,),
+                name=f"postgres-writer-{self.pais}", daemon=True)
+            self.writer.start()
+
+    @defer.inlineCallbacks
+    def close_spider(self, spider):
+        if self.writer is None:
+            super().close_spider(spider)
+            return
+        self._stop_tasks()
+        # Encolar lo que quede en el buffer y esperar a que el hilo termine
+        yield self._flush(spider)
+        yield self._enqueue(_STOP)
+        yield self.writer_done
+        self.writer = None
+        super().close_spider(spider)
+
+    def _enqueue(self, batch):
+        """Meter el lote en la cola, o dejarlo esperando en el reactor si está llena"""
+        if not self.waiting:
+            try:
+                self.queue.put_nowait(batch)
+                return defer.succeed(None)
+            except queue.Full:
+                pass
+        d = defer.Deferred()
+        self.waiting.append((batch, d))
+        return d
+
+    def _queue_freed(self):
+        """Llamado en el reactor cuando el escritor saca un lote: entran los que esperaban"""
+        while self.waiting:
+            batch, d = self.waiting[0]
+            try:
+                self.queue.put_nowait(batch)
+            except queue.Full:
+                return
+            self.waiting.popleft()
+            d.callback(None)
+
+    def _writer_loop(self, spider):
+        from twisted.internet import reactor
+        while True:
+            batch = self.queue.get()
+            reactor.callFromThread(self._queue_freed)
+            if batch is _STOP:
+                break
+            if batch is _HEARTBEAT:
+                PostgresPipeline._heartbeat(self, spider)
+                continue
+            rows, seen, prices = batch
+            written = self._write_rows(rows, spider, seen)
+            reactor.callFromThread(self._batch_written, prices, written)
+        reactor.callFromThread(self.writer_done.callback, None)
+
+    def _batch_written(self, prices, written):
+        """En el reactor: el escritor terminó el lote más antiguo"""
+        self.inflight.popleft()
+        if written:
+            self.price_index.update(prices)
+
+    def _last_price(self, key):
+        if key in self.pending_prices:
+            return self.pending_prices[key]
+        for prices in reversed(self.inflight):
+            if key in prices:
+                return prices[key]
+        return self.price_index.get(key)
+
+    def _heartbeat(self, spider):
+        # La conexión pertenece al hilo escritor; el sondeo se hace allí
+        if self.writer is None:
+            return PostgresPipeline._heartbeat(self, spider)
+        if time.monotonic() - self.last_activity < self.heartbeat_interval:
+            return
+        try:
+            self.queue.put_nowait(_HEARTBEAT)
+        except queue.Full:
+            pass
+
+    def _inc_stat(self, key, count=1):
+        # Las estadísticas se actualizan siempre desde el hilo del reactor
+        from twisted.internet import reactor
+        reactor.callFromThread(PostgresPipeline._inc_stat, self, key, count)
+
+    def _flush(self, spider):
+        """Entregar el buffer al hilo escritor sin bloquear el reactor"""
+        if self.writer is None:
+            # Sin hilo escritor (araña sin 'pais') nadie vaciaría la cola
+            return PostgresPipeline._flush(self, spider)
+        if not self.buffer and not self.seen_buffer:
+            return defer.succeed(None)
+        batch = (self.buffer, self.seen_buffer, self.pending_prices)
+        self.inflight.append(self.pending_prices)
+        self.buffer, self.seen_buffer, self.pending_prices = [], [], {}
+        self.last_flush = time.monotonic()
+        self._inc_stat('postgres/batches_queued')
+        return self._enqueue(batch)
+
+    def process_item(self, item, spider):
+        if self.writer is None:
+            return super().process_item(item, spider)
+
+        if isinstance(item, PRODUCT_ITEMS):
+            self._buffer_row(self._row(item))
+            if self._batch_full():
+                d = self._flush(spider)
+                d.addCallback(lambda _: item)
+                return d
+
+        return item
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ParquetExportPipeline:
+    """
+    Exporta los items a archivos Parquet particionados al estilo Hive:
+    <PARQUET_DIR>/country=<pais>/comercial_id=<id>/result_date=<fecha>/
+    Las columnas van tipadas (precios float64, textos repetitivos como
+    diccionario) y se escriben en row groups de PARQUET_ROW_GROUP_SIZE filas,
+    para que un día completo se pueda leer con DuckDB o pyarrow sin tocar
+    PostgreSQL. Requiere pyarrow.
+    """
+
+    # Las columnas de partición (country, comercial_id, result_date) van en la ruta
+    FLOAT_COLUMNS = ('price', 'unit_price', 'total_unit_quantity')
+    DICTIONARY_COLUMNS = ('unit_type', 'category', 'sub_category', 'comercial_name')
+    FILE_COLUMNS = (
+        'name', 'price', 'unit_price', 'total_unit_quantity', 'unit_type',
+        'category', 'sub_category', 'comercial_name', 'result_time'
+    )
+
+    def __init__(self, stats=None, settings=None):
+        if pa is None:
+            raise NotConfigured("ParquetExportPipeline requiere pyarrow (pip install pyarrow)")
+        settings = settings if settings is not None else Settings()
+        self.stats = stats
+        self.base_dir = settings.get('PARQUET_DIR', 'parquet')
+        self.row_group_size = max(1, settings.getint('PARQUET_ROW_GROUP_SIZE', 10000))
+        self.compression = settings.get('PARQUET_COMPRESSION', 'zstd')
+        self.schema = pa.schema([
+            (column, pa.float64()) if column in self.FLOAT_COLUMNS
+            else (column, pa.dictionary(pa.int32(), pa.string()))
+            if column in self.DICTIONARY_COLUMNS
+            else (column, pa.string())
+            for column in self.FILE_COLUMNS
+        ])
+        self.pais = None
+        self.run_id = None
+        # Por partición: buffer de columnas y writer abierto
+        self.buffers = {}
+        self.writers = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(stats=crawler.stats, settings=crawler.settings)
+
+    def open_spider(self, spider):
+        self.pais = getattr(spider, 'pais', None) or 'sin_pais'
+        self.run_id = f"{spider.name}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+    def close_spider(self, spider):
+        for partition in list(self.buffers):
+            self._write_row_group(partition)
+        for partition, (writer, tmp_path) in self.writers.items():
+            writer.close()
+            # El archivo solo aparece con su nombre final cuando está completo
+            os.replace(tmp_path, tmp_path[:-len('.tmp')])
+        spider.logger.info(
+            f"Parquet: {len(self.writers)} particiones escritas en '{self.base_dir}'")
+        self.writers = {}
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def _partition_path(self, partition):
+        comercial_id, result_date = partition
+        return os.path.join(
+            self.base_dir, f"country={self.pais}",
+            f"comercial_id={comercial_id}", f"result_date={result_date}")
+
+    def _write_row_group(self, partition):
+        columns = self.buffers.pop(partition)
+        table = pa.Table.from_pydict(columns, schema=self.schema)
+        if partition not in self.writers:
+            path = self._partition_path(partition)
+            os.makedirs(path, exist_ok=True)
+            tmp_path = os.path.join(path, f"part-{self.run_id}.parquet.tmp")
+            writer = pq.ParquetWriter(tmp_path, self.schema, compression=self.compression)
+            self.writers[partition] = (writer, tmp_path)
+        self.writers[partition][0].write_table(table, row_group_size=self.row_group_size)
+        self._inc_stat('parquet/row_groups')
+        self._inc_stat('parquet/rows_written', table.num_rows)
+
+    def process_item(self, item, spider):
+        if isinstance(item, PRODUCT_ITEMS):
+            adapter = ItemAdapter(item)
+            partition = (adapter.get('comercial_id'), adapter.get('result_date'))
+            columns = self.buffers.get(partition)
+            if columns is None:
+                columns = self.buffers[partition] = {
+                    column: [] for column in self.FILE_COLUMNS}
+            for column in self.FILE_COLUMNS:
+                value = adapter.get(column)
+                if column in self.FLOAT_COLUMNS:
+                    value = _to_float(value)
+                elif value is not None:
+                    value = str(value)
+                columns[column].append(value)
+            if len(columns['name']) >= self.row_group_size:
+                self._write_row_group(partition)
 
         return item
@@ -15,8 +15,11 @@ BOT_NAME = "scraper"
 
 SPIDER_MODULES = ["scraper.spiders"]
 NEWSPIDER_MODULE = "scraper.spiders"
+COMMANDS_MODULE = "scraper.commands"
 
-ADDONS = {}
+ADDONS = {
+    "scraper.addons.BrowserContextsAddon": 0,
+}
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -61,21 +64,39 @@ AUTOTHROTTLE_DEBUG = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    "scraper.middlewares.ScraperSpiderMiddleware": 543,
-# }
+SPIDER_MIDDLEWARES = {
+   # "scraper.middlewares.ScraperSpiderMiddleware": 543,
+   "scraper.middlewares.PageLeakSpiderMiddleware": 543,
+   "scraper.middlewares.StartShardMiddleware": 545,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    "scraper.middlewares.ScraperDownloaderMiddleware": 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+   # "scraper.middlewares.ScraperDownloaderMiddleware": 543,
+   "scraper.middlewares.BrowserRecycleMiddleware": 540,
+   "scraper.middlewares.StorageStateMiddleware": 545,
+   "scraper.middlewares.ContextRoutingMiddleware": 550,
+   "scraper.middlewares.PagePoolMiddleware": 580,
+   "scraper.middlewares.PageLeakDownloaderMiddleware": 590,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
 # EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
 # }
+EXTENSIONS = {
+    "scraper.extensions.RunStampExtension": 490,
+    "scraper.extensions.UnitCacheExtension": 500,
+    "scraper.extensions.RequestBlockingExtension": 510,
+    "scraper.extensions.BrowserRecycleExtension": 520,
+}
+
+# Caché LRU de parse_units (nombre de producto -> cantidad y unidad); 0 la desactiva.
+# Con UNITS_CACHE_FILE la caché se guarda al cerrar y se precarga en la siguiente ejecución
+UNITS_CACHE_SIZE = 50000
+UNITS_CACHE_FILE = 'cache/units.json'
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -160,7 +181,111 @@ PLAYWRIGHT_CONTEXTS = {
 
 }
 
+# Varios contextos de Chromium aislados y no persistentes en lugar de uno solo:
+# BROWSER_CONTEXTS > 0 quita --single-process/--no-zygote, no lanza el contexto
+# "persistent" y reparte las peticiones ('round_robin' o 'least_loaded') con
+# BROWSER_CONTEXT_CONCURRENCY descargas por contexto. 0 = comportamiento anterior.
+# Varios procesos de navegador: lanzar varias arañas con shards de URLs
+# (ver benchmark_contexts.py --configs contextos:estrategia:procesos)
+BROWSER_CONTEXTS = 0
+BROWSER_CONTEXT_STRATEGY = 'round_robin'
+BROWSER_CONTEXT_CONCURRENCY = 1
+
+# Shard de las URLs iniciales ('i/n', StartShardMiddleware): la ejecución solo lanza
+# las que le tocan. handler.py lo toma del evento de Lambda ("shard")
+START_SHARD = '0/1'
+
+# Bloqueo de peticiones en Chromium: se abortan los tipos de recurso de
+# BLOCKED_RESOURCE_TYPES y los dominios de BLOCKED_DOMAINS (más los de cada
+# retailer, atributo blocked_domains de la araña). 'stylesheet' no va por
+# defecto: sin CSS algunos botones dejan de ser visibles para Playwright
+PLAYWRIGHT_ABORT_REQUEST = "scraper.spiders.utils.blocking.should_abort_request"
+REQUEST_BLOCKING_ENABLED = True
+BLOCKED_RESOURCE_TYPES = ['image', 'media', 'font']
+BLOCKED_DOMAINS = [
+    'google-analytics.com', 'googletagmanager.com', 'googleadservices.com',
+    'doubleclick.net', 'googlesyndication.com', 'facebook.net', 'facebook.com',
+    'hotjar.com', 'clarity.ms', 'tiktok.com', 'criteo.com', 'criteo.net',
+    'taboola.com', 'newrelic.com', 'nr-data.net', 'bing.com', 'youtube.com',
+]
+
+# Tiendas VTEX (jumbo, plaza_vea): 'api' pagina el catálogo JSON con peticiones HTTP
+# sin navegador; 'browser' renderiza cada categoría con Playwright. En modo 'api' las
+# categorías cuya API falla pasan al navegador y las que superan el máximo paginable
+# se parten por rangos de precio (tests/test_vtex.py). En 'api' Jumbo guarda como
+# unit_price el precio / cantidad del nombre, no el PUM que muestra el sitio
+VTEX_CRAWL_MODE = 'browser'
+VTEX_API_CONCURRENCY = 16  # Peticiones simultáneas a la API, en un slot sin DOWNLOAD_DELAY
+VTEX_API_PAGE_SIZE = 50  # Productos por página (máximo de VTEX)
+VTEX_API_BASE_URL = None  # Otro host para la API, p. ej. un servidor local con respuestas grabadas
+
+# Cruz Verde (CO y CL): 'hybrid' abre el navegador solo para pasar las ventanas de
+# ciudad/ubicación, exporta sus cookies y pide los listados a la API de productos por
+# HTTP; 'browser' renderiza cada categoría. Si la API responde que la sesión caducó
+# se renueva con el navegador hasta SESSION_MAX_RENEWALS veces. Por defecto 'browser'
+# hasta validar 'hybrid' contra la API de cada país
+SESSION_CRAWL_MODE = 'browser'
+SESSION_API_CONCURRENCY = 8  # Peticiones simultáneas a la API, en un slot sin DOWNLOAD_DELAY
+SESSION_MAX_RENEWALS = 3
+
+# Estado del navegador (cookies y localStorage) tras cerrar las ventanas de ciudad,
+# ubicación, avisos o edad: se guarda por araña en STORAGE_STATE_DIR y durante
+# STORAGE_STATE_TTL segundos las páginas nuevas lo reciben en su contexto
+STORAGE_STATE_ENABLED = True
+STORAGE_STATE_DIR = '.storage_state'
+STORAGE_STATE_TTL = 6 * 3600
+
+# Pool de páginas de Playwright reutilizadas entre categorías (PagePoolMiddleware):
+# hasta PAGE_POOL_SIZE páginas por contexto (como mucho PLAYWRIGHT_MAX_PAGES_PER_CONTEXT,
+# que por defecto es CONCURRENT_REQUESTS), cada una se cierra tras PAGE_POOL_MAX_USES
+# categorías. PAGE_POOL_CLEAR_STORAGE borra también localStorage al devolverla.
+# 0 desactiva el pool (una página nueva por petición)
+PAGE_POOL_SIZE = 4
+PAGE_POOL_MAX_USES = 50
+PAGE_POOL_CLEAR_STORAGE = False
+
+# Detector de fugas de páginas (PageLeakDownloaderMiddleware y PageLeakSpiderMiddleware):
+# cierra la página que un callback no devolvió al terminar y la de cada petición fallida.
+# Stats pages/open, pages/open_max, pages/leaked y pages/closed_on_failure
+PAGE_LEAK_TRACKING = True
+
+# Reciclado del navegador (BrowserRecycleExtension): cada BROWSER_RECYCLE_INTERVAL s
+# se mide el RSS de Chromium y sus renderers; pasado BROWSER_RECYCLE_RSS_MB o tras
+# BROWSER_RECYCLE_PAGES páginas se retienen las páginas nuevas (BrowserRecycleMiddleware;
+# lo demás sigue), se esperan las que están en uso (hasta BROWSER_RECYCLE_DRAIN_TIMEOUT s,
+# si no se aplaza con espera creciente) y se relanza el navegador ('browser') o solo sus
+# contextos ('context'). 0 desactiva cada umbral. Stats browser_recycle/*
+BROWSER_RECYCLE_ENABLED = True
+BROWSER_RECYCLE_RSS_MB = 1536
+BROWSER_RECYCLE_PAGES = 300
+BROWSER_RECYCLE_INTERVAL = 15
+BROWSER_RECYCLE_DRAIN_TIMEOUT = 300
+BROWSER_RECYCLE_SCOPE = 'browser'
+
+# Captura de respuestas XHR (spiders/utils/capture.py): inkafarma y cruzverde leen los
+# productos del JSON que pide el propio sitio y solo recorren el DOM si no llega ninguno.
+# XHR_CAPTURE_TIMEOUT son los segundos que se espera la primera respuesta.
+# Desactivada: XHR_PRODUCTS_PATTERN/PATHS aún no se validaron contra respuestas
+# grabadas de cada sitio, y si el patrón no coincide cada categoría espera
+# XHR_CAPTURE_TIMEOUT antes de leer el DOM
+XHR_CAPTURE_ENABLED = False
+XHR_CAPTURE_TIMEOUT = 10
+
+# Falabella: los productos salen del JSON de estado de Next.js de cada página y
+# solo se recorren las cards con XPath si el estado no está o no se actualizó
+PAGE_STATE_EXTRACTION = True
+
+# Extracción de productos: 'json' recorre las cards en el navegador y devuelve solo
+# los campos declarados en CARD_FIELDS; 'html' serializa el DOM completo (page.content())
+EXTRACTION_MODE = 'json'
+
 # Configuración de timeouts
+# Esperas por eventos (spiders/utils/waits.py): techo absoluto en ms para que la
+# grilla de productos cambie, techo relativo a la pausa fija que sustituye cada
+# espera (fixed_ms * factor) y ms que debe quedar estable antes de leerla
+GRID_WAIT_TIMEOUT = 15000
+GRID_WAIT_TIMEOUT_FACTOR = 1.5
+GRID_WAIT_QUIET = 300
 DOWNLOAD_TIMEOUT = 90
 PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 90000
 
@@ -172,6 +297,36 @@ ITEM_PIPELINES = {
     'scraper.pipelines.PostgresPipeline': 300,
 }
 
+# Escritura por lotes en PostgreSQL (COPY FROM STDIN, un commit por lote)
+POSTGRES_BATCH_SIZE = 500  # Items por lote
+POSTGRES_FLUSH_INTERVAL = 30  # Segundos máximos que un item espera en el buffer
+# 'append' guarda una fila por producto y ejecución; 'delta' solo los productos
+# nuevos o con cambio de precio y marca el resto en la tabla <pais>_seen;
+# 'upsert' deja una fila por (name, comercial_id, result_date) aunque se repita la araña
+POSTGRES_WRITE_MODE = 'append'
+POSTGRES_DELTA_LOOKBACK_DAYS = 30  # Antigüedad máxima del último precio conocido
+# Con 'scraper.pipelines.ThreadedPostgresPipeline' en ITEM_PIPELINES los lotes se
+# escriben en un hilo dedicado; este es el máximo de lotes pendientes en la cola
+POSTGRES_QUEUE_SIZE = 8
+
+# Salud de la conexión: keepalive TCP y un sondeo solo tras este tiempo sin escrituras.
+# Si una escritura falla se reconecta y el lote se reintenta una vez.
+POSTGRES_HEARTBEAT_INTERVAL = 60  # Segundos
+POSTGRES_KEEPALIVES_IDLE = 30
+POSTGRES_KEEPALIVES_INTERVAL = 10
+POSTGRES_KEEPALIVES_COUNT = 3
+
+# Spool local (JSONL con gzip) para los lotes que no llegan a PostgreSQL.
+# Se recargan con: scrapy replay_spool [--spider nombre] [--run carpeta]
+SPOOL_DIR = 'spool'
+SPOOL_SEGMENT_ROWS = 50000  # Filas por segmento antes de rotar
+
+# Exportación a Parquet para análisis (requiere pyarrow). Para activarla agregar
+# 'scraper.pipelines.ParquetExportPipeline': 400 a ITEM_PIPELINES
+PARQUET_DIR = 'parquet'  # Particiones country=/comercial_id=/result_date=
+PARQUET_ROW_GROUP_SIZE = 10000  # Filas por row group
+PARQUET_COMPRESSION = 'zstd'
+
 # País para la tabla de base de datos
 DATABASE_COUNTRY = 'peru'
 
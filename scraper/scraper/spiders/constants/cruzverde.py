@@ -1,9 +1,8 @@
+from scraper.spiders.utils.units import UnitProfile
+
 ID = '800.149.695'
 NAME = 'Cruz Verde'
 
-REGULAR_EXPRESSION_UNITS = r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|kg|unidades|unidad|un|cm|m|u|grs|und|unds|tabletas|tableta|mg|dosis|cápsulas|capsulas|sobres|ampolletas|cotonetes)\b)'
-REGULAR_EXPRESSION_UNITS_SIMPLE = r'(?:x|por)\s*(\d+[\.,]?\d*)\b'
-
 LIST_CATEGORIES = ["Medicamentos", "Dermocosméticos", "Bebé y Maternidad",
                    "Cuidado Personal", "Salud Sexual", "Belleza", "Bienestar y Nutrición"]
 
@@ -26,3 +25,33 @@ XPATH_GET_PRICE = ".//span[@class='font-bold text-prices']//text()"
 XPATH_GET_UNIT_PRICE = ".//span[@class='text-12']//text()"
 XPATH_CLICK_NEXT_PAGE_FIRST = "//div[@class='rounded-full bg-quaternary ml-15 lg:h-32 lg:w-32 h-25 w-25 flex items-center justify-center cursor-pointer hover:bg-prices text-white ng-star-inserted']//*[@id='chevron-right']"
 XPATH_CLICK_NEXT_PAGE = "//div[@class='rounded-full flex items-center justify-center bg-gray-light ml-15 lg:h-32 lg:w-32 h-25 w-25 text-center cursor-pointer text-gray-darkest hover:bg-accent hover:text-white ng-star-inserted bg-main! text-white']/following-sibling::div[1]"
+
+# Campos que se extraen en el navegador (EXTRACTION_MODE = 'json')
+CARD_FIELDS = (XPATH_GET_NAME, XPATH_GET_PRICE, XPATH_GET_UNIT_PRICE)
+
+# Respuestas XHR del servicio de productos (ResponseCapture): patrón de URL, rutas
+# candidatas a la lista de productos y, por campo, rutas dentro de cada producto
+XHR_PRODUCTS_PATTERN = r"/product-service/products/search"
+XHR_PRODUCTS_PATHS = ("hits", "data.hits")
+XHR_PRODUCT_FIELDS = {
+    "name": ("productName", "name"),
+    "price": ("prices.price-sale-co", "prices.price-list-co", "price"),
+}
+
+# API de productos para el modo 'hybrid' (SESSION_CRAWL_MODE): misma respuesta que
+# la XHR anterior, paginada con limit/offset; el total está en API_TOTAL_PATHS
+API_SEARCH_URL = "https://api.cruzverde.com.co/product-service/products/search"
+API_PAGE_SIZE = 48
+API_TOTAL_PATHS = ("total", "data.total")
+
+# Dominios de terceros que se abortan en Chromium (además de BLOCKED_DOMAINS)
+BLOCKED_DOMAINS = ('onesignal.com', 'zdassets.com', 'zendesk.com')
+
+# Unidades del nombre del producto (spiders/utils/units.py), con las reglas de la
+# regex que usaba esta araña
+UNIT_PROFILE = UnitProfile(
+    "cruzverde",
+    ('g', 'gr', 'ml', 'l', 'kg', 'unidades', 'unidad', 'un', 'cm', 'm', 'u', 'grs', 'und', 'unds',
+     'tabletas', 'tableta', 'mg', 'dosis', 'cápsulas', 'capsulas', 'sobres', 'ampolletas', 'cotonetes'),
+    number=r'\d+[\.,]?\d*', separator=r'\s?',
+    count=r'(?:x|por)\s*(\d+[\.,]?\d*)\b')
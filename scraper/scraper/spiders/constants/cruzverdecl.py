@@ -1,3 +1,4 @@
+from scraper.spiders.utils.units import UnitProfile
 
 NAME = "Cruz Verde CL"
 ID = "89.807.200"
@@ -17,3 +18,29 @@ SELECTOR_PRODUCT_NAME = SELECTOR_GET_ALL_PRODUCTS + " > h2 span"
 XPATH_GET_PRICE = ".//ml-price-tag-v2//div/p/text()"
 XPATH_GET_NAME = ".//h2//span/text()"
 XPATH_CLICK_NEXT_PAGE = "//ml-pagination//div[contains(@class,'bg-main!')]/following-sibling::div[1]"
+
+# Campos que se extraen en el navegador (EXTRACTION_MODE = 'json')
+CARD_FIELDS = (XPATH_GET_PRICE, XPATH_GET_NAME)
+
+# API de productos para el modo 'hybrid' (SESSION_CRAWL_MODE): rutas candidatas a la
+# lista de productos y a cada campo, paginada con limit/offset
+API_SEARCH_URL = "https://api.cruzverde.cl/product-service/products/search"
+API_PAGE_SIZE = 48
+API_TOTAL_PATHS = ("total", "data.total")
+XHR_PRODUCTS_PATHS = ("hits", "data.hits")
+XHR_PRODUCT_FIELDS = {
+    "name": ("productName", "name"),
+    "price": ("prices.price-sale-cl", "prices.price-list-cl", "price"),
+}
+
+# Dominios de terceros que se abortan en Chromium (además de BLOCKED_DOMAINS)
+# onesignal no se bloquea: la araña espera su botón para cerrar el aviso
+BLOCKED_DOMAINS = ('zdassets.com', 'zendesk.com')
+
+# Unidades del nombre del producto (spiders/utils/units.py), con las reglas de la
+# regex que usaba esta araña
+UNIT_PROFILE = UnitProfile(
+    "cruzverdecl",
+    ('g', 'gr', 'ml', 'l', 'lt', 'kg', 'onz', 'mg', 'comprimido', 'lb', 'unidades', 'unideades', 'un',
+     'cm', 'm', 'u', 'grs', 'und', 'unds'),
+    number=r'\d+[\.,]?\d*', separator=r'\s?')
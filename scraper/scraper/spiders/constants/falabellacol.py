@@ -1,3 +1,5 @@
+from scraper.spiders.utils.units import SUPERMARKET_UNITS, UnitProfile
+
 NAME = 'Falabella'
 ID = '76.212.492'
 
@@ -26,4 +28,20 @@ XPATH_PRODUCT_CARDS = "//div[contains(@id,'testId-searchResults-products')]/div/
 XPATH_PRODUCT_NAME = ".//b[contains(@id,'testId-pod-displaySubTitle-')]//text()"
 XPATH_PRODUCT_PRICE = ".//div[contains(@id,'testId-pod-prices-')]//li[@data-normal-price]//span/text()"
 XPATH_PRODUCT_PRICE1 = ".//div[contains(@id,'testId-pod-prices-')]//li[@data-internet-price]//span[@id='']/text()"
-XPATH_PTODUCT_PRICE2 = "//div[contains(@id,'testId-pod-prices-')]//li[@data-event-price]//span[@id='']/text()"
+XPATH_PTODUCT_PRICE2 = ".//div[contains(@id,'testId-pod-prices-')]//li[@data-event-price]//span[@id='']/text()"
+
+# Resultados del listado en el JSON de estado de Next.js y tipos de precio en el
+# mismo orden de preferencia que XPATH_PRODUCT_PRICE, PRICE1 y PTODUCT_PRICE2
+STATE_RESULTS_PATH = "props.pageProps.results"
+STATE_PRICE_TYPES = ("normalPrice", "internetPrice", "eventPrice")
+
+# Campos que se extraen en el navegador (EXTRACTION_MODE = 'json')
+CARD_FIELDS = (XPATH_PRODUCT_NAME, XPATH_PRODUCT_PRICE, XPATH_PRODUCT_PRICE1, XPATH_PTODUCT_PRICE2)
+
+# Dominios de terceros que se abortan en Chromium (además de BLOCKED_DOMAINS)
+BLOCKED_DOMAINS = ('tiqcdn.com', 'snapchat.com', 'pinimg.com', 'pinterest.com')
+
+# Unidades del nombre del producto (spiders/utils/units.py), con las reglas de la
+# regex que usaba esta araña
+UNIT_PROFILE = UnitProfile(
+    "falabellacol", SUPERMARKET_UNITS, number=r'\d+[\.,]?\d*', separator=r'\s?')
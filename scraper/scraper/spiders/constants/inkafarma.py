@@ -1,3 +1,5 @@
+from scraper.spiders.utils.units import UnitProfile
+
 # Categorias de inkafarma
 CATEGORIAS = [
     "inka-packs",
@@ -47,6 +49,14 @@ SELECTOR_PRODUCTO_PRECIO = "fp-product-card-price span:last-child"  # Último sp
 SELECTOR_PRODUCTO_PRECIO_ANTERIOR = "fp-product-card-price span:first-child"  # Primer span (precio anterior si existe)
 SELECTOR_PRODUCTO_LINK = "a"
 
+# Cards de la lista filtrada y campos que se extraen en el navegador (EXTRACTION_MODE = 'json')
+XPATH_PRODUCTOS_LISTA = "//fp-filtered-product-list//fp-product-large"
+CARD_FIELDS = (
+    SELECTOR_PRODUCTO_NOMBRE + "::text",
+    SELECTOR_PRODUCTO_PRESENTACION + "::text",
+    SELECTOR_PRODUCTO_PRECIO + "::text",
+)
+
 # XPath selectores (más robustos para Playwright)
 XPATH_PRODUCTO_CARD = "//fp-product-small-category"
 XPATH_PRODUCTO_NOMBRE = ".//fp-product-name//span"
@@ -92,6 +102,23 @@ REGEX_TOTAL_PRODUCTOS = re.compile(r'Encontramos\s+(\d+)\s+productos?', re.IGNOR
 REGEX_PRECIO = re.compile(r'[\s\$\,]')
 REGEX_SOLO_NUMEROS = re.compile(r'[^\d\.]')
 
-# Regex para extraer cantidad de presentación
-REGEX_CANTIDAD_PRESENTACION = re.compile(r'(\d+(?:\.\d+)?)\s*(ml|mg|g|kg|l|un|unidades?|caps?|comp|tab)', re.IGNORECASE)
-
+# Respuestas XHR de la lista filtrada (ResponseCapture): patrón de URL, rutas
+# candidatas a la lista de productos y, por campo, rutas dentro de cada producto
+XHR_PRODUCTS_PATTERN = r"filtered-products|/products/search"
+XHR_PRODUCTS_PATHS = ("rows", "products", "data.rows", "data")
+XHR_PRODUCT_FIELDS = {
+    "name": ("name", "productName"),
+    "presentation": ("presentation", "noFractionatedText", "shortDescription"),
+    "price": ("priceWithpaymentMethod", "priceAllPaymentMethod", "price"),
+}
+
+# Dominios de terceros que se abortan en Chromium (además de BLOCKED_DOMAINS)
+BLOCKED_DOMAINS = ('onesignal.com', 'useinsider.com')
+
+# Unidades del nombre del producto (spiders/utils/units.py), con las reglas de la
+# regex que usaba esta araña
+# Se lee la presentación y vale la primera coincidencia; sin límite de palabra, el
+# orden de las unidades hace de normalización ("140 grs" -> 'g', "24 unidades" -> 'un')
+UNIT_PROFILE = UnitProfile(
+    "inkafarma", ('ml', 'mg', 'g', 'kg', 'l', 'un', 'unidades?', 'caps?', 'comp', 'tab'),
+    boundary=False, last=False)
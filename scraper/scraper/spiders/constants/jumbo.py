@@ -1,3 +1,5 @@
+from scraper.spiders.utils.units import SUPERMARKET_UNITS, UnitProfile
+
 START_URLS_SUPERMARKET_1 = [
     "https://www.jumbocolombia.com/supermercado/despensa",
     "https://www.jumbocolombia.com/supermercado/lacteos-huevos-y-refrigerados",
@@ -49,14 +51,14 @@ START_URLS_ELECTRO = [
 XPATH_HOVER_MAIN_CATEGORY_TECNOLOGIA = "//a[@href='/tecnologia' and contains(@class,'jumbo-main-menu-2-x-link--header-submenu-item')]"
 XPATH_HOVER_MAIN_CATEGORY_ELECTRODOMESICOS = "//a[@href='/electrodomesticos' and contains(@class,'jumbo-main-menu-2-x-link--header-submenu-item')]"
 
-REGULAR_EXPRESSION_UNITS_SIMPLE = r'(?:\s{1}(?:x|por))\s*(\d+[\.,]?\d*)\b'
-
 XPATH_HOVER_MAIN_CATEGORY_SALUD = "//a[@href='/salud-y-bienestar' and contains(@class,'jumbo-main-menu-2-x-link--header-submenu-item')]"
 
 ID = '900.155.107'
 NAME = 'Jumbo'
+BASE_URL = 'https://www.jumbocolombia.com'
 
 XPATH_GET_ALL_PRODUCTS = "//div[@id='gallery-layout-container']//article[contains(@class, 'vtex-product-summary-2-x-element')]/div"
+XPATH_GET_NAME = ".//h3/span//text()"
 XPATH_GET_PRICE = ".//div[contains(@class, 'selling-price')]//text()"
 XPATH_GET_BREADCRUMBS = "//div[@data-testid = 'breadcrumb']/span/a//text()"
 XPATH_CLICK_BUTTON = "//li[button/@id='active']/following-sibling::li[1]/button"
@@ -75,3 +77,18 @@ SELECTOR_PRODUCT_CARDS = "div#gallery-layout-container article.vtex-product-summ
 SELECTOR_TOTAL_COUNT_PRODUCTS = "div[class*='totalProducts--layout'] > span"
 
 SELECTOR_OLDER_AGE = "button[class='tiendasjumboqaio-delivery-modal-3-x-ofAgebutton']"
+
+# Campos que se extraen en el navegador (EXTRACTION_MODE = 'json')
+CARD_FIELDS = (XPATH_GET_NAME, XPATH_GET_PRICE, XPATH_UNIT_PRICE)
+PAGE_FIELDS = (XPATH_GET_BREADCRUMBS,)
+
+# Dominios de terceros que se abortan en Chromium (además de BLOCKED_DOMAINS)
+BLOCKED_DOMAINS = ('useinsider.com', 'zdassets.com', 'zendesk.com')
+
+# Unidades del nombre del producto (spiders/utils/units.py), con las reglas de la
+# regex que usaba esta araña
+# La unidad se guarda con el caso con el que la escribe el sitio; sin unidad vale
+# el conteo "x 12" / "por 1.000" (con separador de miles)
+UNIT_PROFILE = UnitProfile(
+    "jumbo", SUPERMARKET_UNITS, number=r'\d+[\.,]?\d*', separator=r'\s?', lower=False,
+    count=r'(?:\s{1}(?:x|por))\s*(\d+[\.,]?\d*)\b')
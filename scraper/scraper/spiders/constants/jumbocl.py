@@ -0,0 +1,10 @@
+from scraper.spiders.utils.units import SUPERMARKET_UNITS, UnitProfile
+
+# Dominios de terceros que se abortan en Chromium (además de BLOCKED_DOMAINS)
+BLOCKED_DOMAINS = ('useinsider.com', 'zdassets.com', 'zendesk.com')
+
+# Unidades del nombre del producto (spiders/utils/units.py), con las reglas de la
+# regex que usaba esta araña
+UNIT_PROFILE = UnitProfile(
+    "jumbocl", SUPERMARKET_UNITS, number=r'\d+[\.,]?\d*', separator=r'\s?', lower=False,
+    count=r'(?:\s{1}(?:x|por))\s*(\d+[\.,]?\d*)\b')
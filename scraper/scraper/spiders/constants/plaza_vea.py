@@ -1,3 +1,5 @@
+from scraper.spiders.utils.units import UnitProfile
+
 # Categorías del mercado con sus URLs base
 CATEGORIAS_MERCADO1 = {
     "frutas-y-verduras": [
@@ -204,3 +206,27 @@ XPATH_ALL_PAGES = '//span[contains(@class, "pagination__item") and contains(@cla
 # Selectores para esperar carga
 SELECTOR_PRODUCTS_CONTAINER = 'div[class*="Showcase__details"]'
 SELECTOR_PAGINATION = 'div.pagination__nav'
+
+# Campos que se extraen en el navegador (EXTRACTION_MODE = 'json')
+CARD_FIELDS = (XPATH_PRODUCT_NAME, XPATH_PRODUCT_PRICE, XPATH_PRODUCT_UNIT_REFERENCE)
+PAGE_FIELDS = (XPATH_PAGINATION, XPATH_ACTIVE_PAGE, XPATH_ALL_PAGES)
+
+# Dominios de terceros que se abortan en Chromium (además de BLOCKED_DOMAINS)
+BLOCKED_DOMAINS = ('useinsider.com', 'segment.com', 'cloudflareinsights.com')
+
+# Unidades del nombre del producto (spiders/utils/units.py), con las reglas de la
+# regex que usaba esta araña
+UNIT_PROFILE = UnitProfile(
+    "plaza_vea",
+    ('kg', 'g', 'gr', 'grs', 'l', 'litro', 'litros', 'ml', 'mililitro', 'mililitros', 'pack',
+     'paquete', 'caja', 'bandeja', 'unidad', 'unidades', 'un', 'u', 'und', 'unds'),
+    # calculate_unit_data normaliza y trata aparte 'bandeja' y las unidades
+    normalize={
+        'g': 'g', 'gr': 'g', 'grs': 'g',
+        'l': 'l', 'litro': 'l', 'litros': 'l',
+        'ml': 'ml', 'mililitro': 'ml', 'mililitros': 'ml',
+        'pack': 'pack', 'paquete': 'pack', 'caja': 'pack',
+        'bandeja': 'g',
+        'unidades': 'unidad', 'un': 'unidad', 'u': 'unidad', 'und': 'unidad', 'unds': 'unidad',
+    },
+)
@@ -3,16 +3,27 @@ from scrapy.linkextractors import LinkExtractor
 import re
 import scrapy
 from scrapy_playwright.page import PageMethod
-from scraper.items import ScraperItem
+from scraper.items import ProductItem
+from scraper.spiders.utils.capture import ResponseCapture
+from scraper.spiders.utils.extract import extract_cards
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.units import parse_units
+from scraper.spiders.utils.scroll import scroll_until_stable
+from scraper.spiders.utils.session import BrowserSessionMixin
+from scraper.spiders.utils.storage_state import gate_timeout, save_storage_state
+from scraper.spiders.utils.waits import grid_signature, wait_for_grid
 from scraper.spiders.constants import cruzverde
 from scrapy.http import Response
 from playwright.async_api import Page
 
 
-class CruzverdeSpider(scrapy.Spider):
+class CruzverdeSpider(BrowserSessionMixin, scrapy.Spider):
     name = "cruzverde"
     pais = "colombia"
     allowed_domains = ["www.cruzverde.com.co"]
+    blocked_domains = cruzverde.BLOCKED_DOMAINS
+    session_api_url = cruzverde.API_SEARCH_URL
+    session_constants = cruzverde
     start_urls = ["https://www.cruzverde.com.co/"]
     custom_settings = {
         'pais': 'colombia'
@@ -38,90 +49,114 @@ class CruzverdeSpider(scrapy.Spider):
                 cb_kwargs={}
             )
 
-    async def orchestrator(self, response: Response):
-        page: Page = response.meta["playwright_page"]
-
+    async def pass_session_gates(self, page: Page, meta=None):
         try:
             self.logger.info("Click en aceptar ciudad")
-            button_city = await page.wait_for_selector(cruzverde.SELECTOR_CITY_ACEPTAR, timeout=15000)
+            button_city = await page.wait_for_selector(
+                cruzverde.SELECTOR_CITY_ACEPTAR, timeout=gate_timeout(self, meta, 15000))
             await button_city.click()
             # Espera adicional para asegurarse de que la acción se complete
             await page.wait_for_timeout(2000)
+            await save_storage_state(self, page)
 
         except Exception as e:
             self.logger.warning(
-                f"No se pudo aceptar la ciudad para {response.url}. Procediendo con scrapeo directo. Error: {e}")
+                f"No se pudo aceptar la ciudad para {page.url}. Procediendo con scrapeo directo. Error: {e}")
             await page.wait_for_timeout(2000)
+
+    async def orchestrator(self, response: Response):
+        page: Page = response.meta["playwright_page"]
+
         try:
-            list_category_button = await page.wait_for_selector(cruzverde.SELECTOR_CLICK_CATEGORIES, timeout=15000)
-            await list_category_button.click()
-            await page.wait_for_timeout(2000)
-        except Exception as e:
-            self.logger.error(
-                f"No se pudo abrir el menú de categorías para {response.url}. Procediendo con scrapeo directo. Error: {e}")
-            raise e
-        await page.wait_for_selector(cruzverde.SELECTOR_GET_ALL_CATEGORIES, timeout=20000)
-        get_all_categories = await page.query_selector_all(cruzverde.SELECTOR_GET_ALL_CATEGORIES)
-        for category in get_all_categories:
-            category_name = await category.inner_text()
-            if category_name in cruzverde.LIST_CATEGORIES:
-                await category.click()
-                # Espera adicional para asegurarse de que la acción se complete
+            await self.pass_session_gates(page, response.meta)
+            if self.settings.get('SESSION_CRAWL_MODE', 'browser') == 'hybrid':
+                try:
+                    await self.harvest_session(page)
+                except Exception as e:
+                    self.logger.warning(f"No se pudo exportar la sesión, se sigue con el navegador: {e}")
+            try:
+                list_category_button = await page.wait_for_selector(cruzverde.SELECTOR_CLICK_CATEGORIES, timeout=15000)
+                await list_category_button.click()
                 await page.wait_for_timeout(2000)
-                await page.wait_for_selector(cruzverde.SELECTOR_SEARCH_SUBCATEGORY, timeout=20000)
-                subcategories = await page.query_selector_all(cruzverde.SELECTOR_SEARCH_SUBCATEGORY)
-                if (category_name == "Medicamentos"):
-                    self.logger.info(
-                        f"Navegando a la categoría: {category_name} y subcategoría Formulados")
-                    async for item in self.itter_others_pages(
-                            category_name, "Formulados", cruzverde.LIST_LINKS_MEDICAMENTOS):
-                        yield item
-                # for subcategory in subcategories:
-                #     category_link = await subcategory.get_attribute('href')
-                #     if category_link and category_link.startswith('http'):
-                #         category_link = category_link  # Asegurarse de que el enlace es absoluto
-                #     elif category_link and not category_link.startswith('http'):
-                #         category_link = response.urljoin(category_link)
-                #     sub_category_name = await subcategory.inner_text()
-                #     print(
-                #         f"Navegando a la subcategoría: {sub_category_name} ({category_name})")
-                #     yield scrapy.Request(
-                #         url=category_link,
-                #         meta=dict(playwright=True, playwright_include_page=True,
-                #                   playwright_page_methods=[
-                #                       PageMethod(
-                #                           "wait_for_selector", cruzverde.SELECTOR_CONTAINER_PRODUCTS, timeout='60000'),
-                #                   ],
-                #                   playwright_page_goto_kwargs={
-                #                       "wait_until": "domcontentloaded",
-                #                       "timeout": 60000
-                #                   }
-                #                   ),
-                #         callback=self.parse_category,
-                #         cb_kwargs={'category_name': category_name,
-                #                    'sub_category_name': sub_category_name}
-                #     )
+            except Exception as e:
+                self.logger.error(
+                    f"No se pudo abrir el menú de categorías para {response.url}. Procediendo con scrapeo directo. Error: {e}")
+                raise e
+            await page.wait_for_selector(cruzverde.SELECTOR_GET_ALL_CATEGORIES, timeout=20000)
+            get_all_categories = await page.query_selector_all(cruzverde.SELECTOR_GET_ALL_CATEGORIES)
+            for category in get_all_categories:
+                category_name = await category.inner_text()
+                if category_name in cruzverde.LIST_CATEGORIES:
+                    await category.click()
+                    # Espera adicional para asegurarse de que la acción se complete
+                    await page.wait_for_timeout(2000)
+                    await page.wait_for_selector(cruzverde.SELECTOR_SEARCH_SUBCATEGORY, timeout=20000)
+                    subcategories = await page.query_selector_all(cruzverde.SELECTOR_SEARCH_SUBCATEGORY)
+                    if (category_name == "Medicamentos"):
+                        self.logger.info(
+                            f"Navegando a la categoría: {category_name} y subcategoría Formulados")
+                        async for item in self.itter_others_pages(
+                                category_name, "Formulados", cruzverde.LIST_LINKS_MEDICAMENTOS):
+                            yield item
+                    # for subcategory in subcategories:
+                    #     category_link = await subcategory.get_attribute('href')
+                    #     if category_link and category_link.startswith('http'):
+                    #         category_link = category_link  # Asegurarse de que el enlace es absoluto
+                    #     elif category_link and not category_link.startswith('http'):
+                    #         category_link = response.urljoin(category_link)
+                    #     sub_category_name = await subcategory.inner_text()
+                    #     print(
+                    #         f"Navegando a la subcategoría: {sub_category_name} ({category_name})")
+                    #     yield scrapy.Request(
+                    #         url=category_link,
+                    #         meta=dict(playwright=True, playwright_include_page=True,
+                    #                   playwright_page_methods=[
+                    #                       PageMethod(
+                    #                           "wait_for_selector", cruzverde.SELECTOR_CONTAINER_PRODUCTS, timeout='60000'),
+                    #                   ],
+                    #                   playwright_page_goto_kwargs={
+                    #                       "wait_until": "domcontentloaded",
+                    #                       "timeout": 60000
+                    #                   }
+                    #                   ),
+                    #         callback=self.parse_category,
+                    #         cb_kwargs={'category_name': category_name,
+                    #                    'sub_category_name': sub_category_name}
+                    #     )
+        finally:
+            # La página del menú solo genera las peticiones: se devuelve al terminar
+            await release_page(self, page)
 
     async def itter_others_pages(self, category, subcategory, links):
         self.logger.info(
             f"Iterando en los links de {subcategory} de {category}")
         for link in links:
-            yield scrapy.Request(
-                url=link,
-                meta=dict(playwright=True, playwright_include_page=True,
-                          playwright_page_methods=[
-                              PageMethod(
-                                  "wait_for_selector", cruzverde.SELECTOR_CONTAINER_PRODUCTS, timeout=60000),
-                          ],
-                          playwright_page_goto_kwargs={
-                              "wait_until": "domcontentloaded",
-                              "timeout": 60000
-                          }
-                          ),
-                callback=self.parse_category,
-                cb_kwargs={'category_name': category,
-                           'sub_category_name': subcategory}
-            )
+            if self.hybrid_mode():
+                yield self.listing_request(link, category, subcategory)
+            else:
+                yield self.browser_request(link, category, subcategory)
+
+    def browser_request(self, link, category, subcategory):
+        capture = ResponseCapture.for_retailer(self, cruzverde)
+        return scrapy.Request(
+            url=link,
+            meta=dict(playwright=True, playwright_include_page=True,
+                      # Cada página de la grilla llega por XHR desde el servicio de productos
+                      playwright_page_event_handlers={"response": capture.on_response} if capture else {},
+                      xhr_capture=capture,
+                      playwright_page_methods=[
+                          PageMethod(
+                              "wait_for_selector", cruzverde.SELECTOR_CONTAINER_PRODUCTS, timeout=60000),
+                      ],
+                      playwright_page_goto_kwargs={
+                          "wait_until": "domcontentloaded",
+                          "timeout": 60000
+                      }
+                      ),
+            callback=self.parse_category,
+            cb_kwargs={'category_name': category,
+                       'sub_category_name': subcategory}
+        )
 
     async def parse_category(self, response: Response, category_name, sub_category_name):
         page: Page = response.meta["playwright_page"]
@@ -129,7 +164,6 @@ class CruzverdeSpider(scrapy.Spider):
         while True:
             async for item in self.save_products_count(page, page_number, response, category_name, sub_category_name):
                 yield item
-            await page.wait_for_timeout(2000)
             if page_number == 1:
                 next_page_button = page.locator(
                     f"xpath={cruzverde.XPATH_CLICK_NEXT_PAGE_FIRST}")
@@ -139,72 +173,72 @@ class CruzverdeSpider(scrapy.Spider):
 
             if await next_page_button.count() > 0:
                 print("Botón 'Siguiente' encontrado. Navegando a la siguiente página...")
-                await page.wait_for_timeout(2000)
+                previous = await grid_signature(page, cruzverde.SELECTOR_GET_ALL_PRODUCTS)
                 await next_page_button.first.click()
                 print("Clic en el botón 'Siguiente' realizado.")
+                # Sustituye las dos pausas de 2 s antes del clic
+                await wait_for_grid(self, page, cruzverde.SELECTOR_GET_ALL_PRODUCTS, previous, fixed_ms=4000)
                 await page.wait_for_selector(cruzverde.SELECTOR_GET_ALL_PRODUCTS, timeout=60000)
                 page_number += 1
             else:
                 print("No se encontró el botón 'Siguiente'. Fin de la categoría.")
                 break
-        await page.close()
+        await release_page(self, page)
 
     async def await_products_loaded(self, page: Page):
         await page.wait_for_selector(cruzverde.SELECTOR_GET_ALL_PRODUCTS, timeout=15000)
-        previous_height = -1
-        while True:
-            try:
-                await page.wait_for_selector(cruzverde.SELECTOR_CONTAINER_PRODUCTS, timeout=15000)
-            except Exception:
-                self.logger.warning(
-                    "El contenedor de productos no apareció. Saltando el scroll.")
-                break
-            current_height = await page.evaluate(f"selector => document.querySelector(selector).scrollHeight", cruzverde.SELECTOR_CONTAINER_PRODUCTS)
-
-            print(f"Altura del contenedor: {current_height}px")
-
-            if current_height == previous_height:
-                print(
-                    "La altura del contenedor se ha estabilizado. Scroll finalizado para esta página.")
-                break
-
-            previous_height = current_height
-
-            print("Haciendo scroll hasta el final...")
-            await page.evaluate(f"window.scrollTo(0, {current_height})")
-            await page.wait_for_timeout(2000)
+        try:
+            await page.wait_for_selector(cruzverde.SELECTOR_CONTAINER_PRODUCTS, timeout=15000)
+        except Exception:
+            self.logger.warning(
+                "El contenedor de productos no apareció. Saltando el scroll.")
+            return
+        # Un solo evaluate: scroll, espera a que crezca la grilla y repite hasta que se estabiliza
+        await scroll_until_stable(self, page, cruzverde.SELECTOR_CONTAINER_PRODUCTS,
+                                  cruzverde.SELECTOR_GET_ALL_PRODUCTS, step_ms=2000)
 
     async def save_products_count(self, page: Page, page_number, response: Response, category, sub_category):
         print(f"Scrapeando página {page_number} de '{response.url}'...")
+        capture = response.meta.get("xhr_capture")
+        if capture is not None:
+            rows = await capture.drain(self.settings.getfloat('XHR_CAPTURE_TIMEOUT', 10))
+            if rows:
+                for row in rows:
+                    yield self.take_captured_fields(row, category, sub_category)
+                return
+            self.logger.info("Sin respuestas XHR de productos, se lee el DOM")
+            self.crawler.stats.inc_value('capture/fallbacks')
         await self.await_products_loaded(page)
-        html_content = await page.content()
-        scrapy_selector = scrapy.Selector(text=html_content)
-        for product_card in scrapy_selector.css(cruzverde.SELECTOR_GET_ALL_PRODUCTS):
+        product_cards, _ = await extract_cards(
+            self, page, cruzverde.SELECTOR_GET_ALL_PRODUCTS, cruzverde.CARD_FIELDS)
+        for product_card in product_cards:
             yield self.take_products_fields(product_card, category, sub_category)
 
+    def take_captured_fields(self, row, category, sub_category):
+        name = row['name'].strip()
+        price = float(row['price'] or 0)
+        quantity, unit_type, unit_price = parse_units(name, cruzverde.UNIT_PROFILE, price)
+        return ProductItem(
+            name=name,
+            category=category,
+            sub_category=sub_category,
+            price=price,
+            unit_price=unit_price,
+            total_unit_quantity=quantity,
+            unit_type=unit_type,
+            comercial_name=cruzverde.NAME,
+            comercial_id=cruzverde.ID,
+        )
+
     def take_products_fields(self, product_card: scrapy.Selector, category, sub_category):
 
-        item = ScraperItem()
+        item = ProductItem()
 
         name = product_card.xpath(cruzverde.XPATH_GET_NAME).get().strip()
         item['name'] = name
-        matches = re.findall(
-            cruzverde.REGULAR_EXPRESSION_UNITS, name.lower(), re.IGNORECASE)
-        if matches:
-            value = matches[-1]
-            item['total_unit_quantity'] = float(value[0].replace(',', '.'))
-            item['unit_type'] = value[1]
-        else:
-            matches = re.findall(
-                cruzverde.REGULAR_EXPRESSION_UNITS_SIMPLE, name.lower(), re.IGNORECASE)
-            if matches:
-                value = matches[-1]
-                item['total_unit_quantity'] = float(value.replace('.', '').replace(',', '.')) if type(
-                    value) == str else float(value[0].replace('.', '').replace(',', '.'))
-                item['unit_type'] = 'un'
-            else:
-                item["total_unit_quantity"] = 1
-                item['unit_type'] = 'un'
+        quantity, unit_type, _ = parse_units(name, cruzverde.UNIT_PROFILE)
+        item['total_unit_quantity'] = quantity
+        item['unit_type'] = unit_type
         item['category'] = category
         item['sub_category'] = sub_category
         item['comercial_name'] = cruzverde.NAME
@@ -230,10 +264,8 @@ class CruzverdeSpider(scrapy.Spider):
                 item['unit_price'] = float(
                     price_match.group(1).replace(',', '.'))
             else:
-                item['unit_price'] = float(
-                    item.get("price")) / float(item["total_unit_quantity"])
+                item['unit_price'] = item['price'] / quantity
         else:
-            item['unit_price'] = float(
-                item.get("price")) / float(item["total_unit_quantity"])
+            item['unit_price'] = item['price'] / quantity
 
         return item
@@ -1,17 +1,26 @@
-import re
 import playwright
 import scrapy
 from scrapy_playwright.page import PageMethod
-from scraper.items import ScraperItem
+from scraper.items import ProductItem
+from scraper.spiders.utils.extract import extract_cards
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.units import parse_units
+from scraper.spiders.utils.scroll import scroll_until_stable
+from scraper.spiders.utils.session import BrowserSessionMixin
+from scraper.spiders.utils.storage_state import gate_timeout, save_storage_state
+from scraper.spiders.utils.waits import grid_signature, wait_for_grid
 from scraper.spiders.constants import cruzverdecl
 from scrapy.http import Response
 from playwright.async_api import Page, Locator
 
 
-class CruzverdeclSpider(scrapy.Spider):
+class CruzverdeclSpider(BrowserSessionMixin, scrapy.Spider):
     name = "cruzverdecl"
     pais = "chile"
     allowed_domains = ["www.cruzverde.cl"]
+    blocked_domains = cruzverdecl.BLOCKED_DOMAINS
+    session_api_url = cruzverdecl.API_SEARCH_URL
+    session_constants = cruzverdecl
     start_urls = ["https://www.cruzverde.cl/"]
 
     async def start(self):
@@ -33,12 +42,58 @@ class CruzverdeclSpider(scrapy.Spider):
 
     async def orchestrate_requests(self, response: Response):
         page: Page = response.meta["playwright_page"]
+        await self.pass_session_gates(page, response.meta)
+        if self.settings.get('SESSION_CRAWL_MODE', 'browser') == 'hybrid':
+            try:
+                await self.harvest_session(page)
+            except Exception as e:
+                self.logger.warning(f"No se pudo exportar la sesión, se sigue con el navegador: {e}")
+
+        categories_urls = await self._get_categories(response, page)
+        print(categories_urls)
+        await release_page(self, page)
+        self.logger.info(
+            "Categorías y subcategorías obtenidas, comenzando solicitudes...")
+        for category, subcategories in categories_urls.items():
+            for subcategory, urls in subcategories.items():
+                for url in urls:
+                    if self.hybrid_mode():
+                        yield self.listing_request(url, category, subcategory)
+                    else:
+                        yield self.browser_request(url, category, subcategory)
+        self.logger.info("Todas las solicitudes generadas.")
+
+    def browser_request(self, url, category, subcategory):
+        return scrapy.Request(
+            url,
+            meta=dict(playwright=True, playwright_include_page=True,
+                      playwright_page_methods=[
+                          PageMethod(
+                              "wait_for_selector", cruzverdecl.SELECTOR_GET_ALL_PRODUCTS, timeout=90000),
+                      ],
+                      playwright_page_goto_kwargs={
+                          "wait_until": "domcontentloaded",
+                          "timeout": 60000
+                      }
+                      ),
+            cb_kwargs={
+                "category": category,
+                "sub_category": subcategory
+            },
+            callback=self.parse,
+            errback=self.handle_error
+        )
+
+    async def pass_session_gates(self, page: Page, meta=None):
         await page.wait_for_timeout(3000)
         self.logger.info("Buscando y aceptando botones...")
+        passed = False
         try:
-            accept_button = await page.wait_for_selector(cruzverdecl.SELECTOR_BUTTON_OFFERS, timeout=30000)
+            accept_button = await page.wait_for_selector(
+                cruzverdecl.SELECTOR_BUTTON_OFFERS, timeout=gate_timeout(self, meta, 30000))
             self.logger.info("Botón de ofertas encontrado, aceptando...")
             await accept_button.click()
+            passed = True
 
         except playwright._impl._errors.TimeoutError:
             self.logger.warning(
@@ -47,42 +102,17 @@ class CruzverdeclSpider(scrapy.Spider):
         await page.wait_for_timeout(2000)
         # Aceptar ubicación si el botón aparece
         try:
-            accept_button = await page.wait_for_selector(cruzverdecl.SELECTOR_BUTTON_LOCATION, timeout=30000)
+            accept_button = await page.wait_for_selector(
+                cruzverdecl.SELECTOR_BUTTON_LOCATION, timeout=gate_timeout(self, meta, 30000))
             await accept_button.click()
             await page.wait_for_timeout(2000)
+            passed = True
         except playwright._impl._errors.TimeoutError:
             self.logger.warning(
                 "Botón de ubicación no encontrado, continuando...")
             pass
-
-        categories_urls = await self._get_categories(response, page)
-        print(categories_urls)
-        await page.close()
-        self.logger.info(
-            "Categorías y subcategorías obtenidas, comenzando solicitudes...")
-        for category, subcategories in categories_urls.items():
-            for subcategory, urls in subcategories.items():
-                for url in urls:
-                    yield scrapy.Request(
-                        url,
-                        meta=dict(playwright=True, playwright_include_page=True,
-                                  playwright_page_methods=[
-                                      PageMethod(
-                                          "wait_for_selector", cruzverdecl.SELECTOR_GET_ALL_PRODUCTS, timeout=90000),
-                                  ],
-                                  playwright_page_goto_kwargs={
-                                      "wait_until": "domcontentloaded",
-                                      "timeout": 60000
-                                  }
-                                  ),
-                        cb_kwargs={
-                            "category": category,
-                            "sub_category": subcategory
-                        },
-                        callback=self.parse,
-                        errback=self.handle_error
-                    )
-        self.logger.info("Todas las solicitudes generadas.")
+        if passed:
+            await save_storage_state(self, page)
 
     async def _get_categories(self, response: Response, page: Page):
         await page.wait_for_timeout(3000)
@@ -207,20 +237,17 @@ class CruzverdeclSpider(scrapy.Spider):
             await self._await_products_loaded(page)
             await page.wait_for_load_state("domcontentloaded")
             try:
-                await page.wait_for_timeout(2000)
                 await page.wait_for_selector(cruzverdecl.SELECTOR_GET_ALL_PRODUCTS, timeout=60000)
-                await page.wait_for_timeout(2000)
             except Exception as e:
                 self.logger.warning("No se encontraron productos")
                 break
 
             try:
                 await page.wait_for_selector(cruzverdecl.SELECTOR_PRODUCT_NAME, timeout=60000)
-                html_content = await page.content()
-                scrapy_selector = scrapy.Selector(text=html_content)
-
-                products = scrapy_selector.css(
-                    cruzverdecl.SELECTOR_GET_ALL_PRODUCTS)
+                # Sustituye las dos pausas de 2 s alrededor de la espera de las cards
+                await wait_for_grid(self, page, cruzverdecl.SELECTOR_GET_ALL_PRODUCTS, fixed_ms=4000)
+                products, _ = await extract_cards(
+                    self, page, cruzverdecl.SELECTOR_GET_ALL_PRODUCTS, cruzverdecl.CARD_FIELDS)
                 for product_card in products:
                     try:
                         item = self.take_products_fields(
@@ -239,9 +266,9 @@ class CruzverdeclSpider(scrapy.Spider):
             except Exception as e:
                 self.logger.error(
                     f"Error encontrado para esta categoría {category} y sub {sub_category}:\n Error {e}")
-            await page.wait_for_timeout(2000)
+                await page.wait_for_timeout(2000)
 
-        await page.close()
+        await release_page(self, page)
         self.logger.info(
             f"Finalizada la extracción de productos para la categoría {category} y la subcategoría '{sub_category}'.")
 
@@ -250,11 +277,12 @@ class CruzverdeclSpider(scrapy.Spider):
             next_page_button: Locator = page.locator(
                 cruzverdecl.XPATH_CLICK_NEXT_PAGE)
             if await next_page_button.count() > 0:
+                previous = await grid_signature(page, cruzverdecl.SELECTOR_GET_ALL_PRODUCTS)
                 await next_page_button.first.click()
                 self.logger.info(
                     "Cargando más productos haciendo clic en el botón 'Cargar más'...")
-                # Esperar a que se carguen los nuevos productos
-                await page.wait_for_timeout(2000)
+                # Esperar a que se carguen los nuevos productos (antes 2 s tras el clic y 2 s más por vuelta)
+                await wait_for_grid(self, page, cruzverdecl.SELECTOR_GET_ALL_PRODUCTS, previous, fixed_ms=4000)
                 return True
             else:
                 self.logger.info(
@@ -264,12 +292,29 @@ class CruzverdeclSpider(scrapy.Spider):
             self.logger.error(f"Boton no encontrado, fin de la categoría")
             return False
 
+    def take_captured_fields(self, row, category, sub_category):
+        name = row['name'].strip()
+        price = float(row['price'] or 0)
+        quantity, unit_type, unit_price = parse_units(name, cruzverdecl.UNIT_PROFILE, price)
+        return ProductItem(
+            name=name,
+            category=category,
+            sub_category=sub_category,
+            price=price,
+            unit_price=unit_price,
+            total_unit_quantity=quantity,
+            unit_type=unit_type,
+            comercial_name=cruzverdecl.NAME,
+            comercial_id=cruzverdecl.ID,
+        )
+
     def take_products_fields(self, product_card: scrapy.Selector, category, sub_category):
-        item = ScraperItem()
+        item = ProductItem()
         price = product_card.xpath(cruzverdecl.XPATH_GET_PRICE).getall()
-        if len(price) > 0:
-            item['price'] = float(price[0].replace(
-                '$', '').replace('.', '').strip())
+        if len(price) == 0:
+            raise ValueError("Precio de producto no encontrado")
+        item['price'] = float(price[0].replace(
+            '$', '').replace('.', '').strip())
         try:
             name = product_card.xpath(
                 cruzverdecl.XPATH_GET_NAME).get().strip()
@@ -277,17 +322,10 @@ class CruzverdeclSpider(scrapy.Spider):
             raise ValueError(
                 f"Nombre de producto no encontrado ")
         item['name'] = name
-        matches = re.findall(
-            r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|lt|kg|onz|mg|comprimido|lb|unidades|unideades|un|cm|m|u|grs|und|unds)\b)', name, re.IGNORECASE)
-        if len(matches) > 0:
-            value = matches[-1]
-            item['total_unit_quantity'] = float(value[0].replace(',', '.'))
-            item['unit_type'] = value[1].strip().lower()
-        else:
-            item['total_unit_quantity'] = 1
-            item['unit_type'] = 'un'
-
-        item['unit_price'] = float(item['price'] / item['total_unit_quantity'])
+        quantity, unit_type, unit_price = parse_units(name, cruzverdecl.UNIT_PROFILE, item['price'])
+        item['total_unit_quantity'] = quantity
+        item['unit_type'] = unit_type
+        item['unit_price'] = unit_price
 
         item['category'] = category
         item['sub_category'] = sub_category
@@ -295,31 +333,15 @@ class CruzverdeclSpider(scrapy.Spider):
         return item
 
     async def _await_products_loaded(self, page: Page):
-        # Espera inicial para asegurarse de que la página esté completamente cargada
-        previous_height = -1
-        while True:
-            try:
-                await page.wait_for_selector(cruzverdecl.SELECTOR_CONTAINER_PRODUCTS, timeout=60000)
-            except Exception:
-                self.logger.warning(
-                    "El contenedor de productos no apareció. Saltando el scroll.")
-                break
-            current_height = await page.evaluate(f"document.querySelector('{cruzverdecl.SELECTOR_CONTAINER_PRODUCTS}').scrollHeight")
-
-            if current_height == previous_height:
-                self.logger.info(
-                    "La altura del contenedor se ha estabilizado. Scroll finalizado para esta página.")
-                await page.wait_for_timeout(2000)
-                break
-
-            try:
-                previous_height = current_height
-                self.logger.info("Haciendo scroll hasta el final...")
-                await page.evaluate(f"window.scrollTo(0, {current_height})")
-                await page.wait_for_timeout(2000)
-            except Exception as e:
-                self.logger.error(f"Error durante el scroll: {e}")
-                break
+        try:
+            await page.wait_for_selector(cruzverdecl.SELECTOR_CONTAINER_PRODUCTS, timeout=60000)
+        except Exception:
+            self.logger.warning(
+                "El contenedor de productos no apareció. Saltando el scroll.")
+            return
+        # Un solo evaluate: scroll, espera a que crezca la grilla y repite hasta que se estabiliza
+        await scroll_until_stable(self, page, cruzverdecl.SELECTOR_CONTAINER_PRODUCTS,
+                                  cruzverdecl.SELECTOR_GET_ALL_PRODUCTS, step_ms=2000)
 
     async def handle_error(self, failure):
         """Manejador de errores genérico. Cierra la página y loguea."""
@@ -1,8 +1,13 @@
-import re
 import playwright
 import scrapy
 from scrapy_playwright.page import PageMethod
-from scraper.items import ScraperItem
+from scraper.items import ProductItem
+from scraper.spiders.utils.extract import extract_cards
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.page_state import page_state_products, product_id, state_price
+from scraper.spiders.utils.units import parse_units
+from scraper.spiders.utils.scroll import scroll_until_stable
+from scraper.spiders.utils.waits import grid_signature, wait_for_grid
 from scraper.spiders.constants import falabellacol
 from scrapy.http import Response
 from playwright.async_api import Page, Locator
@@ -12,6 +17,7 @@ class FalabellacolSpider(scrapy.Spider):
     name = "falabellacol"
     pais = "colombia"
     allowed_domains = ["www.falabella.com.co"]
+    blocked_domains = falabellacol.BLOCKED_DOMAINS
     start_urls = ["https://www.falabella.com.co/falabella-co"]
 
     async def start(self):
@@ -34,7 +40,7 @@ class FalabellacolSpider(scrapy.Spider):
     async def orchestrate_requests(self, response: Response):
         page: Page = response.meta["playwright_page"]
         categories_urls = await self._get_categories(page)
-        await page.close()
+        await release_page(self, page)
         self.logger.info(
             "Categorías y subcategorías obtenidas, comenzando solicitudes...")
         for category, subcategories in categories_urls.items():
@@ -143,51 +149,62 @@ class FalabellacolSpider(scrapy.Spider):
 
         self.logger.info(
             f"Extrayendo productos de la categoría '{category}' y subcategoría '{sub_category}' en {response.url}")
+        # Ids de producto ya emitidos, del JSON de estado o de las cards: tras cada
+        # "Cargar más" solo salen los nuevos y un estado sin actualizar se detecta
+        seen = set()
         while True:
-            await self._await_products_loaded(page)
-            await page.wait_for_load_state("domcontentloaded")
-            try:
-                await page.wait_for_timeout(2000)
-                await page.wait_for_selector(falabellacol.SELECTOR_PRODUCT_CARDS)
-                await page.wait_for_timeout(2000)
-            except TimeoutError as e:
-                self.logger.warning("No se encontraron productos")
-                break
+            state_products = None
+            if self.settings.getbool('PAGE_STATE_EXTRACTION', True):
+                state_products = await page_state_products(
+                    self, page, falabellacol.STATE_RESULTS_PATH, seen)
+            if state_products is not None:
+                for product in state_products:
+                    item = self.take_state_fields(product, category, sub_category)
+                    if item is not None:
+                        yield item
+            else:
+                self.crawler.stats.inc_value('page_state/fallbacks')
+                await self._await_products_loaded(page)
+                await page.wait_for_load_state("domcontentloaded")
+                try:
+                    await page.wait_for_selector(falabellacol.SELECTOR_PRODUCT_CARDS)
+                except TimeoutError as e:
+                    self.logger.warning("No se encontraron productos")
+                    break
 
-            try:
-                await page.wait_for_selector(falabellacol.SELECTOR_PRODUCT_NAME, timeout=60000)
-                await page.wait_for_timeout(2000)
-                html_content = await page.content()
-                scrapy_selector = scrapy.Selector(text=html_content)
-
-                products = scrapy_selector.xpath(
-                    falabellacol.XPATH_PRODUCT_CARDS)
-                for product_card in products:
-                    try:
-                        item = self.take_products_fields(
-                            product_card, category, sub_category)
-                    except Exception as e:
-                        self.logger.error(
-                            f"Saltando este producto. Error: {e} \n Produc card: {product_card}")
-                        continue
-
-                    item['comercial_name'] = falabellacol.NAME
-                    item['comercial_id'] = falabellacol.ID
-                    yield item
-
-            except Exception as e:
-                self.logger.error(
-                    f"Error encontrado para esta categoría {category} y sub {sub_category}:\n Error {e}")
-            await page.wait_for_timeout(2000)
+                try:
+                    await page.wait_for_selector(falabellacol.SELECTOR_PRODUCT_NAME, timeout=60000)
+                    # Sustituye las tres pausas de 2 s antes de leer las cards
+                    await wait_for_grid(self, page, falabellacol.XPATH_PRODUCT_CARDS, fixed_ms=6000)
+                    products, _ = await extract_cards(
+                        self, page, falabellacol.XPATH_PRODUCT_CARDS, falabellacol.CARD_FIELDS, seen=seen,
+                        card_key=product_id)
+                    for product_card in products:
+                        try:
+                            item = self.take_products_fields(
+                                product_card, category, sub_category)
+                        except Exception as e:
+                            self.logger.error(
+                                f"Saltando este producto. Error: {e} \n Produc card: {product_card}")
+                            continue
+
+                        item['comercial_name'] = falabellacol.NAME
+                        item['comercial_id'] = falabellacol.ID
+                        yield item
+
+                except Exception as e:
+                    self.logger.error(
+                        f"Error encontrado para esta categoría {category} y sub {sub_category}:\n Error {e}")
             try:
                 next_page_button: Locator = page.locator(
                     falabellacol.XPATH_NEXT_PAGE_BUTTON)
                 if await next_page_button.count() > 0:
+                    previous = await grid_signature(page, falabellacol.XPATH_PRODUCT_CARDS)
                     await next_page_button.first.click()
                     self.logger.info(
                         "Cargando más productos haciendo clic en el botón 'Cargar más'...")
-                    # Esperar a que se carguen los nuevos productos
-                    await page.wait_for_timeout(2000)
+                    # Esperar a que se carguen los nuevos productos (antes 2 s antes y después del clic)
+                    await wait_for_grid(self, page, falabellacol.XPATH_PRODUCT_CARDS, previous, fixed_ms=4000)
                 else:
                     self.logger.info(
                         "No hay más productos para cargar en esta subcategoría.")
@@ -195,7 +212,7 @@ class FalabellacolSpider(scrapy.Spider):
             except playwright._impl._errors.TimeoutError as e:
                 self.logger.error(f"Boton no encontrado, fin de la categoría")
                 break
-        await page.close()
+        await release_page(self, page)
         self.logger.info(
             f"Finalizada la extracción de productos para la categoría {category} y la subcategoría '{sub_category}'.")
 
@@ -221,7 +238,7 @@ class FalabellacolSpider(scrapy.Spider):
             raise ValueError("Price product not found")
 
     def take_products_fields(self, product_card: scrapy.Selector, category, sub_category):
-        item = ScraperItem()
+        item = ProductItem()
         price = self._get_price(product_card)
         if price:
             item['price'] = price
@@ -232,49 +249,45 @@ class FalabellacolSpider(scrapy.Spider):
             raise ValueError(
                 f"Nombre de producto no encontrado ")
         item['name'] = name
-        matches = re.findall(
-            r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|lt|kg|onz|lb|unidades|unideades|un|cm|m|u|grs|und|unds)\b)', name, re.IGNORECASE)
-        if len(matches) > 0:
-            value = matches[-1]
-            item['total_unit_quantity'] = float(value[0].replace(',', '.'))
-            item['unit_type'] = value[1].lower()
-        else:
-            item['total_unit_quantity'] = 1
-            item['unit_type'] = 'un'
-
-        item['unit_price'] = float(item['price'] / item['total_unit_quantity'])
+        quantity, unit_type, unit_price = parse_units(name, falabellacol.UNIT_PROFILE, item['price'])
+        item['total_unit_quantity'] = quantity
+        item['unit_type'] = unit_type
+        item['unit_price'] = unit_price
 
         item['category'] = category
         item['sub_category'] = sub_category
 
         return item
 
-    async def _await_products_loaded(self, page: Page):
-        # Espera inicial para asegurarse de que la página esté completamente cargada
-        previous_height = -1
-        while True:
-            try:
-                await page.wait_for_selector(falabellacol.SELECTOR_CONTAINER_PRODUCTS, timeout=60000)
-            except Exception:
-                self.logger.warning(
-                    "El contenedor de productos no apareció. Saltando el scroll.")
-                break
-            current_height = await page.evaluate(f"document.querySelector('{falabellacol.SELECTOR_CONTAINER_PRODUCTS}').scrollHeight")
-
-            if current_height == previous_height:
-                self.logger.info(
-                    "La altura del contenedor se ha estabilizado. Scroll finalizado para esta página.")
-                await page.wait_for_timeout(3000)
-                break
+    def take_state_fields(self, product, category, sub_category):
+        name = (product.get('name') or '').strip()
+        price = state_price(product, falabellacol.STATE_PRICE_TYPES)
+        if not name or price is None:
+            self.logger.error(f"Saltando este producto del estado de la página: {product}")
+            return None
+        quantity, unit_type, unit_price = parse_units(name, falabellacol.UNIT_PROFILE, price)
+        return ProductItem(
+            name=name,
+            category=category,
+            sub_category=sub_category,
+            price=price,
+            unit_price=unit_price,
+            total_unit_quantity=quantity,
+            unit_type=unit_type,
+            comercial_name=falabellacol.NAME,
+            comercial_id=falabellacol.ID,
+        )
 
-            try:
-                previous_height = current_height
-                self.logger.info("Haciendo scroll hasta el final...")
-                await page.evaluate(f"window.scrollTo(0, {current_height})")
-                await page.wait_for_timeout(3000)
-            except Exception as e:
-                self.logger.error(f"Error durante el scroll: {e}")
-                break
+    async def _await_products_loaded(self, page: Page):
+        try:
+            await page.wait_for_selector(falabellacol.SELECTOR_CONTAINER_PRODUCTS, timeout=60000)
+        except Exception:
+            self.logger.warning(
+                "El contenedor de productos no apareció. Saltando el scroll.")
+            return
+        # Un solo evaluate: scroll, espera a que crezca la grilla y repite hasta que se estabiliza
+        await scroll_until_stable(self, page, falabellacol.SELECTOR_CONTAINER_PRODUCTS,
+                                  falabellacol.XPATH_PRODUCT_CARDS, step_ms=3000)
 
     async def handle_error(self, failure):
         """Manejar errores de requests incluyendo timeouts"""
@@ -1,7 +1,12 @@
 import re
 import scrapy
 from scrapy_playwright.page import PageMethod
-from scraper.items import ScraperItem
+from scraper.items import ProductItem
+from scraper.spiders.utils.capture import ResponseCapture
+from scraper.spiders.utils.extract import extract_cards
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.units import parse_units
+from scraper.spiders.utils.scroll import scroll_until_stable
 from scrapy.http import Response
 from playwright.async_api import Page
 import time
@@ -13,6 +18,7 @@ class InkafarmaSpider(scrapy.Spider):
     name = "inkafarma"
     pais = "peru"
     allowed_domains = ["inkafarma.pe"]
+    blocked_domains = inkafarma.BLOCKED_DOMAINS
 
     def __init__(self, custom_urls=None, *args, **kwargs):
         super(InkafarmaSpider, self).__init__(*args, **kwargs)
@@ -50,6 +56,10 @@ class InkafarmaSpider(scrapy.Spider):
         urls, subcategories = self._process_input_urls(self.custom_urls)
         for i, (url, subcategory) in enumerate(zip(urls, subcategories)):
             unique_url = f"{url}?scrapy_index={i}&ts={int(time.time())}"
+            page_methods = [PageMethod("wait_for_load_state", "domcontentloaded")]
+            capture = ResponseCapture.for_retailer(self, inkafarma)
+            if capture is None:
+                page_methods.append(PageMethod("wait_for_timeout", 5000))
             yield scrapy.Request(
                 url=unique_url,
                 callback=self.parse_category,
@@ -61,10 +71,10 @@ class InkafarmaSpider(scrapy.Spider):
                         "wait_until": "domcontentloaded",  # Solo esperar DOM, no todos los recursos
                         "timeout": 30000,
                     },
-                    "playwright_page_methods": [
-                        PageMethod("wait_for_load_state", "domcontentloaded"),
-                        PageMethod("wait_for_timeout", 5000),
-                    ],
+                    "playwright_page_methods": page_methods,
+                    # Los productos llegan por XHR mientras Angular renderiza la lista
+                    "playwright_page_event_handlers": {"response": capture.on_response} if capture else {},
+                    "xhr_capture": capture,
                 },
                 dont_filter=True
             )
@@ -72,42 +82,49 @@ class InkafarmaSpider(scrapy.Spider):
     async def parse_category(self, response):
         """Parsea una categoría específica con scroll infinito"""
         page = response.meta["playwright_page"]
+        # Fuera del try: el except la usa aunque falle lo primero
+        current_url = response.url
 
         try:
             # Obtener la URL actual
             current_url = page.url
             self.logger.info(f"🚀 Procesando categoría: {current_url}")
 
-            # Esperar a que se carguen los productos iniciales
-            await self.await_products_loaded(page)
-
-            # Realizar scroll infinito para cargar TODOS los productos
-            productos_cargados = await self.scroll_to_load_all_products(page)
+            # Si la API de la lista respondió, los productos salen de las
+            # respuestas XHR y no hace falta esperar al renderizado
+            capture = response.meta.get("xhr_capture")
+            if capture is not None:
+                wait = self.settings.getfloat('XHR_CAPTURE_TIMEOUT', 10)
+                first_items = list(self.parse_captured(await capture.drain(wait)))
+                if not first_items:
+                    self.logger.info("Sin respuestas XHR de productos, se lee el DOM")
+                    self.crawler.stats.inc_value('capture/fallbacks')
+                    capture = None
+            if capture is None:
+                # Esperar a que se carguen los productos iniciales
+                await self.await_products_loaded(page)
+                first_items = []
+
+            # Scroll infinito: los productos se emiten a medida que se cargan,
+            # procesando en cada paso solo las cards nuevas
+            seen = set()
+            total_productos = len(first_items)
+            for item in first_items:
+                yield item
+            async for items in self.scroll_products(page, seen, capture):
+                total_productos += len(items)
+                for item in items:
+                    yield item
             self.logger.info(
-                f"✅ Total productos cargados: {productos_cargados}")
-
-            # Obtener el HTML actualizado después del scroll
-            content = await page.content()
-
-            # Cerrar la página
-            await page.close()
-
-            # Crear una nueva response con el contenido completo
-            from scrapy.http import HtmlResponse
-            updated_response = HtmlResponse(
-                url=response.url,
-                body=content,
-                encoding='utf-8'
-            )
+                f"✅ Total productos extraídos: {total_productos}")
 
-            # Parsear todos los productos
-            for item in self.parse_products(updated_response):
-                yield item
+            # Devolver la página al pool (o cerrarla)
+            await release_page(self, page)
 
         except Exception as e:
             self.logger.error(
                 f"❌ Error al procesar categoría {current_url}: {e}")
-            if 'page' in locals():
+            if not page.is_closed():
                 await page.close()
 
     async def await_products_loaded(self, page):
@@ -125,67 +142,57 @@ class InkafarmaSpider(scrapy.Spider):
             # Esperar tiempo mínimo y continuar
             await page.wait_for_timeout(2000)
 
-    async def scroll_to_load_all_products(self, page):
-        previous_height = -1
+    async def scroll_products(self, page, seen, capture=None):
+        """
+        Hacer scroll hasta que dejen de aparecer cards, devolviendo después de
+        cada tramo de scroll (varios pasos en un solo evaluate) los items nuevos.
+        Con `capture` los items salen de las respuestas XHR y no del DOM.
+        """
         scroll_attempts = 0
         max_attempts = 50
+        steps_per_batch = 3
 
-        while scroll_attempts < max_attempts:
-            try:
-                # Esperar a que el contenedor de productos esté completamente renderizado (timeout mínimo)
-                await page.wait_for_selector(inkafarma.SELECTOR_PRODUCTOS_CONTAINER, timeout=5000)
-
-                # Obtener la altura actual del contenedor de productos
-                current_height = await page.evaluate(f"document.querySelector('{inkafarma.SELECTOR_PRODUCTOS_CONTAINER}').scrollHeight")
+        items = await self._new_items(page, seen, capture)
+        if items:
+            yield items
 
+        while scroll_attempts < max_attempts:
+            # SELECTOR_PRODUCTOS_CONTAINER es la primera card: se mide la página entera
+            count, iterations = await scroll_until_stable(
+                self, page, None, inkafarma.XPATH_PRODUCTOS_LISTA,
+                step_ms=1500, max_iterations=steps_per_batch)
+            scroll_attempts += max(iterations, 1)
+
+            items = await self._new_items(page, seen, capture)
+            if items:
+                yield items
+
+            # Menos pasos que los pedidos: la lista se estabilizó dentro del tramo
+            if iterations < steps_per_batch:
                 self.logger.info(
-                    f"📏 Scroll {scroll_attempts + 1}: Altura del contenedor: {current_height}px")
-
-                # Si la altura no cambió, significa que no hay más productos que cargar
-                if current_height == previous_height:
-                    self.logger.info(
-                        "🛑 La altura del contenedor se estabilizó. Scroll finalizado.")
-                    break
-
-                previous_height = current_height
+                    f"🛑 La lista se estabilizó con {count} cards. Scroll finalizado.")
+                break
 
-                # Hacer scroll hasta el final de la página actual
-                self.logger.info("📜 Haciendo scroll hasta el final...")
-                await page.evaluate(f"window.scrollTo(0, {current_height})")
-                # Reducir tiempo de espera entre scrolls (mínimo necesario)
-                await page.wait_for_timeout(1500)
-                scroll_attempts += 1
-
-            except Exception as e:
-                self.logger.warning(
-                    f"⚠️ Error durante scroll {scroll_attempts + 1}: {e}")
-                # Si falla el contenedor, intentar scroll básico
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(1000)
-                scroll_attempts += 1
-
-        # Obtener el conteo final de productos
-        productos_finales = await page.locator(inkafarma.SELECTOR_PRODUCTO_CARD).count()
         self.logger.info(
-            f"🏁 Scroll finalizado después de {scroll_attempts} intentos: {productos_finales} productos cargados")
-        return productos_finales
+            f"🏁 Scroll finalizado después de {scroll_attempts} intentos")
 
-    def parse_products(self, response):
+    async def _new_items(self, page, seen, capture):
+        if capture is not None:
+            return list(self.parse_captured(await capture.drain()))
+        productos, _ = await extract_cards(
+            self, page, inkafarma.XPATH_PRODUCTOS_LISTA, inkafarma.CARD_FIELDS, seen=seen)
+        return list(self.parse_products(productos))
+
+    def parse_products(self, productos):
         """
-        Extrae productos ÚNICAMENTE después de que el scroll se haya completado y la página esté estable.
-        Utiliza el selector correcto: //fp-filtered-product-list//fp-product-large (Card de producto)
+        Extrae los productos de un lote de cards nuevas de
+        //fp-filtered-product-list//fp-product-large (Card de producto)
         """
-        # Usar XPath para seleccionar todos los fp-product-large dentro de fp-filtered-product-list
-        productos = response.xpath(
-            "//fp-filtered-product-list//fp-product-large")
-
         self.logger.info(
-            f"🔍 Procesando {len(productos)} productos encontrados (DESPUÉS del scroll completo)")
+            f"🔍 Procesando {len(productos)} productos nuevos")
 
         for i, producto in enumerate(productos):
             try:
-                item = ScraperItem()
-
                 # Extraer nombre del producto
                 nombre_elem = producto.css(
                     inkafarma.SELECTOR_PRODUCTO_NOMBRE + "::text").get()
@@ -196,14 +203,6 @@ class InkafarmaSpider(scrapy.Spider):
                     inkafarma.SELECTOR_PRODUCTO_PRESENTACION + "::text").get()
                 presentacion = presentacion_elem.strip() if presentacion_elem else ""
 
-                # Crear nombre completo como solicita el usuario: "Nombre - Presentación"
-                if nombre and presentacion:
-                    nombre_completo = f"{nombre} - {presentacion}"
-                else:
-                    nombre_completo = nombre or "Sin nombre"
-
-                item['name'] = nombre_completo
-
                 # Extraer precio
                 precio_elem = producto.css(
                     inkafarma.SELECTOR_PRODUCTO_PRECIO + "::text").get()
@@ -229,56 +228,54 @@ class InkafarmaSpider(scrapy.Spider):
                 # Tomar el precio más bajo (generalmente el precio de oferta)
                 precio = min(precios) if precios else 0.0
 
-                item['price'] = precio
+                yield self.build_item(nombre, presentacion, precio)
 
-                # Calcular precio unitario basado en la presentación
-                unit_price = self.calculate_unit_price(precio, presentacion)
-                item['unit_price'] = unit_price
+            except Exception as e:
+                self.logger.error(f"❌ Error procesando producto {i+1}: {e}")
+                continue
 
-                # Extraer cantidad y unidad de la presentación
-                quantity, unit_type = self.extract_quantity_and_unit(
-                    presentacion)
-                item['total_unit_quantity'] = quantity
-                item['unit_type'] = unit_type
+        self.logger.info(
+            f"✅ Lote completado: {len(productos)} productos extraídos")
 
-                item['category'] = "Farmacia"
+    def parse_captured(self, rows):
+        """Productos capturados de las respuestas XHR de la lista (ResponseCapture)"""
+        self.logger.info(
+            f"🔍 Procesando {len(rows)} productos capturados de la API")
 
-                # Información comercial
-                item['comercial_name'] = inkafarma.COMERCIAL_NAME
-                item['comercial_id'] = inkafarma.COMERCIAL_ID
+        for row in rows:
+            try:
+                yield self.build_item(str(row["name"]).strip(),
+                                      str(row.get("presentation") or "").strip(),
+                                      float(row.get("price") or 0))
+            except (TypeError, ValueError) as e:
+                self.logger.error(f"❌ Error procesando producto capturado {row}: {e}")
+
+    def build_item(self, nombre, presentacion, precio):
+        item = ProductItem()
+
+        # Crear nombre completo como solicita el usuario: "Nombre - Presentación"
+        if nombre and presentacion:
+            nombre_completo = f"{nombre} - {presentacion}"
+        else:
+            nombre_completo = nombre or "Sin nombre"
 
-                yield item
+        item['name'] = nombre_completo
+        item['price'] = precio
 
-            except Exception as e:
-                self.logger.error(f"❌ Error procesando producto {i+1}: {e}")
-                continue
+        # Cantidad, unidad y precio unitario según la presentación
+        quantity, unit_type, unit_price = parse_units(
+            presentacion, inkafarma.UNIT_PROFILE, precio)
+        item['unit_price'] = round(unit_price, 2)
+        item['total_unit_quantity'] = quantity
+        item['unit_type'] = unit_type
 
-        self.logger.info(
-            f"✅ Scraping completado: {len(productos)} productos extraídos (después del scroll completo)")
+        item['category'] = "Farmacia"
 
-    def calculate_unit_price(self, precio_total, presentacion):
-        try:
-            match = inkafarma.REGEX_CANTIDAD_PRESENTACION.search(presentacion)
-            if match:
-                cantidad = float(match.group(1))
-                if cantidad > 0:
-                    return round(precio_total / cantidad, 2)
-            return precio_total
-        except Exception:
-            return precio_total
+        # Información comercial
+        item['comercial_name'] = inkafarma.COMERCIAL_NAME
+        item['comercial_id'] = inkafarma.COMERCIAL_ID
 
-    def extract_quantity_and_unit(self, presentacion):
-        """Extrae cantidad y unidad de la presentación"""
-        try:
-            match = inkafarma.REGEX_CANTIDAD_PRESENTACION.search(presentacion)
-            if match:
-                cantidad = float(match.group(1))
-                unidad = match.group(2).lower()
-                return cantidad, unidad
-            # Si no encuentra patrón específico, asumir 1 unidad
-            return 1.0, "un"
-        except Exception:
-            return 1.0, "un"
+        return item
 
     def extract_category_from_url(self, url):
         """Extrae la categoría desde la URL"""
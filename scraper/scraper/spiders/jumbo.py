@@ -1,16 +1,27 @@
 import re
 import scrapy
 from scrapy_playwright.page import PageMethod
-from scraper.items import ScraperItem
+from scraper.items import ProductItem
+from scraper.spiders.utils.extract import extract_cards
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.units import DEFAULT_UNIT, match_units
+from scraper.spiders.utils.vtex import VtexCatalogMixin
+from scraper.spiders.utils.scroll import scroll_until_stable
+from scraper.spiders.utils.storage_state import gate_timeout, save_storage_state
+from scraper.spiders.utils.waits import grid_signature, wait_for_grid
 from scraper.spiders.constants import jumbo
 from scrapy.http import Response
 from playwright.async_api import Page
 
 
-class JumboSpider(scrapy.Spider):
+class JumboSpider(VtexCatalogMixin, scrapy.Spider):
     name = "jumbo"
     pais = "colombia"
     allowed_domains = ["www.jumbocolombia.com"]
+    blocked_domains = jumbo.BLOCKED_DOMAINS
+    vtex_base_url = jumbo.BASE_URL
+    vtex_comercial_name = jumbo.NAME
+    vtex_comercial_id = jumbo.ID
 
     def __init__(self, name=None, **kwargs):
         super().__init__(name, **kwargs)
@@ -29,31 +40,39 @@ class JumboSpider(scrapy.Spider):
                 jumbo.START_URLS_SUPERMARKET_2 + jumbo.START_URLS_ELECTRO
 
     async def start(self):
+        if self.vtex_api_mode():
+            self.logger.info("Modo API: recorriendo el catálogo VTEX sin navegador...")
+            for url in self.start_urls:
+                yield self.vtex_request(url)
+            return
         self.logger.info("Lanzando navegador Playwright...")
         for url in self.start_urls:
             self.logger.info(
                 f"Iniciando scraping para la categoría principal: {url}")
-            yield scrapy.Request(
-                url,
-                meta=dict(playwright=True, playwright_include_page=True,
-                          playwright_page_methods=[
-                              PageMethod(
-                                  "wait_for_selector", jumbo.SELECTOR_LOAD_PRODUCTS, timeout=90000),
-                          ],
-                          playwright_page_goto_kwargs={
-                              "wait_until": "domcontentloaded",
-                              "timeout": 60000
-                          }
-                          ),
-
-                callback=self.orchestrator,
-                errback=self.handle_error
-            )
+            yield self.browser_request(url)
         self.logger.info("Todas las solicitudes iniciales han sido enviadas.")
 
-    async def handle_age_verification(self, page: Page):
+    def browser_request(self, url, index=None):
+        return scrapy.Request(
+            url,
+            meta=dict(playwright=True, playwright_include_page=True,
+                      playwright_page_methods=[
+                          PageMethod(
+                              "wait_for_selector", jumbo.SELECTOR_LOAD_PRODUCTS, timeout=90000),
+                      ],
+                      playwright_page_goto_kwargs={
+                          "wait_until": "domcontentloaded",
+                          "timeout": 60000
+                      }
+                      ),
+
+            callback=self.orchestrator,
+            errback=self.handle_error
+        )
+
+    async def handle_age_verification(self, page: Page, meta=None):
         try:
-            await page.wait_for_selector(jumbo.SELECTOR_OLDER_AGE, timeout=10000)
+            await page.wait_for_selector(jumbo.SELECTOR_OLDER_AGE, timeout=gate_timeout(self, meta, 10000))
             original_url = page.url
             self.logger.info(
                 "Página de verificación de edad detectada. Intentando hacer clic en el botón...")
@@ -64,6 +83,7 @@ class JumboSpider(scrapy.Spider):
                     "Clic en el botón de verificación de edad realizado.")
                 # Espera para asegurarse de que la página se actualice
                 await page.wait_for_timeout(2000)
+                await save_storage_state(self, page)
                 await page.goto(original_url, wait_until="domcontentloaded", timeout=60000)
             else:
                 self.logger.info(
@@ -82,7 +102,7 @@ class JumboSpider(scrapy.Spider):
         try:
             if ("cigarrillos-y-tabacos" in response.url):
                 await page.wait_for_timeout(2000)
-                await self.handle_age_verification(page)
+                await self.handle_age_verification(page, response.meta)
             total_products_element = await page.wait_for_selector(jumbo.SELECTOR_TOTAL_COUNT_PRODUCTS, timeout=15000)
             total_products_text = await total_products_element.inner_text()
             total_products = int(re.sub(r'[^\d]', '', total_products_text))
@@ -117,18 +137,18 @@ class JumboSpider(scrapy.Spider):
                 try:
                     async for item in self.save_products_count(page, page_number, response):
                         yield item
-                    await page.wait_for_timeout(2000)
                     next_page_button = page.locator(
                         f"xpath={jumbo.XPATH_CLICK_BUTTON}")
 
                     if await next_page_button.count() > 0:
                         self.logger.info(
                             "Botón 'Siguiente' encontrado. Navegando a la siguiente página...")
-                        await page.wait_for_timeout(2000)
+                        previous = await grid_signature(page, jumbo.XPATH_GET_ALL_PRODUCTS)
                         await next_page_button.first.click()
                         self.logger.info(
                             "Clic en el botón 'Siguiente' realizado.")
-                        await page.wait_for_timeout(2000)
+                        # Sustituye las tres pausas de 2 s alrededor del clic
+                        await wait_for_grid(self, page, jumbo.XPATH_GET_ALL_PRODUCTS, previous, fixed_ms=6000)
                         await page.wait_for_selector(jumbo.SELECTOR_LOAD_PRODUCTS, timeout=90000)
                         page_number += 1
                     else:
@@ -143,8 +163,8 @@ class JumboSpider(scrapy.Spider):
             self.logger.error(
                 f"Error al parsear la categoría {response.url} en la página {page_number}: {e}")
         finally:
-            await page.close()
-            self.logger.info(f"Cerrada la página para {response.url}")
+            await release_page(self, page)
+            self.logger.info(f"Liberada la página para {response.url}")
 
     async def discover_subcategories(self, response: Response):
         page: Page = response.meta["playwright_page"]
@@ -178,7 +198,7 @@ class JumboSpider(scrapy.Spider):
             self.logger.error(
                 f"Error al descubrir subcategorías en {response.url}: {e}")
         finally:
-            await page.close()
+            await release_page(self, page)
 
         # Etapa 2: Por cada URL encontrada, lanzamos el scraper de productos
         for url in subcategory_urls:
@@ -201,9 +221,10 @@ class JumboSpider(scrapy.Spider):
             self.logger.info(
                 f"Scrapeando página {page_number} de '{response.url}'...")
             await self.await_products_loaded(page)
-            html_content = await page.content()
-            scrapy_selector = scrapy.Selector(text=html_content)
-            breadcrumbs = scrapy_selector.xpath(
+            product_cards, page_selector = await extract_cards(
+                self, page, jumbo.XPATH_GET_ALL_PRODUCTS,
+                jumbo.CARD_FIELDS, jumbo.PAGE_FIELDS)
+            breadcrumbs = page_selector.xpath(
                 jumbo.XPATH_GET_BREADCRUMBS).getall()
             cat_sub = response.url.replace(
                 "https://www.jumbocolombia.com/", "").split('/')
@@ -219,7 +240,7 @@ class JumboSpider(scrapy.Spider):
 
             category = breadcrumbs[0]
             sub_category = breadcrumbs[1]
-            for product_card in scrapy_selector.xpath(jumbo.XPATH_GET_ALL_PRODUCTS):
+            for product_card in product_cards:
                 yield self.take_products_fields(product_card, category, sub_category)
         except Exception as e:
             self.logger.error(
@@ -227,30 +248,27 @@ class JumboSpider(scrapy.Spider):
             self.logger.error(
                 f"Producto no guardado con breadcrumbs: {breadcrumbs}")
 
+    def vtex_unit_data(self, name, price, measurement):
+        """
+        Modo 'api': como take_products_fields cuando la card no trae PUM
+        (cantidad y unidad del nombre tal como se escriben, precio / cantidad).
+        El PUM que pinta el sitio (calculate-pum) no viene en la API de
+        catálogo, así que en este modo unit_price siempre es el calculado.
+        """
+        text = f"{name} {measurement}" if measurement else name
+        quantity, unit_type = match_units(text, jumbo.UNIT_PROFILE)
+        return price / quantity, quantity, unit_type or DEFAULT_UNIT
+
     def take_products_fields(self, product_card: scrapy.Selector, category, sub_category):
 
-        item = ScraperItem()
+        item = ProductItem()
 
         try:
-            name = product_card.xpath('.//h3/span//text()').get().strip()
+            name = product_card.xpath(jumbo.XPATH_GET_NAME).get().strip()
             item['name'] = name
-            matches = re.findall(
-                r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|lt|kg|onz|lb|unidades|unideades|un|cm|m|u|grs|und|unds)\b)', name, re.IGNORECASE)
-            if len(matches) > 0:
-                value = matches[-1]
-                item['total_unit_quantity'] = float(value[0].replace(',', '.'))
-                item['unit_type'] = value[1]
-            else:
-                matches = re.findall(
-                    jumbo.REGULAR_EXPRESSION_UNITS_SIMPLE, name.lower(), re.IGNORECASE)
-                if len(matches) > 0:
-                    value = matches[-1]
-                    item['total_unit_quantity'] = float(value.replace('.', '').replace(',', '.')) if type(
-                        value) == str else float(value[0].replace('.', '').replace(',', '.'))
-                    item['unit_type'] = 'un'
-                else:
-                    item["total_unit_quantity"] = 1
-                    item['unit_type'] = 'un'
+            quantity, unit_type = match_units(name, jumbo.UNIT_PROFILE)
+            item['total_unit_quantity'] = quantity
+            item['unit_type'] = unit_type or DEFAULT_UNIT
             item['category'] = category
             item['sub_category'] = sub_category
             item['comercial_name'] = jumbo.NAME
@@ -274,47 +292,21 @@ class JumboSpider(scrapy.Spider):
                     item['unit_price'] = float(
                         price_match.group(1).replace(',', '.'))
                 else:
-                    item['unit_price'] = float(
-                        item.get("price")) / float(item["total_unit_quantity"])
+                    item['unit_price'] = item['price'] / quantity
             else:
-                item['unit_price'] = float(
-                    item.get("price")) / float(item["total_unit_quantity"])
+                item['unit_price'] = item['price'] / quantity
 
             return item
         except Exception as e:
             self.logger.error(
-                f"Error al extraer campos del producto {item.__dict__}: {e}")
+                f"Error al extraer campos del producto {item}: {e}")
             return item
 
     async def await_products_loaded(self, page: Page):
-        # Espera inicial para asegurarse de que la página esté completamente cargada
-        await page.wait_for_timeout(2000)
         await page.wait_for_selector(jumbo.SELECTOR_LOAD_PRODUCTS, timeout=60000)
-        previous_height = -1
-        while True:
-            try:
-                await page.wait_for_selector(jumbo.SELECTOR_CONTAINER_PRODUCTS, timeout=60000)
-            except Exception:
-                self.logger.warning(
-                    "El contenedor de productos no apareció. Saltando el scroll.")
-                break
-            current_height = await page.evaluate(f"document.querySelector('{jumbo.SELECTOR_CONTAINER_PRODUCTS}').scrollHeight")
-
-            if current_height == previous_height:
-                self.logger.info(
-                    "La altura del contenedor se ha estabilizado. Scroll finalizado para esta página.")
-                break
-
-            try:
-                previous_height = current_height
-                self.logger.info("Haciendo scroll hasta el final...")
-                await page.evaluate(f"window.scrollTo(0, {current_height})")
-                # Espera crucial para dar tiempo a que se carguen y rendericen los nuevos productos
-                # Ajusta este tiempo según sea necesario
-                await page.wait_for_timeout(3000)
-            except Exception as e:
-                self.logger.error(f"Error durante el scroll: {e}")
-                break
+        # Un solo evaluate: scroll, espera a que crezca la grilla y repite hasta que se estabiliza
+        await scroll_until_stable(self, page, jumbo.SELECTOR_CONTAINER_PRODUCTS,
+                                  jumbo.XPATH_GET_ALL_PRODUCTS, step_ms=3000)
 
     async def errback_close_page(self, failure):
         # Callback de error robusto para cerrar la página si algo falla
@@ -1,7 +1,11 @@
 import re
 import scrapy
 from scrapy_playwright.page import PageMethod
-from scraper.items import ScraperItem
+from scraper.items import ProductItem
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.units import DEFAULT_UNIT, match_units
+from scraper.spiders.utils.scroll import scroll_until_stable
+from scraper.spiders.utils.waits import grid_signature, wait_for_grid
 from scraper.spiders.constants import jumbocl
 from scrapy.http import Response
 from playwright.async_api import Page
@@ -11,6 +15,7 @@ class jumboclclSpider(scrapy.Spider):
     name = "jumboclcl"
     pais = "chile"
     allowed_domains = ["www.jumbocl.cl"]
+    blocked_domains = jumbocl.BLOCKED_DOMAINS
     start_urls = ["https://www.jumbocl.cl/"]
 
     def __init__(self, name=None, **kwargs):
@@ -118,18 +123,18 @@ class jumboclclSpider(scrapy.Spider):
                 try:
                     async for item in self.save_products_count(page, page_number, response):
                         yield item
-                    await page.wait_for_timeout(2000)
                     next_page_button = page.locator(
                         f"xpath={jumbocl.XPATH_CLICK_BUTTON}")
 
                     if await next_page_button.count() > 0:
                         self.logger.info(
                             "Botón 'Siguiente' encontrado. Navegando a la siguiente página...")
-                        await page.wait_for_timeout(2000)
+                        previous = await grid_signature(page, jumbocl.XPATH_GET_ALL_PRODUCTS)
                         await next_page_button.first.click()
                         self.logger.info(
                             "Clic en el botón 'Siguiente' realizado.")
-                        await page.wait_for_timeout(2000)
+                        # Sustituye las tres pausas de 2 s alrededor del clic
+                        await wait_for_grid(self, page, jumbocl.XPATH_GET_ALL_PRODUCTS, previous, fixed_ms=6000)
                         await page.wait_for_selector(jumbocl.SELECTOR_LOAD_PRODUCTS, timeout=90000)
                         page_number += 1
                     else:
@@ -144,8 +149,8 @@ class jumboclclSpider(scrapy.Spider):
             self.logger.error(
                 f"Error al parsear la categoría {response.url} en la página {page_number}: {e}")
         finally:
-            await page.close()
-            self.logger.info(f"Cerrada la página para {response.url}")
+            await release_page(self, page)
+            self.logger.info(f"Liberada la página para {response.url}")
 
     async def discover_subcategories(self, response: Response):
         page: Page = response.meta["playwright_page"]
@@ -179,7 +184,7 @@ class jumboclclSpider(scrapy.Spider):
             self.logger.error(
                 f"Error al descubrir subcategorías en {response.url}: {e}")
         finally:
-            await page.close()
+            await release_page(self, page)
 
         # Etapa 2: Por cada URL encontrada, lanzamos el scraper de productos
         for url in subcategory_urls:
@@ -230,28 +235,14 @@ class jumboclclSpider(scrapy.Spider):
 
     def take_products_fields(self, product_card: scrapy.Selector, category, sub_category):
 
-        item = ScraperItem()
+        item = ProductItem()
 
         try:
             name = product_card.xpath('.//h3/span//text()').get().strip()
             item['name'] = name
-            matches = re.findall(
-                r'(\d+[\.,]?\d*)\s?((?:g|gr|ml|l|lt|kg|onz|lb|unidades|unideades|un|cm|m|u|grs|und|unds)\b)', name, re.IGNORECASE)
-            if len(matches) > 0:
-                value = matches[-1]
-                item['total_unit_quantity'] = float(value[0].replace(',', '.'))
-                item['unit_type'] = value[1]
-            else:
-                matches = re.findall(
-                    jumbocl.REGULAR_EXPRESSION_UNITS_SIMPLE, name.lower(), re.IGNORECASE)
-                if len(matches) > 0:
-                    value = matches[-1]
-                    item['total_unit_quantity'] = float(value.replace('.', '').replace(',', '.')) if type(
-                        value) == str else float(value[0].replace('.', '').replace(',', '.'))
-                    item['unit_type'] = 'un'
-                else:
-                    item["total_unit_quantity"] = 1
-                    item['unit_type'] = 'un'
+            quantity, unit_type = match_units(name, jumbocl.UNIT_PROFILE)
+            item['total_unit_quantity'] = quantity
+            item['unit_type'] = unit_type or DEFAULT_UNIT
             item['category'] = category
             item['sub_category'] = sub_category
             item['comercial_name'] = jumbocl.NAME
@@ -275,47 +266,21 @@ class jumboclclSpider(scrapy.Spider):
                     item['unit_price'] = float(
                         price_match.group(1).replace(',', '.'))
                 else:
-                    item['unit_price'] = float(
-                        item.get("price")) / float(item["total_unit_quantity"])
+                    item['unit_price'] = item['price'] / quantity
             else:
-                item['unit_price'] = float(
-                    item.get("price")) / float(item["total_unit_quantity"])
+                item['unit_price'] = item['price'] / quantity
 
             return item
         except Exception as e:
             self.logger.error(
-                f"Error al extraer campos del producto {item.__dict__}: {e}")
+                f"Error al extraer campos del producto {item}: {e}")
             return item
 
     async def await_products_loaded(self, page: Page):
-        # Espera inicial para asegurarse de que la página esté completamente cargada
-        await page.wait_for_timeout(2000)
         await page.wait_for_selector(jumbocl.SELECTOR_LOAD_PRODUCTS, timeout=60000)
-        previous_height = -1
-        while True:
-            try:
-                await page.wait_for_selector(jumbocl.SELECTOR_CONTAINER_PRODUCTS, timeout=60000)
-            except Exception:
-                self.logger.warning(
-                    "El contenedor de productos no apareció. Saltando el scroll.")
-                break
-            current_height = await page.evaluate(f"document.querySelector('{jumbocl.SELECTOR_CONTAINER_PRODUCTS}').scrollHeight")
-
-            if current_height == previous_height:
-                self.logger.info(
-                    "La altura del contenedor se ha estabilizado. Scroll finalizado para esta página.")
-                break
-
-            try:
-                previous_height = current_height
-                self.logger.info("Haciendo scroll hasta el final...")
-                await page.evaluate(f"window.scrollTo(0, {current_height})")
-                # Espera crucial para dar tiempo a que se carguen y rendericen los nuevos productos
-                # Ajusta este tiempo según sea necesario
-                await page.wait_for_timeout(3000)
-            except Exception as e:
-                self.logger.error(f"Error durante el scroll: {e}")
-                break
+        # Un solo evaluate: scroll, espera a que crezca la grilla y repite hasta que se estabiliza
+        await scroll_until_stable(self, page, jumbocl.SELECTOR_CONTAINER_PRODUCTS,
+                                  jumbocl.XPATH_GET_ALL_PRODUCTS, step_ms=3000)
 
     async def errback_close_page(self, failure):
         # Callback de error robusto para cerrar la página si algo falla
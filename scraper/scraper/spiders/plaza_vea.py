@@ -1,17 +1,26 @@
 import re
 import scrapy
 from scrapy_playwright.page import PageMethod
-from scraper.items import ScraperItem
+from scraper.items import ProductItem
+from scraper.spiders.utils.extract import extract_cards
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.units import match_units
+from scraper.spiders.utils.vtex import VtexCatalogMixin
+from scraper.spiders.utils.waits import grid_signature, wait_for_grid
 from .constants import plaza_vea
 from scrapy.http import Response
 from playwright.async_api import Page
 import time
 
 
-class PlazaVeaSpider(scrapy.Spider):
+class PlazaVeaSpider(VtexCatalogMixin, scrapy.Spider):
     name = "plaza_vea"
     pais = "peru"
     allowed_domains = ["www.plazavea.com.pe"]
+    blocked_domains = plaza_vea.BLOCKED_DOMAINS
+    vtex_base_url = plaza_vea.BASE_URL
+    vtex_comercial_name = plaza_vea.COMMERCIAL_NAME
+    vtex_comercial_id = plaza_vea.COMMERCIAL_ID
 
     def __init__(self, custom_urls=None, *args, **kwargs):
         super(PlazaVeaSpider, self).__init__(*args, **kwargs)
@@ -66,39 +75,52 @@ class PlazaVeaSpider(scrapy.Spider):
                 return urls
 
     def start_requests(self):
+        if self.vtex_api_mode():
+            self.logger.info("Modo API: recorriendo el catálogo VTEX sin navegador...")
+            for i, url in enumerate(self.start_urls):
+                yield self.vtex_request(url, i)
+            return
         for i, url in enumerate(self.start_urls):
-            unique_url = f"{url}?scrapy_index={i}&ts={int(time.time())}"
-            yield scrapy.Request(
-                unique_url,
-                meta=dict(
-                    playwright=True,
-                    playwright_include_page=True,
-                    playwright_page_methods=[
-                        PageMethod(
-                            "wait_for_selector", plaza_vea.SELECTOR_PRODUCTS_CONTAINER, timeout=30000),
-                        PageMethod(
-                            "evaluate", "window.scrollBy(0, document.body.scrollHeight)")
-                    ],
-                    playwright_page_goto_kwargs={
-                        "wait_until": "domcontentloaded",
-                        "timeout": 20000
-                    },
-                    category_index=i,
-                    original_url=url,
-                    max_retry_times=3   # Permitir hasta 3 reintentos por página
-                ),
-                callback=self.parse_category,
-                dont_filter=True,
-                headers={'X-Category-Index': str(i)},
-                errback=self.handle_error
-            )
-
-    def handle_error(self, failure):
+            yield self.browser_request(url, i)
+
+    def browser_request(self, url, i):
+        unique_url = f"{url}?scrapy_index={i}&ts={int(time.time())}"
+        return scrapy.Request(
+            unique_url,
+            meta=dict(
+                playwright=True,
+                playwright_include_page=True,
+                playwright_page_methods=[
+                    PageMethod(
+                        "wait_for_selector", plaza_vea.SELECTOR_PRODUCTS_CONTAINER, timeout=30000),
+                    PageMethod(
+                        "evaluate", "window.scrollBy(0, document.body.scrollHeight)")
+                ],
+                playwright_page_goto_kwargs={
+                    "wait_until": "domcontentloaded",
+                    "timeout": 20000
+                },
+                category_index=i,
+                original_url=url,
+                max_retry_times=3   # Permitir hasta 3 reintentos por página
+            ),
+            callback=self.parse_category,
+            dont_filter=True,
+            headers={'X-Category-Index': str(i)},
+            errback=self.handle_error
+        )
+
+    async def handle_error(self, failure):
         """Manejar errores de requests incluyendo timeouts"""
         request = failure.request
         category_index = request.meta.get("category_index", "unknown")
         original_url = request.meta.get("original_url", request.url)
 
+        # El reintento pide una página nueva: la de la petición fallida se cierra siempre
+        page: Page = request.meta.pop("playwright_page", None)
+        if page and not page.is_closed():
+            await page.close()
+
         # Obtener información de la URL
         url_parts = original_url.split('/')
         if len(url_parts) >= 2:
@@ -154,8 +176,8 @@ class PlazaVeaSpider(scrapy.Spider):
                 f"Navegando explícitamente a URL original: {original_url}")
             try:
                 await page.goto(original_url, wait_until="domcontentloaded", timeout=30000)
-                # Mayor tiempo de espera después de navegar
-                await page.wait_for_timeout(3000)
+                await wait_for_grid(self, page, plaza_vea.XPATH_PRODUCTS, fixed_ms=3000,
+                                    detail=plaza_vea.XPATH_PRODUCT_PRICE)
             except Exception as e:
                 self.logger.error(f"Error navegando a {original_url}: {e}")
                 return
@@ -175,10 +197,10 @@ class PlazaVeaSpider(scrapy.Spider):
 
             await self.await_products_loaded(page)
 
-            html_content = await page.content()
-            scrapy_selector = scrapy.Selector(text=html_content)
+            products_elements, page_selector = await extract_cards(
+                self, page, plaza_vea.XPATH_PRODUCTS,
+                plaza_vea.CARD_FIELDS, plaza_vea.PAGE_FIELDS)
             products_found = 0
-            products_elements = scrapy_selector.xpath(plaza_vea.XPATH_PRODUCTS)
 
             self.logger.info(
                 f"Elementos de producto encontrados: {len(products_elements)}")
@@ -214,7 +236,8 @@ class PlazaVeaSpider(scrapy.Spider):
                 if len(products_elements) == 0 and consecutive_empty_pages == 1:
                     self.logger.info(
                         "Reintentando página actual una vez más...")
-                    await page.wait_for_timeout(2000)
+                    await wait_for_grid(self, page, plaza_vea.XPATH_PRODUCTS, fixed_ms=2000,
+                                        detail=plaza_vea.XPATH_PRODUCT_PRICE)
                     consecutive_empty_pages = 0
                     continue
             else:
@@ -222,7 +245,7 @@ class PlazaVeaSpider(scrapy.Spider):
                 consecutive_empty_pages = 0
 
             # Verificar si hay siguiente página
-            has_next_page = await self.go_to_next_page(page, scrapy_selector)
+            has_next_page = await self.go_to_next_page(page, page_selector)
 
             if not has_next_page:
                 self.logger.info(
@@ -230,7 +253,6 @@ class PlazaVeaSpider(scrapy.Spider):
                 break
 
             page_number += 1
-            await page.wait_for_timeout(500)
 
         # Resumen final de la categoría
         if page_number > max_pages:
@@ -245,14 +267,14 @@ class PlazaVeaSpider(scrapy.Spider):
         self.logger.info(
             f"Request #{category_index} COMPLETADO: '{categoria} > {subcategoria}' - Lista para siguiente")
 
-        # Cerrar página para liberar recursos antes de pasar a siguiente categoría
+        # Devolver la página al pool para la siguiente categoría (o cerrarla)
         try:
             if not page.is_closed():
-                await page.close()
+                await release_page(self, page)
                 self.logger.debug(
-                    f"Página cerrada correctamente para '{categoria} > {subcategoria}'")
+                    f"Página liberada correctamente para '{categoria} > {subcategoria}'")
         except Exception as e:
-            self.logger.warning(f"Error cerrando página: {e}")
+            self.logger.warning(f"Error liberando página: {e}")
 
     def extract_product_data(self, product_element, categoria, subcategoria):
         try:
@@ -279,8 +301,7 @@ class PlazaVeaSpider(scrapy.Spider):
                 price, name, unit_reference
             )
 
-            item = ScraperItem()
-            item = ScraperItem()
+            item = ProductItem()
             item['name'] = name
             item['price'] = price
             item['unit_price'] = unit_price
@@ -298,42 +319,33 @@ class PlazaVeaSpider(scrapy.Spider):
             self.logger.error(f"Error extrayendo producto: {e}")
             return None
 
+    def vtex_unit_data(self, name, price, measurement):
+        # Modo 'api': la unidad de venta del SKU hace de referencia de unidades
+        return self.calculate_unit_data(price, name, measurement)
+
     def calculate_unit_data(self, price, name, unit_reference):
         try:
-            text_to_analyze = f"{name} {unit_reference}".lower()
-
-            pattern = r'(\d+(?:\.\d+)?)\s*(kg|g|gr|grs|l|litro|litros|ml|mililitro|mililitros|pack|paquete|caja|bandeja|unidad|unidades|un|u|und|unds)\b'
-            matches = re.findall(pattern, text_to_analyze, re.IGNORECASE)
-
-            if matches:
-                quantity_str, unit_str = matches[-1]
-                quantity = float(quantity_str.replace(',', '.'))
-
-                # Normalizar variantes de unidades
-                unit_normalized = {
-                    'g': 'g', 'gr': 'g', 'grs': 'g',
-                    'l': 'l', 'litro': 'l', 'litros': 'l',
-                    'ml': 'ml', 'mililitro': 'ml', 'mililitros': 'ml',
-                    'pack': 'pack', 'paquete': 'pack', 'caja': 'pack',
-                    'bandeja': 'g',
-                    'unidades': 'unidad', 'un': 'unidad', 'u': 'unidad', 'und': 'unidad', 'unds': 'unidad'
-                }.get(unit_str.lower(), unit_str.lower())
-
-                # Calcular según tipo de unidad
-                if unit_normalized in ['g', 'kg', 'l', 'ml']:
-                    if unit_str.lower() == 'bandeja':
-                        return price, quantity, 'g'
-                    else:
-                        return price / quantity, quantity, unit_normalized
-                elif unit_normalized == 'pack':
-                    return price / quantity, quantity, 'pack'
-                elif unit_normalized == 'unidad':
-                    return price / quantity if quantity > 1 else price, quantity if quantity > 1 else 1.0, 'unidad'
+            quantity, unit_str = match_units(f"{name} {unit_reference}", plaza_vea.UNIT_PROFILE)
+
+            # Sin unidad reconocible (un conteo "x 6" tampoco cuenta), 1 unidad
+            if unit_str is None:
+                return price, 1.0, 'unidad'
+
+            # Normalizar variantes de unidades
+            unit_normalized = plaza_vea.UNIT_PROFILE.normalize.get(unit_str, unit_str)
+
+            # Calcular según tipo de unidad
+            if unit_normalized in ['g', 'kg', 'l', 'ml']:
+                if unit_str == 'bandeja':
+                    return price, quantity, 'g'
                 else:
                     return price / quantity, quantity, unit_normalized
-
-            # Si no hay coincidencias, asumir 1 unidad
-            return price, 1.0, 'unidad'
+            elif unit_normalized == 'pack':
+                return price / quantity, quantity, 'pack'
+            elif unit_normalized == 'unidad':
+                return price / quantity if quantity > 1 else price, quantity if quantity > 1 else 1.0, 'unidad'
+            else:
+                return price / quantity, quantity, unit_normalized
 
         except Exception as e:
             self.logger.error(f"Error calculando datos de unidad: {e}")
@@ -370,25 +382,29 @@ class PlazaVeaSpider(scrapy.Spider):
                 self.logger.warning(
                     "Ningún selector de productos funcionó, continuando sin esperar")
 
+            # Carga diferida: la firma previa al scroll cuenta las cards con precio.
+            # Si no hay nada más que cargar no cambia, y el techo es la pausa de antes
+            previous = await grid_signature(page, plaza_vea.XPATH_PRODUCTS, plaza_vea.XPATH_PRODUCT_PRICE)
             await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-            await page.wait_for_timeout(3000)
+            await wait_for_grid(self, page, plaza_vea.XPATH_PRODUCTS, previous, fixed_ms=3000,
+                                timeout=3000, detail=plaza_vea.XPATH_PRODUCT_PRICE)
 
         except Exception as e:
             self.logger.warning(f"Timeout o error esperando productos: {e}")
 
-    async def go_to_next_page(self, page: Page, scrapy_selector):
+    async def go_to_next_page(self, page: Page, page_selector):
         try:
             if page.is_closed():
                 self.logger.error("Página cerrada, no se puede navegar")
                 return False
 
-            pagination_element = scrapy_selector.xpath(
+            pagination_element = page_selector.xpath(
                 plaza_vea.XPATH_PAGINATION).get()
             if not pagination_element:
                 self.logger.info("No se encontró elemento de paginación")
                 return False
 
-            active_page_list = scrapy_selector.xpath(
+            active_page_list = page_selector.xpath(
                 plaza_vea.XPATH_ACTIVE_PAGE).getall()
             if not active_page_list:
                 self.logger.info("No se encontró página activa")
@@ -397,7 +413,7 @@ class PlazaVeaSpider(scrapy.Spider):
             current_page = int(active_page_list[0])
             self.logger.info(f"Página actual: {current_page}")
 
-            all_pages = scrapy_selector.xpath(
+            all_pages = page_selector.xpath(
                 plaza_vea.XPATH_ALL_PAGES).getall()
             all_page_numbers = [int(p) for p in all_pages if p.isdigit()]
             max_page = max(
@@ -424,17 +440,19 @@ class PlazaVeaSpider(scrapy.Spider):
 
             if next_page_element:
                 await next_page_element.scroll_into_view_if_needed()
-                await page.wait_for_timeout(500)
+                previous = await grid_signature(page, plaza_vea.XPATH_PRODUCTS, plaza_vea.XPATH_PRODUCT_PRICE)
 
                 self.logger.info(
                     f"Haciendo clic para navegar a página {next_page_number}")
                 await next_page_element.click()
 
-                await page.wait_for_timeout(1500)
+                # Sustituye las pausas de 500 ms y 1,5 s alrededor del clic
+                await wait_for_grid(self, page, plaza_vea.XPATH_PRODUCTS, previous, fixed_ms=2000,
+                                    detail=plaza_vea.XPATH_PRODUCT_PRICE)
                 await self.await_products_loaded(page)
 
-                new_html = await page.content()
-                new_selector = scrapy.Selector(text=new_html)
+                _, new_selector = await extract_cards(
+                    self, page, None, (), plaza_vea.PAGE_FIELDS)
                 new_active_page = new_selector.xpath(
                     plaza_vea.XPATH_ACTIVE_PAGE).getall()
 
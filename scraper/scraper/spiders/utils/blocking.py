@@ -0,0 +1,63 @@
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+# Tamaño medio por tipo de recurso (bytes) para estimar el ancho de banda
+# ahorrado: una petición abortada no tiene respuesta que medir
+AVERAGE_RESOURCE_BYTES = {
+    'image': 40_000,
+    'media': 500_000,
+    'font': 30_000,
+    'stylesheet': 25_000,
+    'script': 60_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+DEFAULT_RESOURCE_BYTES = 10_000
+
+
+class RequestBlocker:
+    """
+    Decide qué peticiones de Chromium se abortan (por tipo de recurso o por
+    dominio) y lleva la cuenta para las estadísticas. La configura
+    RequestBlockingExtension al abrir la araña con los dominios de su retailer.
+    """
+
+    def __init__(self, resource_types=(), domains=()):
+        self.configure(resource_types, domains)
+
+    def configure(self, resource_types=(), domains=()):
+        self.resource_types = frozenset(resource_types)
+        self.domains = frozenset(domain.lower().lstrip('.') for domain in domains)
+        self.blocked = Counter()
+        self.bytes_saved = 0
+
+    def blocked_domain(self, url):
+        """Dominio de la lista que corresponde al host (o a uno de sus padres)"""
+        host = urlsplit(url).hostname or ''
+        while host:
+            if host in self.domains:
+                return host
+            _, _, host = host.partition('.')
+        return None
+
+    def should_abort(self, request):
+        resource_type = request.resource_type
+        if resource_type in self.resource_types:
+            self.blocked[f'resource_type/{resource_type}'] += 1
+        elif self.domains and self.blocked_domain(request.url):
+            self.blocked['domain'] += 1
+        else:
+            return False
+        self.blocked['requests'] += 1
+        self.bytes_saved += AVERAGE_RESOURCE_BYTES.get(resource_type, DEFAULT_RESOURCE_BYTES)
+        return True
+
+
+# Bloqueador del proceso; sin configurar no aborta nada
+request_blocker = RequestBlocker()
+
+
+def should_abort_request(request):
+    """Predicado para PLAYWRIGHT_ABORT_REQUEST"""
+    return request_blocker.should_abort(request)
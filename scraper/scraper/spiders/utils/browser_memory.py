@@ -0,0 +1,60 @@
+import os
+
+
+# Nombres de proceso de Chromium (navegador, renderers, GPU, zygote) en /proc/<pid>/comm
+BROWSER_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+
+
+def _children_map():
+    """ppid -> [pid] de todos los procesos visibles en /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # El nombre va entre paréntesis y puede tener espacios: los campos siguen al último ')'
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _process_name(pid):
+    try:
+        with open(f'/proc/{pid}/comm') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def browser_rss_mb(root_pid=None):
+    """
+    RSS total (MB) y número de procesos de Chromium que descienden de
+    `root_pid` (este proceso por defecto, vía el driver de Playwright). Suma
+    el RSS de cada proceso, así que cuenta dos veces la memoria compartida
+    entre renderers: el umbral queda del lado conservador.
+    None si no hay /proc (fuera de Linux).
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    children = _children_map()
+    pending = [root_pid or os.getpid()]
+    total, processes = 0, 0
+    while pending:
+        for pid in children.get(pending.pop(), ()):
+            pending.append(pid)
+            if _process_name(pid).startswith(BROWSER_PROCESS_NAMES):
+                total += _rss_bytes(pid)
+                processes += 1
+    return total / (1024 * 1024), processes
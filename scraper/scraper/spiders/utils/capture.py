@@ -0,0 +1,116 @@
+import asyncio
+import re
+
+
+def lookup(data, path):
+    """Valor en `path` ('prices.price-sale-co', 'rows.0.name'); '' es la raíz"""
+    for key in path.split('.') if path else ():
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and key.isdigit() and int(key) < len(data):
+            data = data[int(key)]
+        else:
+            return None
+    return data
+
+
+def first_value(data, paths):
+    for path in paths:
+        value = lookup(data, path)
+        if value not in (None, '', [], {}):
+            return value
+    return None
+
+
+def extract_rows(body, products_paths, fields):
+    """
+    Filas {campo: valor} de la primera ruta de `products_paths` que sea una
+    lista; se omiten los productos sin nombre. None si no hay lista
+    """
+    for path in products_paths:
+        products = lookup(body, path)
+        if isinstance(products, list):
+            break
+    else:
+        return None
+    rows = ({field: first_value(product, paths) for field, paths in fields.items()}
+            for product in products if isinstance(product, dict))
+    return [row for row in rows if row.get('name')]
+
+
+class ResponseCapture:
+    """
+    Guarda los productos que llegan en las respuestas XHR/fetch del sitio
+    mientras Playwright renderiza la página, para no depender del DOM.
+    Se registra antes del goto con playwright_page_event_handlers
+    ({"response": capture.on_response}); cada retailer declara en sus
+    constantes el patrón de URL, las rutas candidatas a la lista de productos
+    y, por campo, las rutas candidatas dentro de cada producto.
+    """
+
+    def __init__(self, spider, pattern, products_paths, fields):
+        self.spider = spider
+        self.pattern = re.compile(pattern)
+        self.products_paths = products_paths
+        self.fields = fields
+        self.rows = []
+        self.seen = set()
+        self.pending = set()
+        self.arrived = asyncio.Event()
+
+    @classmethod
+    def for_retailer(cls, spider, constants):
+        """Captura con XHR_PRODUCTS_PATTERN/PATHS/FIELDS del módulo de constantes, o None"""
+        if not spider.settings.getbool('XHR_CAPTURE_ENABLED', False):
+            return None
+        return cls(spider, constants.XHR_PRODUCTS_PATTERN,
+                   constants.XHR_PRODUCTS_PATHS, constants.XHR_PRODUCT_FIELDS)
+
+    def on_response(self, response):
+        if response.request.resource_type not in ('xhr', 'fetch') or not self.pattern.search(response.url):
+            return
+        # page.on no espera a los handlers: se guarda la tarea para drain()
+        task = asyncio.ensure_future(self._read(response))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _read(self, response):
+        stats = self.spider.crawler.stats
+        try:
+            body = await response.json()
+        except Exception as e:
+            stats.inc_value('capture/errors')
+            self.spider.logger.debug(f"Respuesta no JSON en {response.url}: {e}")
+            return
+        rows = extract_rows(body, self.products_paths, self.fields)
+        if rows is None:
+            stats.inc_value('capture/errors')
+            return
+
+        stats.inc_value('capture/responses')
+        for row in rows:
+            key = tuple(map(str, row.values()))
+            if key in self.seen:
+                stats.inc_value('capture/duplicates_skipped')
+                continue
+            self.seen.add(key)
+            self.rows.append(row)
+        if self.rows:
+            self.arrived.set()
+
+    async def drain(self, wait=0):
+        """
+        Productos capturados desde la última llamada. Si todavía no hay ninguno
+        espera hasta `wait` segundos a que llegue la primera respuesta.
+        """
+        if not self.rows and wait:
+            try:
+                await asyncio.wait_for(self.arrived.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        if self.pending:
+            await asyncio.wait(list(self.pending), timeout=5)
+        rows, self.rows = self.rows, []
+        self.arrived.clear()
+        self.spider.crawler.stats.inc_value('capture/products', len(rows))
+        return rows
@@ -0,0 +1,170 @@
+import scrapy
+
+
+# Recorre las cards en el navegador y devuelve solo los campos declarados.
+# Cada consulta puede ser XPath (empieza por '/', './' o '(') o CSS, con
+# '::text' para los nodos de texto directos, igual que en scrapy.Selector.
+# Con newOnly las cards ya devueltas se marcan con SEEN_ATTRIBUTE y se omiten
+# en las siguientes llamadas (listas con "cargar más" o scroll infinito).
+# Resultado: {"cards": [[valores de cada campo], ...], "page": [valores, ...]}
+SEEN_ATTRIBUTE = "data-scrapy-seen"
+
+# Identificador estable de la card para la extracción incremental: su propio
+# href o el del primer enlace que contiene (la ficha del producto)
+CARD_ID_QUERY = "(./@href | .//a/@href)[1]"
+
+CARD_EXTRACTION_JS = """
+({cards, fields, page, newOnly, seenAttribute}) => {
+    const isXPath = (query) => /^(\\.?\\/|\\()/.test(query);
+    const serialize = (node) => {
+        if (node.nodeType === Node.ELEMENT_NODE) return node.outerHTML;
+        return node.nodeValue !== null ? node.nodeValue : node.textContent;
+    };
+    const select = (query, context) => {
+        if (isXPath(query)) {
+            const snapshot = document.evaluate(
+                query, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            const nodes = [];
+            for (let i = 0; i < snapshot.snapshotLength; i++) nodes.push(snapshot.snapshotItem(i));
+            return nodes;
+        }
+        if (query.endsWith('::text')) {
+            const elements = context.querySelectorAll(query.slice(0, -'::text'.length));
+            return Array.from(elements).flatMap(
+                (el) => Array.from(el.childNodes).filter((n) => n.nodeType === Node.TEXT_NODE));
+        }
+        return Array.from(context.querySelectorAll(query));
+    };
+    const values = (queries, context) => queries.map((query) => select(query, context).map(serialize));
+    let cardNodes = cards ? select(cards, document) : [];
+    if (newOnly) {
+        cardNodes = cardNodes.filter((card) => !card.hasAttribute(seenAttribute));
+        cardNodes.forEach((card) => card.setAttribute(seenAttribute, ""));
+    }
+    return {
+        cards: cardNodes.map((card) => values(fields, card)),
+        page: values(page, document),
+    };
+}
+"""
+
+
+def is_xpath(query):
+    return query.startswith(('/', './', '('))
+
+
+def _check_card_queries(card_queries):
+    """Los campos se leen dentro de cada card: un XPath absoluto leería todo el documento"""
+    for query in card_queries:
+        if is_xpath(query) and query.lstrip('(').startswith('/'):
+            raise ValueError(f"La consulta de la card debe ser relativa (.//): {query}")
+
+
+class JsonValues(list):
+    """Lista de valores con la interfaz get()/getall() de SelectorList"""
+
+    def get(self, default=None):
+        return self[0] if self else default
+
+    def getall(self):
+        return list(self)
+
+
+class JsonSelector:
+    """
+    Card (o página) devuelta por CARD_EXTRACTION_JS. Responde a xpath()/css()
+    con las mismas consultas declaradas en las constantes de cada retailer,
+    así take_products_fields funciona igual con HTML o con JSON.
+    """
+
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def xpath(self, query):
+        try:
+            return self.values[query]
+        except KeyError:
+            raise KeyError(f"Consulta no declarada para la extracción JSON: {query}")
+
+    css = xpath
+
+    def __repr__(self):
+        return f"JsonSelector({dict(self.values)!r})"
+
+
+def _new_cards(cards, card_queries, seen, card_id, card_key=None):
+    """
+    Filtrar las cards ya emitidas. La clave es el identificador de la card
+    (`card_id`, pasado por `card_key` si se da); solo las cards sin él usan sus
+    valores declarados, y así dos productos distintos con el mismo nombre y
+    precio no se pierden.
+    """
+    new_cards = []
+    for card in cards:
+        key = card.xpath(card_id).get() if is_xpath(card_id) else card.css(card_id).get()
+        if key and card_key is not None:
+            key = card_key(key)
+        if not key:
+            key = tuple(tuple(card.xpath(query).getall()) if is_xpath(query)
+                        else tuple(card.css(query).getall()) for query in card_queries)
+        if key not in seen:
+            seen.add(key)
+            new_cards.append(card)
+    return new_cards
+
+
+async def extract_cards(spider, page, cards_query, card_queries, page_queries=(), seen=None,
+                        card_id=CARD_ID_QUERY, card_key=None):
+    """
+    Extraer las cards de la página. Con EXTRACTION_MODE = 'json' (por defecto)
+    un solo page.evaluate devuelve únicamente los campos declarados; con 'html'
+    se serializa todo el DOM con page.content() y se parsea con scrapy.Selector.
+    Los campos de la card deben ser relativos a ella en ambos modos.
+    Con un set en `seen` la extracción es incremental: solo se devuelven las
+    cards cuyo `card_id` no se había emitido antes en esa misma página.
+    `card_key` normaliza ese identificador cuando `seen` se comparte con otra
+    fuente de productos (p. ej. el id de producto dentro del href).
+    Devuelve (cards, page_selector).
+    """
+    _check_card_queries(card_queries)
+    stats = spider.crawler.stats
+    if spider.settings.get('EXTRACTION_MODE', 'json') == 'html':
+        selector = scrapy.Selector(text=await page.content())
+        if not cards_query:
+            cards = []
+        else:
+            cards = selector.xpath(cards_query) if is_xpath(cards_query) else selector.css(cards_query)
+        if seen is not None:
+            before = len(cards)
+            cards = _new_cards(cards, card_queries, seen, card_id, card_key)
+            stats.inc_value('extraction/duplicates_skipped', before - len(cards))
+        stats.inc_value('extraction/html_pages')
+        stats.inc_value('extraction/cards', len(cards))
+        return cards, selector
+
+    fields = list(card_queries)
+    if seen is not None and card_id not in fields:
+        fields.append(card_id)
+    result = await page.evaluate(CARD_EXTRACTION_JS, {
+        "cards": cards_query,
+        "fields": fields,
+        "page": list(page_queries),
+        "newOnly": seen is not None,
+        "seenAttribute": SEEN_ATTRIBUTE,
+    })
+    cards = [
+        JsonSelector({query: JsonValues(values) for query, values in zip(fields, row)})
+        for row in result["cards"]
+    ]
+    if seen is not None:
+        # Por si el sitio vuelve a renderizar cards ya emitidas (nodos nuevos)
+        before = len(cards)
+        cards = _new_cards(cards, card_queries, seen, card_id, card_key)
+        stats.inc_value('extraction/duplicates_skipped', before - len(cards))
+    page_selector = JsonSelector(
+        {query: JsonValues(values) for query, values in zip(page_queries, result["page"])})
+    stats.inc_value('extraction/json_pages')
+    stats.inc_value('extraction/cards', len(cards))
+    return cards, page_selector
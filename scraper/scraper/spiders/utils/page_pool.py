@@ -0,0 +1,126 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+
+
+# Limpia el estado de la categoría anterior antes de volver al pool. localStorage
+# solo con PAGE_POOL_CLEAR_STORAGE: guarda la ciudad/edad elegidas (storage_state.py)
+RESET_STORAGE_JS = """
+(clearLocal) => {
+    try { sessionStorage.clear(); } catch (e) {}
+    if (clearLocal) { try { localStorage.clear(); } catch (e) {} }
+}
+"""
+
+
+class PagePool:
+    """
+    Pool acotado de páginas de Playwright por contexto. PagePoolMiddleware
+    reserva un hueco antes de cada petición con playwright_include_page y, si
+    hay una página libre de una categoría anterior, la pasa en
+    meta["playwright_page"] para que scrapy-playwright navegue con ella en vez
+    de abrir otra. La araña la devuelve con release_page(spider, page), que la
+    limpia (sessionStorage, listeners, about:blank) y la deja libre.
+    """
+
+    def __init__(self, stats, size, max_uses=50, clear_storage=False):
+        self.stats = stats
+        self.size = size
+        self.max_uses = max_uses
+        self.clear_storage = clear_storage
+        self.slots = defaultdict(lambda: asyncio.Semaphore(self.size))
+        self.idle = defaultdict(deque)
+        # Página prestada -> contexto, listeners de la petición, creación y usos
+        self.leased = {}
+        self.created = {}
+        self.uses = defaultdict(int)
+
+    async def lease(self, context_name):
+        """Esperar un hueco del contexto y devolver una página libre, o None para crear una"""
+        start = time.monotonic()
+        await self.slots[context_name].acquire()
+        waited_ms = int((time.monotonic() - start) * 1000)
+        self.stats.inc_value('page_pool/leases')
+        self.stats.inc_value('page_pool/lease_wait_ms', waited_ms)
+        self.stats.max_value('page_pool/lease_wait_max_ms', waited_ms)
+
+        idle = self.idle[context_name]
+        while idle:
+            page = idle.popleft()
+            if not page.is_closed():
+                self.stats.inc_value('page_pool/hits')
+                return page
+        self.stats.inc_value('page_pool/misses')
+        return None
+
+    def track(self, page, context_name, handlers=None):
+        """Asociar al hueco reservado la página con la que se hizo la petición"""
+        if page in self.leased:
+            return
+        if page not in self.created:
+            self.created[page] = time.monotonic()
+            page.on("close", lambda _: self._closed(page))
+        self.leased[page] = (context_name, handlers or {})
+        self.uses[page] += 1
+
+    def abandon(self, context_name):
+        """La petición falló antes de tener página: se libera el hueco"""
+        self.slots[context_name].release()
+
+    async def release(self, page):
+        """Devolver la página al pool o cerrarla si no es del pool o ya se usó max_uses veces"""
+        if page not in self.leased:
+            if not page.is_closed():
+                await page.close()
+            return
+        context_name, handlers = self.leased.pop(page)
+        try:
+            if page.is_closed():
+                return
+            if self.uses[page] >= self.max_uses:
+                await page.close()
+                return
+            for event, handler in handlers.items():
+                if callable(handler):
+                    page.remove_listener(event, handler)
+            await page.evaluate(RESET_STORAGE_JS, self.clear_storage)
+            await page.goto("about:blank")
+            self.idle[context_name].append(page)
+            self.stats.inc_value('page_pool/released')
+        except Exception:
+            self.stats.inc_value('page_pool/reset_errors')
+            if not page.is_closed():
+                await page.close()
+        finally:
+            self.slots[context_name].release()
+
+    def _closed(self, page):
+        lifetime_ms = int((time.monotonic() - self.created.pop(page, time.monotonic())) * 1000)
+        self.stats.inc_value('page_pool/pages_closed')
+        self.stats.inc_value('page_pool/page_lifetime_ms', lifetime_ms)
+        self.stats.max_value('page_pool/page_lifetime_max_ms', lifetime_ms)
+        self.stats.max_value('page_pool/page_uses_max', self.uses.pop(page, 0))
+        # Cerrada mientras estaba prestada (error, cierre desde la araña): libera su hueco
+        leased = self.leased.pop(page, None)
+        if leased is not None:
+            self.slots[leased[0]].release()
+
+    async def close(self):
+        """Cerrar las páginas libres al terminar la araña"""
+        for idle in self.idle.values():
+            while idle:
+                page = idle.popleft()
+                if not page.is_closed():
+                    await page.close()
+
+
+async def release_page(spider, page):
+    """Devolver la página al pool de la araña, o cerrarla si no hay pool"""
+    tracker = getattr(spider, 'page_tracker', None)
+    if tracker is not None:
+        tracker.released(page)
+    pool = getattr(spider, 'page_pool', None)
+    if pool is None:
+        await page.close()
+        return
+    await pool.release(page)
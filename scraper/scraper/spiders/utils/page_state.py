@@ -0,0 +1,90 @@
+import re
+
+# Estado de la página de Next.js (Falabella): los resultados del listado vienen
+# enteros en el JSON con el que se hidrata la página. Tras una navegación en el
+# cliente (botón "siguiente") el <script id="__NEXT_DATA__"> queda con la primera
+# página, así que primero se leen las props de la ruta actual del router.
+# Solo se devuelven los campos que se usan para no serializar el blob completo
+PAGE_STATE_JS = """
+(path) => {
+    const lookup = (data, keys) => keys.reduce(
+        (value, key) => (value === null || value === undefined ? value : value[key]), data);
+    let state = null;
+    const router = window.next && window.next.router;
+    const current = router && router.components && router.components[router.route];
+    if (current && current.props) state = {props: current.props};
+    if (!state || !Array.isArray(lookup(state, path))) {
+        const script = document.getElementById('__NEXT_DATA__');
+        if (!script) return null;
+        try {
+            state = JSON.parse(script.textContent);
+        } catch (e) {
+            return null;
+        }
+    }
+    const results = lookup(state, path);
+    if (!Array.isArray(results)) return null;
+    return results.map((product) => ({
+        id: product.productId || product.url || product.skuId || product.displayName,
+        name: product.displayName,
+        prices: (product.prices || []).map((price) => ({type: price.type, price: price.price})),
+    }));
+}
+"""
+
+# Id de producto en la URL de la ficha: /falabella-cl/product/17155467/Nombre/17155468
+PRODUCT_URL_ID = re.compile(r"/product/([^/?#]+)")
+
+
+def product_id(value):
+    """
+    Id de producto a partir de la URL de la ficha (el href de la card) o del
+    id del estado. Estado y cards comparten así un mismo set de emitidos
+    """
+    match = PRODUCT_URL_ID.search(value)
+    return match.group(1) if match else value
+
+
+async def page_state_products(spider, page, path, seen):
+    """
+    Productos del JSON de estado de la página en un único evaluate, o None si
+    no está o si todos sus productos ya se emitieron (estado de una página
+    anterior): en ese caso la araña vuelve a leer las cards con XPath.
+    `seen` guarda ids de product_id(), los mismos que usan las cards.
+    """
+    stats = spider.crawler.stats
+    try:
+        products = await page.evaluate(PAGE_STATE_JS, path.split('.'))
+    except Exception as e:
+        spider.logger.warning(f"No se pudo leer el estado de la página: {e}")
+        products = None
+    if not products:
+        stats.inc_value('page_state/missing')
+        return None
+
+    for product in products:
+        product['id'] = product_id(str(product['id']))
+    new = [product for product in products if product['id'] not in seen]
+    if not new:
+        stats.inc_value('page_state/stale')
+        return None
+    seen.update(product['id'] for product in new)
+    stats.inc_value('page_state/pages')
+    stats.inc_value('page_state/products', len(new))
+    return new
+
+
+def state_price(product, price_types):
+    """
+    Precio según el primer tipo de `price_types` presente. Los precios llegan
+    como lista de textos ('1.299.990'); en los rangos se usa el último valor
+    """
+    prices = {price.get('type'): price.get('price') for price in product.get('prices') or ()}
+    for price_type in price_types:
+        value = prices.get(price_type)
+        if isinstance(value, list):
+            value = value[-1] if value else None
+        if value:
+            return float(str(value).split("-")[-1].replace('$', '').replace('.', '').strip())
+    return None
+
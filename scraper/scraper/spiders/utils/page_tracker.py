@@ -0,0 +1,67 @@
+class PageTracker:
+    """
+    Registro de las páginas de Playwright entregadas a las arañas.
+    PageLeakDownloaderMiddleware registra cada página que llega con una
+    respuesta y cierra la de una petición fallida; PageLeakSpiderMiddleware
+    cierra la que el callback no devolvió con release_page() ni cerró al
+    terminar. Las páginas abiertas y las fugas quedan en las stats pages/*.
+    La araña lo tiene en spider.page_tracker.
+    """
+
+    def __init__(self, stats, logger):
+        self.stats = stats
+        self.logger = logger
+        # Página abierta -> url de la última petición que la usó
+        self.pages = {}
+        # Páginas que tiene ahora un callback
+        self.in_use = set()
+
+    def register(self, page, url):
+        """La página llega a la araña con la respuesta de `url`"""
+        if page.is_closed():
+            return
+        if page not in self.pages:
+            page.on("close", lambda _: self._closed(page))
+            self.stats.inc_value('pages/opened')
+        self.pages[page] = url
+        self._update_open()
+        self.in_use.add(page)
+
+    def released(self, page):
+        """La araña devolvió la página (release_page)"""
+        self.in_use.discard(page)
+
+    def _closed(self, page):
+        self.in_use.discard(page)
+        if self.pages.pop(page, None) is not None:
+            self.stats.inc_value('pages/closed')
+            self._update_open()
+
+    def _update_open(self):
+        self.stats.set_value('pages/open', len(self.pages))
+        self.stats.max_value('pages/open_max', len(self.pages))
+
+    async def settle(self, page, callback_name):
+        """El callback terminó: si la página sigue en su poder es una fuga y se cierra"""
+        if page not in self.in_use or page.is_closed():
+            self.in_use.discard(page)
+            return
+        url = self.pages.get(page, page.url)
+        self.stats.inc_value('pages/leaked')
+        self.logger.warning(f"Página sin cerrar al terminar {callback_name} ({url}), se cierra")
+        await self.close(page)
+
+    async def close(self, page):
+        self.in_use.discard(page)
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception as e:
+            self.logger.warning(f"No se pudo cerrar la página: {e}")
+
+    def report(self):
+        """Páginas que siguen abiertas al cerrar la araña (las libres del pool aparte)"""
+        leaked = [url for page, url in self.pages.items() if page in self.in_use]
+        if leaked:
+            self.stats.set_value('pages/open_at_close', len(leaked))
+            self.logger.warning(f"{len(leaked)} páginas seguían en uso al cerrar la araña: {leaked[:5]}")
@@ -0,0 +1,88 @@
+# Scroll completo dentro del navegador: baja pantalla a pantalla hasta el final
+# (para que el lazy render vea todas las cards), espera a que crezca la altura
+# del contenedor o el número de cards y repite hasta que un paso no cambia nada.
+# Cada paso espera como máximo stepMs; si hay cambios, solo quietMs tras el último.
+# Las consultas XPath (empiezan por '/', './' o '(') o CSS, igual que en extract.py
+SCROLL_UNTIL_STABLE_JS = """
+async ({container, cards, stepMs, quietMs, maxIterations}) => {
+    const isXPath = (query) => /^(\\.?\\/|\\()/.test(query);
+    const countCards = () => {
+        if (!cards) return 0;
+        if (!isXPath(cards)) return document.querySelectorAll(cards).length;
+        return document.evaluate(
+            `count(${cards})`, document, null, XPathResult.NUMBER_TYPE, null).numberValue;
+    };
+    const height = () => {
+        const element = container && document.querySelector(container);
+        return element ? element.scrollHeight : document.documentElement.scrollHeight;
+    };
+    const snapshot = () => `${height()}|${countCards()}`;
+    const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+    const waitForGrowth = (before) => new Promise((resolve) => {
+        let quietTimer = null;
+        let ceilingTimer = null;
+        const done = () => {
+            observer.disconnect();
+            clearTimeout(quietTimer);
+            clearTimeout(ceilingTimer);
+            resolve();
+        };
+        const changed = () => {
+            if (snapshot() === before) return;
+            clearTimeout(quietTimer);
+            quietTimer = setTimeout(done, quietMs);
+        };
+        const observer = new MutationObserver(changed);
+        observer.observe(document.body, {childList: true, subtree: true});
+        ceilingTimer = setTimeout(done, stepMs);
+        changed();
+    });
+
+    const start = performance.now();
+    let iterations = 0;
+    let before = snapshot();
+    while (iterations < maxIterations) {
+        iterations++;
+        const bottom = document.documentElement.scrollHeight;
+        for (let y = window.scrollY + window.innerHeight; y < bottom; y += window.innerHeight) {
+            window.scrollTo(0, y);
+            await sleep(50);
+        }
+        window.scrollTo(0, bottom);
+        await waitForGrowth(before);
+        const after = snapshot();
+        if (after === before) break;
+        before = after;
+    }
+    return {count: countCards(), iterations, elapsed: performance.now() - start};
+}
+"""
+
+
+async def scroll_until_stable(spider, page, container=None, cards_query=None, step_ms=3000, max_iterations=50):
+    """
+    Hacer scroll hasta que la página deje de crecer con un único evaluate, en
+    lugar de un bucle en Python con wait_for_selector, dos evaluate y una
+    pausa fija por vuelta. `step_ms` es la espera máxima de cada paso.
+    Devuelve (número de cards, iteraciones).
+    """
+    stats = spider.crawler.stats
+    try:
+        result = await page.evaluate(SCROLL_UNTIL_STABLE_JS, {
+            "container": container,
+            "cards": cards_query,
+            "stepMs": step_ms,
+            "quietMs": spider.settings.getint('GRID_WAIT_QUIET', 300),
+            "maxIterations": max_iterations,
+        })
+    except Exception as e:
+        spider.logger.warning(f"Error durante el scroll: {e}")
+        stats.inc_value('scroll/errors')
+        return 0, 0
+
+    stats.inc_value('scroll/calls')
+    stats.inc_value('scroll/iterations', result["iterations"])
+    stats.inc_value('scroll/elapsed_ms', int(result["elapsed"]))
+    spider.logger.info(
+        f"Scroll finalizado tras {result['iterations']} iteraciones: {result['count']} cards")
+    return result["count"], result["iterations"]
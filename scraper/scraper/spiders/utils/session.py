@@ -0,0 +1,235 @@
+import json
+from urllib.parse import urlencode, urlsplit
+
+import scrapy
+
+from scraper.spiders.utils.capture import extract_rows, first_value
+from scraper.spiders.utils.page_pool import release_page
+from scraper.spiders.utils.storage_state import save_storage_state
+
+
+# Slot de descarga propio para las peticiones HTTP con la sesión del navegador
+SESSION_SLOT = "browser-session"
+
+# Respuestas que indican que la sesión caducó (cookies vencidas o rechazadas)
+EXPIRED_STATUS = (401, 403, 419, 440)
+
+
+def cookie_header(cookies, url):
+    """Cabecera Cookie con las cookies de Playwright que corresponden al host de `url`"""
+    host = urlsplit(url).hostname or ''
+    pairs = []
+    for cookie in cookies:
+        domain = cookie.get('domain', '')
+        if domain.startswith('.'):
+            matches = host == domain[1:] or host.endswith(domain)
+        else:
+            matches = host == domain
+        if matches:
+            pairs.append(f"{cookie['name']}={cookie['value']}")
+    return "; ".join(pairs)
+
+
+class BrowserSessionMixin:
+    """
+    Modo 'hybrid': Playwright solo supera las ventanas de entrada del sitio
+    (ciudad, ubicación, avisos) y se exportan sus cookies y cabeceras; los
+    listados se piden a la API JSON con peticiones HTTP normales. Si la API
+    responde que la sesión caducó se vuelve a abrir el navegador una vez y se
+    reintentan las peticiones pendientes con la sesión nueva.
+    La araña define session_api_url, session_constants (módulo con
+    XHR_PRODUCTS_PATHS, XHR_PRODUCT_FIELDS, API_TOTAL_PATHS y API_PAGE_SIZE),
+    pass_session_gates(page, meta), take_captured_fields(row, category, sub_category)
+    y browser_request(url, category, sub_category) como respaldo.
+    """
+
+    session_api_url = None
+    session_constants = None
+    # Cookies, User-Agent y origen exportados; cada renovación sube la generación
+    session = None
+    session_generation = 0
+    # Peticiones que esperan a que termine una renovación en curso
+    session_waiting = None
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        if settings.get('SESSION_CRAWL_MODE', 'browser') != 'hybrid':
+            return
+        concurrency = settings.getint('SESSION_API_CONCURRENCY', 8)
+        slots = dict(settings.getdict('DOWNLOAD_SLOTS'))
+        slots.setdefault(SESSION_SLOT, {"concurrency": concurrency, "delay": 0})
+        settings.set('DOWNLOAD_SLOTS', slots, priority='spider')
+
+    def hybrid_mode(self):
+        """Modo 'hybrid' con una sesión ya exportada"""
+        return self.settings.get('SESSION_CRAWL_MODE', 'browser') == 'hybrid' and self.session is not None
+
+    async def harvest_session(self, page):
+        """Exportar cookies y User-Agent de la página que ya pasó las ventanas de entrada"""
+        self.session = {
+            "cookies": await page.context.cookies(),
+            "user_agent": await page.evaluate("navigator.userAgent"),
+            "origin": "{0.scheme}://{0.netloc}".format(urlsplit(page.url)),
+        }
+        self.session_generation += 1
+        self.crawler.stats.inc_value('session/bootstraps')
+        self.crawler.stats.set_value('session/cookies', len(self.session["cookies"]))
+        self.logger.info(
+            f"Sesión del navegador exportada ({len(self.session['cookies'])} cookies), "
+            f"los listados siguen por HTTP")
+
+    def listing_request(self, url, category, sub_category, offset=0):
+        """Página de la API de productos para la categoría de `url` a partir de `offset`"""
+        limit = self.session_constants.API_PAGE_SIZE
+        category_id = urlsplit(url).path.strip('/').split('/')[-1]
+        query = urlencode({"limit": limit, "offset": offset, "refine[]": f"cgid={category_id}"})
+        api_url = f"{self.session_api_url}?{query}"
+        return scrapy.Request(
+            api_url,
+            headers=self._session_headers(api_url),
+            meta={
+                "session_generation": self.session_generation,
+                "download_slot": SESSION_SLOT,
+                "autothrottle_dont_adjust_delay": True,
+                "allow_offsite": True,
+                "dont_merge_cookies": True,
+                "handle_httpstatus_list": list(EXPIRED_STATUS),
+                "listing": {"url": url, "category": category, "sub_category": sub_category,
+                            "offset": offset, "limit": limit},
+            },
+            callback=self.parse_listing,
+            errback=self.listing_errback,
+            dont_filter=True,
+        )
+
+    def _session_headers(self, url):
+        session = self.session
+        return {
+            "Accept": "application/json",
+            "User-Agent": session["user_agent"],
+            "Origin": session["origin"],
+            "Referer": session["origin"] + "/",
+            "Cookie": cookie_header(session["cookies"], url),
+        }
+
+    def _retry_listing(self, listing):
+        return self.listing_request(
+            listing["url"], listing["category"], listing["sub_category"], listing["offset"])
+
+    def parse_listing(self, response):
+        stats = self.crawler.stats
+        listing = response.meta["listing"]
+        if response.status in EXPIRED_STATUS:
+            yield from self._session_expired(response, f"HTTP {response.status}")
+            return
+        try:
+            body = json.loads(response.text)
+        except ValueError:
+            # Algunas APIs devuelven la página de login en lugar de un error
+            yield from self._session_expired(response, "respuesta no JSON")
+            return
+
+        constants = self.session_constants
+        rows = extract_rows(body, constants.XHR_PRODUCTS_PATHS, constants.XHR_PRODUCT_FIELDS)
+        if rows is None:
+            yield from self._session_fallback(listing, f"respuesta sin productos en {response.url}")
+            return
+
+        offset, limit = listing["offset"], listing["limit"]
+        total = first_value(body, constants.API_TOTAL_PATHS)
+        if offset == 0:
+            self.logger.info(f"API de productos: {total} productos en {listing['url']}")
+            # Con el total conocido todas las páginas salen a la vez; sin él, de una en una
+            if isinstance(total, int):
+                for next_offset in range(limit, total, limit):
+                    yield self.listing_request(
+                        listing["url"], listing["category"], listing["sub_category"], next_offset)
+        if not isinstance(total, int) and len(rows) == limit:
+            yield self.listing_request(
+                listing["url"], listing["category"], listing["sub_category"], offset + limit)
+
+        stats.inc_value('session/pages')
+        for row in rows:
+            stats.inc_value('session/products')
+            yield self.take_captured_fields(row, listing["category"], listing["sub_category"])
+
+    def listing_errback(self, failure):
+        return list(self._session_fallback(failure.request.meta["listing"], f"{failure.value!r}"))
+
+    def _session_expired(self, response, reason):
+        self.crawler.stats.inc_value('session/expired')
+        listing = response.meta["listing"]
+        if response.meta["session_generation"] < self.session_generation:
+            # Otra petición ya renovó la sesión mientras esta estaba en vuelo
+            yield self._retry_listing(listing)
+            return
+
+        if self.session_waiting is not None:
+            self.session_waiting.append(listing)
+            return
+        if self.session_generation - 1 >= self.settings.getint('SESSION_MAX_RENEWALS', 3):
+            yield from self._session_fallback(listing, f"sesión caducada ({reason})")
+            return
+
+        self.logger.warning(f"Sesión caducada ({reason}), se vuelve a abrir el navegador")
+        self.session_waiting = [listing]
+        yield scrapy.Request(
+            self.session["origin"] + "/",
+            # Contexto nuevo y sin el estado guardado: sus cookies son las que caducaron,
+            # y las ventanas de entrada se esperan con su timeout completo
+            meta=dict(playwright=True, playwright_include_page=True,
+                      session_renewal=True,
+                      playwright_context=f"{self.name}-session-{self.session_generation + 1}",
+                      playwright_page_goto_kwargs={
+                          "wait_until": "domcontentloaded",
+                          "timeout": 60000
+                      }),
+            callback=self.renew_session,
+            errback=self.renew_session_failed,
+            dont_filter=True,
+            priority=100,
+        )
+
+    async def renew_session(self, response):
+        page = response.meta["playwright_page"]
+        error = None
+        try:
+            await self.pass_session_gates(page, response.meta)
+            # El estado guardado es el de la sesión caducada: se reemplaza por el nuevo
+            await save_storage_state(self, page, refresh=True)
+            await self.harvest_session(page)
+        except Exception as e:
+            error = e
+        finally:
+            context = page.context
+            await release_page(self, page)
+            await context.close()
+        for request in self._release_waiting(error):
+            yield request
+
+    async def renew_session_failed(self, failure):
+        page = failure.request.meta.get("playwright_page")
+        if page:
+            await page.context.close()
+        for request in self._release_waiting(failure.value):
+            yield request
+
+    def _release_waiting(self, error=None):
+        """Reintentar con la sesión nueva lo que esperaba la renovación, o el navegador si falló"""
+        waiting, self.session_waiting = self.session_waiting, None
+        for listing in waiting:
+            if error is None:
+                yield self._retry_listing(listing)
+            else:
+                yield from self._session_fallback(listing, f"no se pudo renovar la sesión: {error!r}")
+
+    def _session_fallback(self, listing, reason):
+        if listing["offset"]:
+            # Una página intermedia: el resto de la categoría ya salió por la API
+            self.crawler.stats.inc_value('session/page_errors')
+            self.logger.error(f"Error en el offset {listing['offset']} de la API para {listing['url']}: {reason}")
+            return
+        self.crawler.stats.inc_value('session/fallbacks')
+        self.logger.warning(f"API no disponible para {listing['url']} ({reason}); se usa el navegador")
+        yield self.browser_request(listing["url"], listing["category"], listing["sub_category"])
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+from pathlib import Path
+
+
+class StorageStateManager:
+    """
+    Estado del navegador (cookies y localStorage) guardado tras superar por
+    primera vez las ventanas de entrada (ciudad, ubicación, avisos, edad).
+    Se persiste en STORAGE_STATE_DIR/<araña>.json y vale STORAGE_STATE_TTL
+    segundos; StorageStateMiddleware lo inyecta en un contexto propio para
+    que las páginas nuevas empiecen con las ventanas ya cerradas.
+    """
+
+    def __init__(self, spider):
+        settings = spider.settings
+        self.spider = spider
+        self.ttl = settings.getint('STORAGE_STATE_TTL', 6 * 3600)
+        self.path = Path(settings.get('STORAGE_STATE_DIR', '.storage_state')) / f"{spider.name}.json"
+        self.context_name = f"{spider.name}-storage-state"
+        self.state = None
+        self.saved_at = 0
+        self.saved = False
+        self._load()
+
+    def _load(self):
+        stats = self.spider.crawler.stats
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.spider.logger.warning(f"Estado del navegador ilegible en {self.path}: {e}")
+            return
+        if time.time() - data.get('saved_at', 0) > self.ttl:
+            stats.inc_value('storage_state/expired')
+            self.spider.logger.info(f"Estado del navegador caducado en {self.path}, se descarta")
+            return
+        self.state, self.saved_at = data['state'], data['saved_at']
+        stats.inc_value('storage_state/loaded')
+        self.spider.logger.info(f"Estado del navegador cargado de {self.path}")
+
+    def valid(self):
+        return self.state is not None and time.time() - self.saved_at <= self.ttl
+
+    def context_meta(self):
+        """playwright_context y playwright_context_kwargs con el estado guardado, o {}"""
+        if not self.valid():
+            return {}
+        return {
+            "playwright_context": self.context_name,
+            "playwright_context_kwargs": {"storage_state": self.state},
+        }
+
+    def applied(self, meta):
+        """La página de esta respuesta se abrió en el contexto con el estado guardado"""
+        return (meta is not None and not meta.get("session_renewal")
+                and meta.get("playwright_context") == self.context_name)
+
+    async def save(self, page, refresh=False):
+        """
+        Guardar el estado del contexto de `page`; solo la primera vez por
+        ejecución salvo con `refresh` (tras renovar una sesión caducada)
+        """
+        if self.saved and not refresh:
+            return
+        state = await page.context.storage_state()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({"saved_at": time.time(), "state": state}), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+        self.state, self.saved_at, self.saved = state, time.time(), True
+        self.spider.crawler.stats.inc_value('storage_state/saved')
+        self.spider.logger.info(
+            f"Estado del navegador guardado en {self.path} ({len(state.get('cookies', []))} cookies)")
+
+
+def gate_timeout(spider, meta, default, skipped=2000):
+    """Espera de una ventana de entrada: corta si la página ya tiene el estado guardado"""
+    manager = getattr(spider, 'storage_state', None)
+    if manager is not None and manager.applied(meta):
+        spider.crawler.stats.inc_value('storage_state/gates_skipped')
+        return skipped
+    return default
+
+
+async def save_storage_state(spider, page, refresh=False):
+    manager = getattr(spider, 'storage_state', None)
+    if manager is None:
+        return
+    try:
+        await manager.save(page, refresh)
+    except Exception as e:
+        spider.logger.warning(f"No se pudo guardar el estado del navegador: {e}")
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+from collections import OrderedDict
+
+
+DEFAULT_UNIT = 'un'
+
+# Unidades que reconocían Jumbo, Jumbo CL, Falabella y Falabella CO (en este orden)
+SUPERMARKET_UNITS = ('g', 'gr', 'ml', 'l', 'lt', 'kg', 'onz', 'lb', 'unidades', 'unideades',
+                     'un', 'cm', 'm', 'u', 'grs', 'und', 'unds')
+
+# Formato de UNITS_CACHE_FILE; un archivo de otra versión no se precarga
+CACHE_VERSION = 3
+
+
+class UnitProfile:
+    """
+    Reglas de unidades de un retailer, las mismas que aplicaba la regex de su
+    araña: unidades aceptadas (se prueban en orden), número y separador entre
+    número y unidad, si la unidad debe terminar en límite de palabra, si se
+    toma la primera o la última coincidencia, un patrón de conteo opcional
+    ("x 6", "por 12") con o sin separador de miles y el mapa con el que
+    parse_units normaliza la unidad. Los patrones se compilan una vez.
+    """
+
+    def __init__(self, name, units, number=r'\d+(?:\.\d+)?', separator=r'\s*', boundary=True,
+                 last=True, lower=True, count=None, count_thousands=True, normalize=None):
+        self.name = name
+        self.units = tuple(units)
+        self.last = last
+        self.lower = lower
+        self.count_thousands = count_thousands
+        self.normalize = dict(normalize or {})
+        units_pattern = "|".join(self.units)
+        end = r'\b' if boundary else ''
+        self.pattern = re.compile(rf'({number}){separator}((?:{units_pattern}){end})', re.IGNORECASE)
+        self.count = re.compile(count, re.IGNORECASE) if count else None
+
+    def __repr__(self):
+        return f"UnitProfile({self.name!r})"
+
+    def parse(self, text):
+        """(cantidad, unidad como se escribe o None), sin caché"""
+        matches = self.pattern.findall(text)
+        if matches:
+            number, unit = matches[-1] if self.last else matches[0]
+            quantity = float(number.replace(',', '.'))
+            if self.lower:
+                unit = unit.lower()
+        else:
+            unit = None
+            counts = self.count.findall(text.lower()) if self.count else ()
+            if counts:
+                number = counts[-1]
+                if self.count_thousands:
+                    number = number.replace('.', '')
+                quantity = float(number.replace(',', '.'))
+            else:
+                quantity = 1.0
+        if quantity <= 0:
+            quantity = 1.0
+        return quantity, unit
+
+
+class UnitCache:
+    """
+    LRU acotado (perfil, nombre) -> (quantity, unidad escrita) delante del
+    parser. Los mismos nombres se repiten entre páginas, categorías y
+    ejecuciones diarias, así que
+    con la caché caliente casi no se ejecutan expresiones regulares.
+    Con maxsize 0 queda desactivada.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def resize(self, maxsize):
+        self.maxsize = max(0, maxsize)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, text):
+        if not self.maxsize:
+            return None
+        value = self.entries.get(text)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(text)
+        self.hits += 1
+        return value
+
+    def put(self, text, value):
+        if not self.maxsize:
+            return
+        self.entries[text] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def load(self, path):
+        """Arranque en caliente con la caché guardada por la ejecución anterior"""
+        if not path or not os.path.isfile(path):
+            return 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError:
+            return 0
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return 0
+        rows = data["entries"]
+        for text, quantity, unit in rows[-self.maxsize:] if self.maxsize else ():
+            self.put(text, (quantity, unit))
+        return len(self.entries)
+
+    def save(self, path):
+        """Guardar las entradas, de la menos a la más usada recientemente"""
+        if not path or not self.maxsize:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION,
+                       "entries": [[text, quantity, unit]
+                                   for text, (quantity, unit) in self.entries.items()]},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+# Caché del proceso; la configura UnitCacheExtension (UNITS_CACHE_SIZE)
+unit_cache = UnitCache()
+
+
+def match_units(text, profile):
+    """
+    Cantidad total y unidad tal como aparece en el texto según las reglas de
+    `profile` (en minúsculas salvo que el perfil conserve el caso, sin
+    normalizar), o None como unidad si solo hay un conteo ("x 6") o nada
+    reconocible.
+    """
+    key = f"{profile.name}\t{text}"
+    parsed = unit_cache.get(key)
+    if parsed is None:
+        parsed = profile.parse(text)
+        unit_cache.put(key, parsed)
+    return parsed
+
+
+def parse_units(text, profile, price=None):
+    """
+    Extraer en una pasada la cantidad total, la unidad (normalizada con el
+    mapa de `profile`; DEFAULT_UNIT si no hay) y el precio por unidad a
+    partir del nombre (o nombre + presentación) de un producto.
+    Devuelve (quantity, unit, unit_price); unit_price es None sin precio.
+    """
+    quantity, unit = match_units(text, profile)
+    unit_price = price / quantity if price is not None else None
+    if unit is None:
+        return quantity, DEFAULT_UNIT, unit_price
+    return quantity, profile.normalize.get(unit, unit), unit_price
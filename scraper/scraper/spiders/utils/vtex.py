@@ -0,0 +1,255 @@
+import json
+import math
+from urllib.parse import urlencode, urlsplit
+
+import scrapy
+
+from scraper.items import ProductItem
+
+
+# API pública del catálogo VTEX (Jumbo Colombia, Plaza Vea). _from/_to son
+# inclusivos, como máximo 50 productos por página y _to no pasa de 2549
+SEARCH_PATH = "/api/catalog_system/pub/products/search"
+MAX_PAGE_SIZE = 50
+MAX_RESULTS = 2550
+# Las categorías con más productos se parten en rangos de precio (fq=P:[a TO b])
+# hasta que cada rango cabe en MAX_RESULTS; los precios llevan dos decimales
+PRICE_STEP = 0.01
+
+# Slot de descarga propio: la API no comparte el DOWNLOAD_DELAY del navegador
+API_SLOT = "vtex-api"
+
+
+def category_path(url):
+    """'https://www.plazavea.com.pe/desayunos/cereales' -> '/desayunos/cereales'"""
+    return "/" + urlsplit(url).path.strip("/")
+
+
+def category_names(url):
+    """Categoría y subcategoría a partir de los dos últimos segmentos de la URL"""
+    parts = [part.replace('-', ' ').title() for part in category_path(url).strip("/").split("/")]
+    if len(parts) == 1:
+        return parts[0], parts[0]
+    return parts[-2], parts[-1]
+
+
+def parse_total(response):
+    """Total de productos de la cabecera 'resources: 0-49/1234' (None si no viene)"""
+    resources = response.headers.get('resources', b'').decode()
+    _, _, total = resources.partition('/')
+    return int(total) if total.isdigit() else None
+
+
+def product_offer(product):
+    """Primer SKU con un vendedor que tenga precio (Price 0 = sin stock)"""
+    for sku in product.get('items') or ():
+        for seller in sku.get('sellers') or ():
+            offer = seller.get('commertialOffer') or {}
+            if offer.get('Price'):
+                return sku, offer
+    return None, None
+
+
+def vtex_measurement(sku):
+    """Unidad de venta del SKU ('0.5 kg'); vacía si se vende por unidad"""
+    unit = (sku.get('measurementUnit') or '').strip()
+    if not unit or unit.lower() == 'un':
+        return ''
+    return f"{sku.get('unitMultiplier') or 1} {unit}"
+
+
+class VtexCatalogMixin:
+    """
+    Modo 'api' de las tiendas VTEX: pagina el catálogo JSON con peticiones
+    HTTP normales, sin Playwright, y construye los ProductItem directamente.
+    La araña define vtex_base_url, vtex_comercial_name, vtex_comercial_id y
+    browser_request(url, index), que se usa como respaldo cuando la API de
+    una categoría falla o no responde JSON. Las categorías con más productos
+    de los que deja paginar se parten por rangos de precio.
+    vtex_unit_data() calcula cantidad, unidad y precio unitario igual que el
+    camino del navegador de cada araña.
+    """
+
+    vtex_base_url = None
+    vtex_comercial_name = None
+    vtex_comercial_id = None
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        if settings.get('VTEX_CRAWL_MODE', 'browser') != 'api':
+            return
+        concurrency = settings.getint('VTEX_API_CONCURRENCY', 16)
+        slots = dict(settings.getdict('DOWNLOAD_SLOTS'))
+        slots.setdefault(API_SLOT, {"concurrency": concurrency, "delay": 0})
+        settings.set('DOWNLOAD_SLOTS', slots, priority='spider')
+        if settings.getint('CONCURRENT_REQUESTS') < concurrency:
+            settings.set('CONCURRENT_REQUESTS', concurrency, priority='spider')
+
+    def vtex_api_mode(self):
+        return self.settings.get('VTEX_CRAWL_MODE', 'browser') == 'api'
+
+    def vtex_request(self, url, index=None, start=0, price_range=None, probe=False):
+        """
+        Página de la API para la categoría de `url` a partir del producto `start`,
+        limitada a `price_range` (min, max) si se da. Con `probe` se pide solo el
+        producto más caro, para conocer el rango de precios antes de partir.
+        """
+        base_url = self.settings.get('VTEX_API_BASE_URL') or self.vtex_base_url
+        page_size = 1 if probe else min(
+            self.settings.getint('VTEX_API_PAGE_SIZE', MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+        path = category_path(url)
+        params = {
+            "_from": start,
+            "_to": start + page_size - 1,
+            "map": ",".join("c" for _ in path.strip("/").split("/")),
+        }
+        if price_range is not None:
+            params["fq"] = f"P:[{price_range[0]:.2f} TO {price_range[1]:.2f}]"
+        if probe:
+            params["O"] = "OrderByPriceDESC"
+        api_url = f"{base_url.rstrip('/')}{SEARCH_PATH}{path}?{urlencode(params)}"
+        return scrapy.Request(
+            api_url,
+            headers={"Accept": "application/json"},
+            meta={
+                "download_slot": API_SLOT,
+                "autothrottle_dont_adjust_delay": True,
+                # VTEX_API_BASE_URL puede apuntar a otro host (p. ej. un servidor local)
+                "allow_offsite": True,
+                "vtex": {"url": url, "index": index, "start": start, "page_size": page_size,
+                         "price_range": price_range, "probe": probe},
+            },
+            callback=self.parse_vtex_page,
+            errback=self.vtex_errback,
+        )
+
+    def parse_vtex_page(self, response):
+        stats = self.crawler.stats
+        vtex = response.meta["vtex"]
+        try:
+            products = json.loads(response.text)
+        except ValueError:
+            products = None
+        if not isinstance(products, list):
+            yield from self._vtex_fallback(vtex, f"respuesta no JSON en {response.url}")
+            return
+        total = parse_total(response)
+        if vtex["probe"]:
+            yield from self._vtex_split(vtex, products, total)
+            return
+
+        start, page_size = vtex["start"], vtex["page_size"]
+        url, index, price_range = vtex["url"], vtex["index"], vtex["price_range"]
+        if start == 0:
+            if total is not None and total > MAX_RESULTS:
+                yield from self._vtex_split_range(vtex, total)
+                return
+            self.logger.info(
+                f"API VTEX: {total} productos en {url}"
+                + (f" (precios {price_range[0]:.2f}-{price_range[1]:.2f})" if price_range else ""))
+            # Con el total conocido todas las páginas salen a la vez; sin él, de una en una
+            if total is not None:
+                for next_start in range(page_size, min(total, MAX_RESULTS), page_size):
+                    yield self.vtex_request(url, index, next_start, price_range)
+        if total is None and len(products) == page_size and start + page_size < MAX_RESULTS:
+            yield self.vtex_request(url, index, start + page_size, price_range)
+
+        stats.inc_value('vtex/pages')
+        category, sub_category = category_names(vtex["url"])
+        for product in products:
+            item = self.vtex_item(product, category, sub_category)
+            if item is not None:
+                stats.inc_value('vtex/products')
+                yield item
+
+    def vtex_item(self, product, category, sub_category):
+        sku, offer = product_offer(product)
+        name = (product.get('productName') or '').strip()
+        if sku is None or not name:
+            self.crawler.stats.inc_value('vtex/products_without_offer')
+            return None
+
+        price = float(offer['Price'])
+        unit_price, quantity, unit_type = self.vtex_unit_data(name, price, vtex_measurement(sku))
+
+        return ProductItem(
+            name=name,
+            category=category,
+            sub_category=sub_category,
+            price=price,
+            unit_price=unit_price,
+            total_unit_quantity=quantity,
+            unit_type=unit_type,
+            comercial_name=self.vtex_comercial_name,
+            comercial_id=self.vtex_comercial_id,
+        )
+
+    def vtex_unit_data(self, name, price, measurement):
+        """
+        (unit_price, quantity, unit_type) de un producto de la API. `measurement`
+        es la unidad de venta del SKU ('0.5 kg' en los productos a granel, '' si
+        se vende por unidad). Cada araña lo define con su perfil de unidades
+        para que coincida con su camino del navegador.
+        """
+        raise NotImplementedError
+
+    def vtex_errback(self, failure):
+        vtex = failure.request.meta["vtex"]
+        if vtex["start"] == 0 and vtex["price_range"] is None:
+            return list(self._vtex_fallback(vtex, f"{failure.value!r}"))
+        # Una página intermedia o un rango de precios: el resto de la categoría
+        # ya sale por la API, y el navegador la repetiría entera
+        self.crawler.stats.inc_value('vtex/page_errors')
+        self.logger.error(f"Error en la página {vtex['start']} de la API para {vtex['url']}: {failure.value!r}")
+        return None
+
+    def _vtex_split_range(self, vtex, total):
+        """Primera página con más de MAX_RESULTS productos: partir la categoría o el rango"""
+        stats = self.crawler.stats
+        url, index, price_range = vtex["url"], vtex["index"], vtex["price_range"]
+        if price_range is None:
+            # Primero el precio más alto de la categoría
+            stats.inc_value('vtex/splits')
+            self.logger.info(
+                f"API VTEX: {total} productos en {url} superan {MAX_RESULTS}, se parte por precio")
+            yield self.vtex_request(url, index, probe=True)
+            return
+        low, high = price_range
+        if high - low < 2 * PRICE_STEP:
+            # Más de MAX_RESULTS productos con un mismo precio: solo se pueden paginar esos
+            stats.inc_value('vtex/truncated')
+            self.logger.warning(
+                f"API VTEX: {total} productos de {url} con precio {low:.2f}, solo se leen {MAX_RESULTS}")
+            for start in range(0, MAX_RESULTS, vtex["page_size"]):
+                yield self.vtex_request(url, index, start, (low, high))
+            return
+        stats.inc_value('vtex/range_splits')
+        middle = round((low + high) / 2, 2)
+        yield self.vtex_request(url, index, 0, (low, middle))
+        yield self.vtex_request(url, index, 0, (round(middle + PRICE_STEP, 2), high))
+
+    def _vtex_split(self, vtex, products, total):
+        """Respuesta del producto más caro: repartir la categoría en rangos de precio"""
+        prices = [
+            offer.get('Price') or 0
+            for product in products[:1]
+            for sku in product.get('items') or ()
+            for seller in sku.get('sellers') or ()
+            for offer in (seller.get('commertialOffer') or {},)
+        ]
+        if not prices or not max(prices):
+            yield from self._vtex_fallback(vtex, "no se pudo leer el precio máximo de la categoría")
+            return
+        high = float(math.ceil(max(prices)))
+        # Dos rangos por cada MAX_RESULTS productos; los que sigan llenos se parten otra vez
+        parts = 2 * math.ceil((total or MAX_RESULTS + 1) / MAX_RESULTS)
+        bounds = [round(high * i / parts, 2) for i in range(parts + 1)]
+        for i in range(parts):
+            low = bounds[i] if i == 0 else round(bounds[i] + PRICE_STEP, 2)
+            yield self.vtex_request(vtex["url"], vtex["index"], 0, (low, bounds[i + 1]))
+
+    def _vtex_fallback(self, vtex, reason):
+        self.crawler.stats.inc_value('vtex/fallbacks')
+        self.logger.warning(f"API VTEX no disponible para {vtex['url']} ({reason}); se usa el navegador")
+        yield self.browser_request(vtex["url"], vtex["index"])
@@ -0,0 +1,110 @@
+# Firma de la grilla de productos: número de cards más el texto de la primera
+# y la última. Cambia al paginar (mismas cards, otro contenido) y al cargar más.
+# Con `detail` (consulta relativa a la card, p. ej. el precio) cuenta además las
+# cards que ya lo tienen, así también cambia cuando se completa una carga diferida.
+# Las consultas XPath (empiezan por '/', './' o '(') o CSS, igual que en extract.py
+_GRID_SIGNATURE_JS = """
+    const isXPath = (query) => /^(\\.?\\/|\\()/.test(query);
+    const select = (query, context) => {
+        if (!isXPath(query)) return Array.from(context.querySelectorAll(query));
+        const snapshot = document.evaluate(
+            query, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const nodes = [];
+        for (let i = 0; i < snapshot.snapshotLength; i++) nodes.push(snapshot.snapshotItem(i));
+        return nodes;
+    };
+    const text = (node) => (node.textContent || '').trim().slice(0, 200);
+    const signature = (query, detail) => {
+        const nodes = select(query, document);
+        if (!nodes.length) return '';
+        const filled = detail
+            ? nodes.filter((node) => select(detail, node).some((n) => text(n) !== '')).length
+            : '';
+        return `${nodes.length}|${filled}|${text(nodes[0])}|${text(nodes[nodes.length - 1])}`;
+    };
+"""
+
+GRID_SIGNATURE_JS = f"""
+({{cards, detail}}) => {{
+{_GRID_SIGNATURE_JS}
+    return signature(cards, detail);
+}}
+"""
+
+# Resuelve cuando la firma es distinta de `previous` (o hay cards, sin previous)
+# y se mantiene quietMs sin cambios; un MutationObserver evita sondear.
+# Con timeoutMs como techo devuelve {changed: false} si la grilla no cambió
+GRID_WAIT_JS = f"""
+({{cards, detail, previous, quietMs, timeoutMs}}) => new Promise((resolve) => {{
+{_GRID_SIGNATURE_JS}
+    const start = performance.now();
+    let current = signature(cards, detail);
+    let quietTimer = null;
+    let ceilingTimer = null;
+    const ready = () => current !== '' && current !== previous;
+    const finish = () => {{
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(ceilingTimer);
+        resolve({{changed: ready(), elapsed: performance.now() - start}});
+    }};
+    const observer = new MutationObserver(() => {{
+        const next = signature(cards, detail);
+        if (next === current) return;
+        current = next;
+        clearTimeout(quietTimer);
+        if (ready()) quietTimer = setTimeout(finish, quietMs);
+    }});
+    observer.observe(document.body, {{childList: true, subtree: true, characterData: true}});
+    ceilingTimer = setTimeout(finish, timeoutMs);
+    if (ready()) quietTimer = setTimeout(finish, quietMs);
+}})
+"""
+
+
+async def grid_signature(page, cards_query, detail=None):
+    """Firma actual de la grilla, para pasarla como `previous` antes de un clic o scroll"""
+    return await page.evaluate(GRID_SIGNATURE_JS, {"cards": cards_query, "detail": detail})
+
+
+async def wait_for_grid(spider, page, cards_query, previous=None, fixed_ms=0, timeout=None,
+                        detail=None):
+    """
+    Esperar a que la grilla de productos cambie respecto a `previous` (o a que
+    haya cards) en lugar de una pausa fija. `previous` y `detail` deben ser los
+    mismos que se usaron en grid_signature. `fixed_ms` es la pausa que sustituye:
+    el techo es `timeout` o, por defecto, fixed_ms * GRID_WAIT_TIMEOUT_FACTOR sin
+    pasar de GRID_WAIT_TIMEOUT, y es la pausa de respaldo si falla el evaluate.
+    Devuelve True si la grilla cambió antes del techo.
+    """
+    stats = spider.crawler.stats
+    if timeout is None:
+        timeout = spider.settings.getint('GRID_WAIT_TIMEOUT', 15000)
+        if fixed_ms:
+            factor = spider.settings.getfloat('GRID_WAIT_TIMEOUT_FACTOR', 1.5)
+            timeout = min(timeout, int(fixed_ms * factor))
+    try:
+        result = await page.evaluate(GRID_WAIT_JS, {
+            "cards": cards_query,
+            "detail": detail,
+            "previous": previous,
+            "quietMs": spider.settings.getint('GRID_WAIT_QUIET', 300),
+            "timeoutMs": timeout,
+        })
+    except Exception as e:
+        # Navegación completa durante la espera u otra página: se vuelve a la pausa fija
+        spider.logger.warning(f"Espera de la grilla fallida, pausa fija de {fixed_ms} ms: {e}")
+        stats.inc_value('waits/fallbacks')
+        await page.wait_for_timeout(fixed_ms)
+        return False
+
+    elapsed = int(result["elapsed"])
+    stats.inc_value('waits/calls')
+    stats.inc_value('waits/waited_ms', elapsed)
+    stats.inc_value('waits/fixed_ms', fixed_ms)
+    # Lo ahorrado y lo esperado de más respecto a la pausa fija, por separado
+    stats.inc_value('waits/saved_ms', max(0, fixed_ms - elapsed))
+    stats.inc_value('waits/extra_ms', max(0, elapsed - fixed_ms))
+    if not result["changed"]:
+        stats.inc_value('waits/timeouts')
+    return result["changed"]
@@ -0,0 +1,80 @@
+from scrapy_playwright.provider import PlaywrightBrowserProvider
+
+
+class WarmBrowser:
+    """
+    Browser de Playwright compartido entre crawls del mismo proceso. El
+    download handler de scrapy-playwright lo cierra al terminar cada araña:
+    aquí close() solo quita los listeners que registró ese handler (sus
+    contextos ya los cerró él) y deja Chromium vivo para el siguiente crawl.
+    shutdown() lo cierra de verdad (reciclado o fin del contenedor).
+    """
+
+    def __init__(self, browser):
+        self._browser = browser
+        self._listeners = []
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+    def on(self, event, handler):
+        self._listeners.append((event, handler))
+        self._browser.on(event, handler)
+
+    async def close(self):
+        for event, handler in self._listeners:
+            self._browser.remove_listener(event, handler)
+        self._listeners.clear()
+
+    async def shutdown(self):
+        await self.close()
+        await self._browser.close()
+
+
+class WarmBrowserProvider(PlaywrightBrowserProvider):
+    """
+    PLAYWRIGHT_BROWSER_PROVIDER para procesos que lanzan varias arañas
+    seguidas sobre el mismo event loop (handler.py en Lambda): Playwright y
+    Chromium se arrancan una vez por proceso y cada crawl recibe el mismo
+    navegador envuelto en WarmBrowser. Los contextos persistentes no se
+    comparten (PLAYWRIGHT_CONTEXTS debe ir vacío).
+    """
+
+    # Driver de Playwright y navegador del proceso, compartidos por todos los crawls
+    shared = None
+    browser = None
+    launches = 0
+
+    async def start(self):
+        cls = WarmBrowserProvider
+        if cls.shared is None:
+            await super().start()
+            cls.shared = (self.playwright_context_manager, self.playwright, self.browser_type)
+        else:
+            self.playwright_context_manager, self.playwright, self.browser_type = cls.shared
+
+    async def launch_browser(self):
+        cls = WarmBrowserProvider
+        if cls.browser is None or not cls.browser.is_connected():
+            cls.browser = await super().launch_browser()
+            cls.launches += 1
+        return WarmBrowser(cls.browser)
+
+    async def close(self):
+        # Playwright sigue en marcha para el siguiente crawl; ver shutdown()
+        pass
+
+    @classmethod
+    def warm(cls):
+        """Hay un navegador del proceso listo para el siguiente crawl"""
+        return cls.browser is not None and cls.browser.is_connected()
+
+    @classmethod
+    async def shutdown(cls):
+        """Cerrar el navegador y parar Playwright"""
+        if cls.warm():
+            await cls.browser.close()
+        cls.browser = None
+        if cls.shared is not None:
+            await cls.shared[1].stop()
+            cls.shared = None
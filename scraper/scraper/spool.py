@@ -0,0 +1,175 @@
+import gzip
+import json
+import os
+import socket
+import zlib
+from datetime import datetime
+
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+LOADED_SUFFIX = ".loaded"
+META_FILE = "meta.json"
+# Marcadores de "visto" (modo delta) de los lotes que no llegaron a la BD
+SEEN_FILE = "seen.jsonl.gz"
+
+
+class Spool:
+    """
+    Spool local de solo-anexado para los items que no se pudieron escribir en
+    PostgreSQL. Cada ejecución escribe segmentos JSONL comprimidos con gzip en
+    <base_dir>/<spider>/<run_id>/ junto a un meta.json con la tabla destino,
+    para recargarlos después con `scrapy replay_spool` sin volver a scrapear.
+    Los marcadores de "visto" del modo delta van aparte, en seen.jsonl.gz.
+    meta.json marca la ejecución como abierta hasta close().
+    """
+
+    def __init__(self, base_dir, spider_name, pais, columns, segment_rows=50000):
+        self.run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.path = os.path.join(base_dir, spider_name, self.run_id)
+        self.spider_name = spider_name
+        self.pais = pais
+        self.columns = list(columns)
+        self.segment_rows = max(1, segment_rows)
+        self.segment = None
+        self.segment_index = 0
+        self.rows_in_segment = 0
+        self.rows_written = 0
+        self.seen_file = None
+        self.seen_written = 0
+        self.run_opened = False
+
+    def _open_run(self):
+        if self.run_opened:
+            return
+        self.run_opened = True
+        os.makedirs(self.path, exist_ok=True)
+        self._write_meta(True)
+
+    def _write_meta(self, is_open):
+        meta_path = os.path.join(self.path, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "spider": self.spider_name,
+                "pais": self.pais,
+                "columns": self.columns,
+                "run_id": self.run_id,
+                "open": is_open,
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _rotate(self):
+        self._open_run()
+        self._close_segment()
+        self.segment_index += 1
+        self.rows_in_segment = 0
+        segment_path = os.path.join(
+            self.path, f"{SEGMENT_PREFIX}{self.segment_index:05d}{SEGMENT_SUFFIX}")
+        self.segment = gzip.open(segment_path, "ab")
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def append(self, rows):
+        """Anexar filas (tuplas en el orden de columns) al segmento actual"""
+        for row in rows:
+            if self.segment is None or self.rows_in_segment >= self.segment_rows:
+                self._rotate()
+            line = json.dumps(row, default=str, ensure_ascii=False) + "\n"
+            self.segment.write(line.encode("utf-8"))
+            self.rows_in_segment += 1
+            self.rows_written += 1
+        # Sync flush: lo escrito hasta aquí se puede leer aunque el proceso muera
+        if self.segment is not None:
+            self.segment.flush(zlib.Z_SYNC_FLUSH)
+
+    def append_seen(self, seen):
+        """Anexar marcadores (comercial_id, name, result_date) al archivo de vistos"""
+        if not seen:
+            return
+        if self.seen_file is None:
+            self._open_run()
+            self.seen_file = gzip.open(os.path.join(self.path, SEEN_FILE), "ab")
+        for marker in seen:
+            line = json.dumps(marker, default=str, ensure_ascii=False) + "\n"
+            self.seen_file.write(line.encode("utf-8"))
+            self.seen_written += 1
+        self.seen_file.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self):
+        self._close_segment()
+        if self.seen_file is not None:
+            self.seen_file.close()
+            self.seen_file = None
+        if self.run_opened:
+            self._write_meta(False)
+
+
+def iter_runs(base_dir, spider_name=None, run_id=None):
+    """Recorrer las ejecuciones guardadas, devolviendo (ruta, meta)"""
+    if not os.path.isdir(base_dir):
+        return
+    spiders = [spider_name] if spider_name else sorted(os.listdir(base_dir))
+    for spider in spiders:
+        spider_path = os.path.join(base_dir, spider)
+        if not os.path.isdir(spider_path):
+            continue
+        for run in sorted(os.listdir(spider_path)):
+            if run_id and run != run_id:
+                continue
+            run_path = os.path.join(spider_path, run)
+            meta_path = os.path.join(run_path, META_FILE)
+            if not os.path.isfile(meta_path):
+                continue
+            with open(meta_path, encoding="utf-8") as f:
+                yield run_path, json.load(f)
+
+
+def run_is_open(meta):
+    """
+    La ejecución sigue escribiendo en el spool: meta.json abierto y su proceso
+    vivo. Si el proceso murió sin cerrar, sus segmentos ya se pueden cargar.
+    Un meta abierto de otra máquina no se puede comprobar y cuenta como abierto.
+    """
+    if not meta.get("open"):
+        return False
+    if meta.get("host") != socket.gethostname():
+        return True
+    try:
+        os.kill(meta["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def iter_segments(run_path):
+    """Segmentos pendientes de cargar de una ejecución, en orden"""
+    return [
+        os.path.join(run_path, name)
+        for name in sorted(os.listdir(run_path))
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+    ]
+
+
+def read_segment(segment_path):
+    """
+    Leer las filas de un segmento. Si el proceso murió a mitad de escritura,
+    la última línea puede estar truncada y se descarta.
+    """
+    rows = []
+    try:
+        with gzip.open(segment_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(tuple(json.loads(line)))
+                except ValueError:
+                    break
+    except EOFError:
+        pass
+    return rows
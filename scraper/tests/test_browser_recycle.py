@@ -0,0 +1,115 @@
+"""
+BrowserRecycleExtension con un crawler simulado: mientras se recicla solo
+esperan las páginas nuevas de Playwright; las peticiones HTTP y los callbacks
+siguen al mismo ritmo, y un drenado que no termina aplaza el siguiente intento.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from types import SimpleNamespace
+
+import scrapy
+
+from scraper.extensions import BrowserRecycleExtension
+from scraper.middlewares import BrowserRecycleMiddleware
+
+
+class Stats(Counter):
+    def inc_value(self, key, count=1):
+        self[key] += count
+
+    def set_value(self, key, value):
+        self[key] = value
+
+    def max_value(self, key, value):
+        self[key] = max(self[key], value)
+
+
+def make_recycler(drain_timeout):
+    # Sin engine.pause/unpause: si el reciclado pausara el motor fallaría aquí
+    crawler = SimpleNamespace(stats=Stats(), engine=SimpleNamespace())
+    recycler = BrowserRecycleExtension(crawler, rss_mb=0, pages=1, interval=0.2,
+                                       drain_timeout=drain_timeout, scope='context')
+    spider = SimpleNamespace(logger=logging.getLogger("test"), crawler=crawler,
+                             page_tracker=SimpleNamespace(in_use=set()))
+    recycler.spider_opened(spider)
+    recycler.spider_closed(spider)
+    handler = SimpleNamespace(context_wrappers={},
+                              config=SimpleNamespace(startup_context_kwargs={}))
+    return recycler, spider, handler
+
+
+async def http_throughput(spider, seconds):
+    """Peticiones sin navegador que pasan por el middleware en `seconds` s"""
+    middleware = BrowserRecycleMiddleware()
+    done = 0
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    while loop.time() < end:
+        await middleware.process_request(scrapy.Request("https://example.com/api"), spider)
+        await asyncio.sleep(0.005)
+        done += 1
+    return done
+
+
+async def admit_page(spider):
+    request = scrapy.Request("https://example.com/categoria", meta={"playwright": True})
+    await BrowserRecycleMiddleware().process_request(request, spider)
+    return request
+
+
+def test_recycling_holds_only_new_pages_and_keeps_http_throughput():
+    async def scenario():
+        recycler, spider, handler = make_recycler(drain_timeout=5)
+        baseline = await http_throughput(spider, 0.3)
+
+        # Un callback todavía tiene su página: el drenado espera a que la suelte
+        page = object()
+        spider.page_tracker.in_use.add(page)
+        recycle = asyncio.ensure_future(recycler._recycle(handler, 'pages', 0))
+        held = asyncio.ensure_future(admit_page(spider))
+        during = await http_throughput(spider, 0.3)
+        assert not held.done()
+        assert not recycle.done()
+
+        spider.page_tracker.in_use.discard(page)
+        await asyncio.wait_for(recycle, 2)
+        request = await asyncio.wait_for(held, 1)
+        assert request.meta["browser_recycle_admitted"]
+        assert recycler.downloading == 1
+        BrowserRecycleMiddleware().process_response(request, None, spider)
+        assert recycler.downloading == 0
+        return recycler.stats, baseline, during
+
+    stats, baseline, during = asyncio.run(scenario())
+    assert stats['browser_recycle/count'] == 1
+    assert stats['browser_recycle/held_ms'] > 0
+    # Las peticiones sin navegador no notan el reciclado
+    assert during >= 0.8 * baseline
+
+
+def test_timed_out_drain_reopens_pages_and_backs_off():
+    async def scenario():
+        recycler, spider, handler = make_recycler(drain_timeout=0.3)
+        spider.page_tracker.in_use.add(object())
+        recycler.served = 10
+        recycler._handler = lambda: handler
+
+        await recycler._check()
+        assert recycler.admitting.is_set()
+        await asyncio.wait_for(admit_page(spider), 0.1)
+        first_backoff = recycler.backoff
+
+        # Dentro del aplazamiento no se vuelve a intentar (ni a retener páginas)
+        await asyncio.wait_for(recycler._check(), 0.1)
+        assert recycler.stats['browser_recycle/postponed'] == 1
+
+        recycler.next_attempt = 0
+        await recycler._check()
+        return recycler, first_backoff
+
+    recycler, first_backoff = asyncio.run(scenario())
+    assert recycler.stats['browser_recycle/postponed'] == 2
+    assert recycler.backoff == 2 * first_backoff
+    assert recycler.stats['browser_recycle/count'] == 0
@@ -0,0 +1,149 @@
+"""
+PostgresPipeline y ThreadedPostgresPipeline sin base de datos real: los lotes
+de una araña sin 'pais' se descartan en el acto en lugar de quedar en una cola
+que nadie vacía, y el modo de escritura se prepara en la primera conexión que
+funciona aunque la BD no estuviera al abrir la araña.
+"""
+
+import logging
+from types import SimpleNamespace
+
+import psycopg2
+from scrapy.settings import Settings
+
+from scraper.items import ProductItem
+from scraper.pipelines import PostgresPipeline, ThreadedPostgresPipeline
+
+
+class FakeCursor:
+    def __init__(self, connection, rows=()):
+        self.connection = connection
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(" ".join(sql.split()))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeConnection:
+    """Lo mínimo de psycopg2 que usa el pipeline; el índice de precios sale de `rows`"""
+
+    def __init__(self, rows=()):
+        self.closed = 0
+        self.rows = rows
+        self.statements = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self, self.rows if name else ())
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def database_back_after_open(pipeline, connection):
+    """_connect falla al abrir la araña y funciona en las reconexiones"""
+    attempts = []
+
+    def connect():
+        attempts.append(connection)
+        if len(attempts) == 1:
+            raise psycopg2.OperationalError("could not connect to server")
+        connection.closed = 0
+        pipeline.connection = connection
+        pipeline.cur = connection.cursor()
+
+    pipeline._connect = connect
+    return attempts
+
+
+def make_item(index):
+    return ProductItem(name=f"Producto {index}", price=1000.0, unit_price=10.0,
+                       total_unit_quantity=100.0, unit_type="g",
+                       comercial_name="Tienda", comercial_id="1")
+
+
+def test_threaded_pipeline_without_pais_discards_batches(caplog):
+    pipeline = ThreadedPostgresPipeline(settings=Settings({
+        'POSTGRES_BATCH_SIZE': 2,
+        'POSTGRES_QUEUE_SIZE': 1,
+    }))
+    spider = SimpleNamespace(name="sin_pais", logger=logging.getLogger("sin_pais"))
+    pipeline.open_spider(spider)
+    assert pipeline.writer is None
+
+    with caplog.at_level(logging.ERROR, logger="sin_pais"):
+        for index in range(7):
+            # Sin escritor no hay backpressure: el item vuelve en el acto
+            assert pipeline.process_item(make_item(index), spider).name == f"Producto {index}"
+        pipeline.close_spider(spider)
+
+    discarded = [record for record in caplog.records if "Descartando lote" in record.message]
+    # Tres lotes llenos y el resto que quedaba en el buffer al cerrar
+    assert len(discarded) == 4
+    assert pipeline.queue.empty()
+    assert not pipeline.waiting
+    assert not pipeline.inflight
+    assert not pipeline.buffer
+
+
+def test_delta_is_prepared_on_first_successful_reconnect():
+    pipeline = PostgresPipeline(settings=Settings({
+        'POSTGRES_WRITE_MODE': 'delta',
+        'POSTGRES_FLUSH_INTERVAL': 0,
+        'POSTGRES_HEARTBEAT_INTERVAL': 0,
+    }))
+    connection = FakeConnection(rows=[("1", "Producto 1", 1000.0, 10.0)])
+    attempts = database_back_after_open(pipeline, connection)
+    spider = SimpleNamespace(name="peru", pais="peru", logger=logging.getLogger("peru"))
+
+    pipeline.open_spider(spider)
+    assert not pipeline.prepared
+    assert not pipeline.price_index
+
+    assert pipeline._reconnect(spider)
+    assert pipeline.prepared
+    assert any("CREATE TABLE IF NOT EXISTS peru_seen" in sql for sql in connection.statements)
+    assert ("1", "Producto 1") in pipeline.price_index
+
+    # Ya preparado: otra reconexión no vuelve a cargar el índice
+    statements = len(connection.statements)
+    assert pipeline._reconnect(spider)
+    assert len(connection.statements) == statements
+    assert len(attempts) == 3
+
+
+def test_upsert_index_is_created_on_first_successful_reconnect():
+    pipeline = PostgresPipeline(settings=Settings({
+        'POSTGRES_WRITE_MODE': 'upsert',
+        'POSTGRES_FLUSH_INTERVAL': 0,
+        'POSTGRES_HEARTBEAT_INTERVAL': 0,
+    }))
+    connection = FakeConnection()
+    database_back_after_open(pipeline, connection)
+    spider = SimpleNamespace(name="peru", pais="peru", logger=logging.getLogger("peru"))
+
+    pipeline.open_spider(spider)
+    assert not pipeline.prepared
+
+    assert pipeline._reconnect(spider)
+    assert pipeline.prepared
+    assert pipeline.write_mode == 'upsert'
+    assert any("CREATE UNIQUE INDEX IF NOT EXISTS peru_upsert_key" in sql
+               for sql in connection.statements)
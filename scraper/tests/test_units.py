@@ -0,0 +1,41 @@
+"""
+El motor de unidades con el perfil de cada retailer da lo mismo que la regex
+que tenía su araña (benchmark_units.py) sobre el corpus del benchmark y los
+casos en los que un motor común cambiaba los datos guardados.
+"""
+
+import pytest
+
+from benchmark_units import CORPUS, RETAILERS
+from scraper.spiders.utils.units import unit_cache
+
+EXTRA_NAMES = [
+    "Leche 400  g",
+    "Gaseosa 1.5 lt",
+    "Cable 2 m",
+    "Pollo entero 1 kilo",
+    "Paracetamol 500 mg Caja x 100 Tabletas",
+    "Jabón Dove Original 90 g x 3 unds",
+    "Atún Florida en Trozos Lata 140 grs",
+    "Papel Higiénico Elite Doble Hoja 24 unidades",
+    "Servilletas Familia x 1.000",
+    "Arroz Diana Bolsa 1.000 g",
+    "Agua Cristal 2,5 L",
+]
+
+
+@pytest.fixture(params=[0, 1000], ids=["sin_cache", "con_cache"])
+def cache(request):
+    previous = unit_cache.maxsize
+    unit_cache.resize(request.param)
+    yield
+    unit_cache.resize(previous)
+
+
+@pytest.mark.parametrize("retailer", sorted(RETAILERS))
+def test_engine_matches_legacy_routines(retailer, cache):
+    legacy, engine = RETAILERS[retailer]
+    for name in CORPUS + EXTRA_NAMES:
+        # Dos pasadas: la segunda sale de la caché cuando está activa
+        for _ in range(2):
+            assert engine(10.0, name) == legacy(10.0, name), (retailer, name)
@@ -0,0 +1,219 @@
+"""
+Modo 'api' de las tiendas VTEX contra un servidor local que sirve el catálogo
+grabado en tests/fixtures/vtex: paginación, partición por precio de las
+categorías con más de MAX_RESULTS productos y paso al navegador cuando la API
+no responde JSON o falla la primera página. El crawl corre en un proceso
+aparte (el reactor de Twisted no se puede reiniciar dentro de pytest).
+"""
+
+import copy
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures", "vtex")
+SEARCH_PATH = "/api/catalog_system/pub/products/search"
+PRICE_FILTER = re.compile(r"P:\[([\d.]+) TO ([\d.]+)\]")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def offer_price(product):
+    return product["items"][0]["sellers"][0]["commertialOffer"]["Price"]
+
+
+def category_products(path, count):
+    """Catálogo de una categoría a partir de los productos grabados, con precios repartidos"""
+    templates = load_fixture("products.json")
+    products = []
+    for i in range(count):
+        product = copy.deepcopy(templates[i % len(templates)])
+        product["productId"] = f"{product['productId']}-{i}"
+        product["productName"] = f"{i:04d} {product['productName']}"
+        offer = product["items"][0]["sellers"][0]["commertialOffer"]
+        if offer["Price"]:
+            offer["Price"] = round(offer["Price"] + i * 0.07, 2)
+        products.append(product)
+    return products
+
+
+class CatalogStub(BaseHTTPRequestHandler):
+    """Responde como la API de búsqueda de VTEX (_from/_to, fq=P:[a TO b], O, cabecera resources)"""
+
+    catalog = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, query))
+
+        if url.path.startswith("/browser/"):
+            return self._send(200, "<html><body>navegador</body></html>", "text/html")
+        category = self.catalog.get(url.path[len(SEARCH_PATH):])
+        if not url.path.startswith(SEARCH_PATH) or category is None:
+            return self._send(404, "[]")
+        if "products" not in category:
+            return self._send(category["status"], category["body"], category["content_type"])
+
+        start, end = int(query["_from"]), int(query["_to"])
+        if end > 2549 or end - start >= 50:
+            return self._send(400, '"Parámetros de paginación fuera de rango"')
+        products = category["products"]
+        price_filter = PRICE_FILTER.fullmatch(query.get("fq", ""))
+        if price_filter:
+            low, high = float(price_filter.group(1)), float(price_filter.group(2))
+            products = [p for p in products if low <= offer_price(p) <= high]
+        if query.get("O") == "OrderByPriceDESC":
+            products = sorted(products, key=offer_price, reverse=True)
+        page = products[start:end + 1]
+        return self._send(200, json.dumps(page), headers=[
+            ("resources", f"{start}-{start + len(page) - 1}/{len(products)}")])
+
+
+def run_crawl(base_url, category_urls):
+    """Crawl de plaza_vea en modo 'api' contra el servidor local; imprime items y stats en JSON"""
+    sys.path.insert(0, ROOT)
+    import scrapy
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+
+    from scraper.spiders.plaza_vea import PlazaVeaSpider
+    from scraper.spiders.utils.vtex import category_path
+
+    class StubPlazaVeaSpider(PlazaVeaSpider):
+        name = "plaza_vea_stub"
+
+        async def start(self):
+            # Scrapy >= 2.19 ya no pasa por start_requests() desde start()
+            for request in self.start_requests():
+                yield request
+
+        def browser_request(self, url, i):
+            # El camino del navegador solo se registra: basta con saber que se pidió
+            return scrapy.Request(f"{base_url}/browser{category_path(url)}", dont_filter=True,
+                                  meta={"allow_offsite": True}, callback=self.parse_browser)
+
+        def parse_browser(self, response):
+            yield {"fallback": category_path(response.url)[len("/browser"):]}
+
+    items = []
+    process = CrawlerProcess({
+        "VTEX_CRAWL_MODE": "api",
+        "VTEX_API_BASE_URL": base_url,
+        "RETRY_ENABLED": False,
+        "LOG_LEVEL": "WARNING",
+    })
+    crawler = process.create_crawler(StubPlazaVeaSpider)
+    crawler.signals.connect(lambda item: items.append(item), signal=signals.item_scraped, weak=False)
+    process.crawl(crawler, custom_urls=",".join(category_urls))
+    process.start()
+    print(json.dumps({
+        "items": [item if isinstance(item, dict) else {
+            key: item[key] for key in ("name", "price", "unit_price", "total_unit_quantity",
+                                       "unit_type", "category", "sub_category")
+        } for item in items],
+        "stats": {key: value for key, value in crawler.stats.get_stats().items()
+                  if isinstance(value, (int, float, str))},
+    }))
+
+
+@pytest.fixture(scope="module")
+def crawl():
+    categories = load_fixture("categories.json")
+    CatalogStub.catalog = {
+        path: {"products": category_products(path, spec["products"])} if "products" in spec else spec
+        for path, spec in categories.items()
+    }
+    CatalogStub.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CatalogStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        output = subprocess.run(
+            [sys.executable, __file__, base_url]
+            + [f"https://www.plazavea.com.pe{path}" for path in categories],
+            cwd=ROOT, stdout=subprocess.PIPE, check=True, text=True, timeout=300).stdout
+    finally:
+        server.shutdown()
+    result = json.loads(output.strip().splitlines()[-1])
+    result["requests"] = list(CatalogStub.requests)
+    return result
+
+
+def products_of(result, sub_category):
+    return [item for item in result["items"] if item.get("sub_category") == sub_category]
+
+
+def expected_names(path):
+    return sorted(p["productName"].strip() for p in CatalogStub.catalog[path]["products"]
+                  if offer_price(p))
+
+
+def test_pages_a_category(crawl):
+    items = products_of(crawl, "Arroz")
+    assert sorted(item["name"] for item in items) == expected_names("/abarrotes/arroz")
+    pages = [query for path, query in crawl["requests"] if path.endswith("/abarrotes/arroz")]
+    assert sorted(int(query["_from"]) for query in pages) == [0, 50, 100]
+    # Los productos sin precio (sin stock) no se emiten
+    assert crawl["stats"]["vtex/products_without_offer"] >= 30
+
+
+def test_splits_a_category_over_max_results_by_price(crawl):
+    items = products_of(crawl, "Gaseosas")
+    names = [item["name"] for item in items]
+    assert len(names) == len(set(names))
+    assert sorted(names) == expected_names("/bebidas/gaseosas")
+
+    requests = [query for path, query in crawl["requests"] if path.endswith("/bebidas/gaseosas")]
+    assert all(int(query["_to"]) <= 2549 for query in requests)
+    assert sum(query.get("O") == "OrderByPriceDESC" for query in requests) == 1
+    assert crawl["stats"]["vtex/splits"] == 1
+    assert not any(item.get("fallback") == "/bebidas/gaseosas" for item in crawl["items"])
+
+
+def test_falls_back_to_browser_on_non_json_and_first_page_failure(crawl):
+    fallbacks = sorted(item["fallback"] for item in crawl["items"] if "fallback" in item)
+    assert fallbacks == ["/roto/caida", "/roto/no-json"]
+    assert crawl["stats"]["vtex/fallbacks"] == 2
+
+
+def test_unit_data_matches_the_browser_path(crawl):
+    from scraper.spiders.plaza_vea import PlazaVeaSpider
+
+    spider = PlazaVeaSpider.__new__(PlazaVeaSpider)
+    bulk = [item for item in products_of(crawl, "Arroz") if "Plátano" in item["name"]]
+    assert bulk
+    for item in bulk:
+        # La unidad de venta del SKU ('0.5 kg') hace de referencia, como en la card
+        unit_price, quantity, unit_type = spider.calculate_unit_data(item["price"], item["name"], "0.5 kg")
+        assert (item["unit_price"], item["total_unit_quantity"], item["unit_type"]) == \
+            (unit_price, quantity, unit_type) == (item["price"] / 0.5, 0.5, "kg")
+
+
+if __name__ == "__main__":
+    run_crawl(sys.argv[1], sys.argv[2:])